@@ -0,0 +1,68 @@
+"""Microbenchmark del serializador de RabbitMQPublisher.
+
+Compara la serialización original (deepcopy + closure + json.dumps de
+__dict__) con los serializadores precompilados de `serializers.py`.
+
+Uso: python benchmarks/bench_serializers.py [-n ITERACIONES]
+"""
+import argparse
+import copy
+import dataclasses
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
+from src.easygrow_consumer.infrastructure import serializers
+
+
+def legacy_serialize(data):
+    """Réplica de la serialización anterior de RabbitMQPublisher.publish."""
+    FIXED_MAC_ADDRESS = "d8:3a:dd:1a:5c:b5"
+    data_to_publish = copy.deepcopy(data)
+    data_to_publish.mac_address = FIXED_MAC_ADDRESS
+
+    def serialize_datetime(obj):
+        from datetime import datetime as dt
+        if isinstance(obj, dt):
+            return obj.isoformat()
+        return str(obj)
+
+    # Las entidades usan slots y no tienen __dict__: se recorren sus campos en el mismo orden
+    fields = {f.name: getattr(data_to_publish, f.name) for f in dataclasses.fields(data_to_publish)}
+    return json.dumps(fields, default=serialize_datetime).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    samples = {
+        "SensorData": SensorData(mac_address="aa:bb:cc:dd:ee:ff", nombre="Humedad suelo", valor=41.5, fecha=now),
+        "BombaEvent": BombaEvent(
+            mac_address="aa:bb:cc:dd:ee:ff", evento="BOMBA_DESACTIVADA", id_sensor=3,
+            valor_humedad=62.0, tiempo_encendida_seg=45, fecha=now,
+        ),
+    }
+
+    encoder = "orjson" if serializers.orjson is not None else "json"
+    print(f"Codificador: {encoder} · iteraciones: {args.iterations}")
+    for name, data in samples.items():
+        assert json.loads(legacy_serialize(data)) == json.loads(serializers.serialize(data))
+        legacy = timeit.timeit(lambda: legacy_serialize(data), number=args.iterations)
+        fast = timeit.timeit(lambda: serializers.serialize(data), number=args.iterations)
+        print(
+            f"{name:<11} anterior: {legacy / args.iterations * 1e6:7.2f} µs/msg · "
+            f"precompilado: {fast / args.iterations * 1e6:7.2f} µs/msg · "
+            f"x{legacy / fast:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
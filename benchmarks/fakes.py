@@ -0,0 +1,116 @@
+"""Implementaciones en memoria de los puertos del dominio para benchmarks."""
+import threading
+import time
+
+from src.easygrow_consumer.domain.repository import SensorDataRepository, BombaRepository, MessageQueuePublisher
+from src.easygrow_consumer.infrastructure.serializers import serialize
+
+
+class StageLatencies:
+    """Registra latencias por etapa (en segundos) de forma thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def percentiles(self, stage: str, points=(50, 99)) -> dict:
+        with self._lock:
+            values = sorted(self.samples.get(stage, ()))
+        if not values:
+            return {p: 0.0 for p in points}
+        return {p: values[min(len(values) - 1, int(len(values) * p / 100))] for p in points}
+
+
+class InMemoryRepository(SensorDataRepository, BombaRepository):
+    """Repositorio que guarda en listas, con una latencia artificial opcional por escritura."""
+
+    def __init__(self, latencies: StageLatencies, delay: float = 0.0):
+        self.latencies = latencies
+        self.delay = delay
+        self.sensor_data = []
+        self.events = []
+        self.activations = []
+
+    def save_sensor_data(self, data):
+        started = time.perf_counter()
+        if self.delay:
+            time.sleep(self.delay)
+        self.sensor_data.append(data)
+        self.latencies.observe("db", time.perf_counter() - started)
+
+    def save_bomba_activation(self, event):
+        started = time.perf_counter()
+        if self.delay:
+            time.sleep(self.delay)
+        self.activations.append(event)
+        self.latencies.observe("db", time.perf_counter() - started)
+
+    def save_bomba_event(self, event):
+        started = time.perf_counter()
+        if self.delay:
+            time.sleep(self.delay)
+        self.events.append(event)
+        if event.tiempo_encendida_seg:
+            self.activations.append(event)
+        self.latencies.observe("db", time.perf_counter() - started)
+
+    def flush(self) -> int:
+        return 0
+
+
+class InMemoryPublisher(MessageQueuePublisher):
+    """Publicador que serializa como el real y avisa al generador de cada mensaje completado."""
+
+    def __init__(self, latencies: StageLatencies, on_published=None, delay: float = 0.0):
+        self.latencies = latencies
+        self.on_published = on_published
+        self.delay = delay
+        self.published = 0
+        self.bytes = 0
+
+    def publish(self, data) -> None:
+        started = time.perf_counter()
+        body = serialize(data)
+        if self.delay:
+            time.sleep(self.delay)
+        self.published += 1
+        self.bytes += len(body)
+        self.latencies.observe("publish", time.perf_counter() - started)
+        if self.on_published is not None:
+            self.on_published(data)
+
+    def close(self):
+        pass
+
+
+class TimedRepository(SensorDataRepository, BombaRepository):
+    """Mide la etapa "db" de un repositorio real (p. ej. PostgresRepository)."""
+
+    def __init__(self, inner, latencies: StageLatencies):
+        self.inner = inner
+        self.latencies = latencies
+
+    def save_sensor_data(self, data):
+        started = time.perf_counter()
+        self.inner.save_sensor_data(data)
+        self.latencies.observe("db", time.perf_counter() - started)
+
+    def save_bomba_activation(self, event):
+        started = time.perf_counter()
+        self.inner.save_bomba_activation(event)
+        self.latencies.observe("db", time.perf_counter() - started)
+
+    def save_bomba_event(self, event):
+        started = time.perf_counter()
+        self.inner.save_bomba_event(event)
+        self.latencies.observe("db", time.perf_counter() - started)
+
+    def flush(self) -> int:
+        return self.inner.flush()
+
+    def close(self):
+        self.inner.close()
@@ -0,0 +1,176 @@
+"""Generador de carga y benchmark de extremo a extremo del consumidor.
+
+Inyecta payloads sintéticos de `sensor/#` y `bomba/estado` en
+`MQTTClient.on_message` (sin broker) a la tasa y con el número de
+dispositivos indicados, contra repositorio/publicador en memoria o, con
+`--postgres`, contra el PostgreSQL configurado en `.env`. Informa
+throughput, p50/p99 por etapa y el crecimiento de memoria.
+
+Uso:
+    python benchmarks/load_generator.py --messages 50000 --devices 300
+    python benchmarks/load_generator.py --rate 2000 --duration 30 --workers 8
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.fakes import StageLatencies, InMemoryRepository, InMemoryPublisher, TimedRepository
+from src.easygrow_consumer.application.services import SensorService, BombaService
+from src.easygrow_consumer.application.reduction import StreamReducer
+from src.easygrow_consumer.domain.entities import SensorData
+
+SENSOR_NAMES = ("Humedad suelo", "Temperatura", "Humedad aire")
+
+
+class FakeMessage:
+    """Lo mínimo de paho.mqtt.client.MQTTMessage que usa on_message."""
+
+    __slots__ = ("topic", "payload", "dup")
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+        self.dup = False
+
+
+def build_messages(devices: int, bomba_ratio: float):
+    """Genera mensajes infinitos; el valor lleva el número de secuencia para medir la latencia."""
+    macs = [f"b8:27:eb:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}" for i in range(devices)]
+    bomba_every = int(1 / bomba_ratio) if bomba_ratio > 0 else 0
+    for seq in itertools.count():
+        mac = macs[seq % devices]
+        if bomba_every and seq % bomba_every == 0:
+            payload = {
+                "mac_address": mac,
+                "evento": "BOMBA_DESACTIVADA" if seq % 2 else "BOMBA_ACTIVADA",
+                "id_sensor": seq % devices + 1,
+                "valor_humedad": seq,
+                "tiempo_encendida_seg": 30 if seq % 2 else None,
+            }
+            yield seq, FakeMessage("bomba/estado", json.dumps(payload).encode())
+        else:
+            name = SENSOR_NAMES[seq % len(SENSOR_NAMES)]
+            payload = {"mac_address": mac, "nombre": name, "valor": seq}
+            yield seq, FakeMessage(f"sensor/{mac}", json.dumps(payload).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo del consumidor EasyGrow")
+    parser.add_argument("--messages", type=int, default=20000, help="mensajes a enviar (si no se usa --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="segundos de carga (tiene prioridad sobre --messages)")
+    parser.add_argument("--rate", type=float, default=0, help="mensajes por segundo; 0 = lo más rápido posible")
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--bomba-ratio", type=float, default=0.02, help="fracción de mensajes de bomba")
+    parser.add_argument("--workers", type=int, default=None, help="sobrescribe MQTT_WORKERS")
+    parser.add_argument("--db-delay", type=float, default=0.0, help="latencia simulada por escritura (s)")
+    parser.add_argument("--mq-delay", type=float, default=0.0, help="latencia simulada por publicación (s)")
+    parser.add_argument("--reduction", default="", help="REDUCTION_CONFIG (JSON o ruta) para el reductor de flujo")
+    parser.add_argument("--postgres", action="store_true", help="usar PostgresRepository real (.env)")
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        os.environ["MQTT_WORKERS"] = str(args.workers)
+
+    # Importación diferida: MQTT_WORKERS debe estar fijado antes de crear el cliente
+    from src.easygrow_consumer.infrastructure.mqttclient import MQTTClient
+
+    latencies = StageLatencies()
+    sent_at = {}
+    done = threading.Event()
+    completed = [0]
+    target = [None]
+    lock = threading.Lock()
+
+    def on_published(data):
+        seq = int(data.valor if isinstance(data, SensorData) else data.valor_humedad)
+        now = time.perf_counter()
+        with lock:
+            started = sent_at.pop(seq, None)
+            completed[0] += 1
+            if target[0] is not None and completed[0] >= target[0]:
+                done.set()
+        if started is not None:
+            latencies.observe("end_to_end", now - started)
+
+    if args.postgres:
+        from src.easygrow_consumer.infrastructure.bd import PostgresRepository
+        repository = TimedRepository(PostgresRepository(), latencies)
+    else:
+        repository = InMemoryRepository(latencies, delay=args.db_delay)
+    publisher = InMemoryPublisher(latencies, on_published=on_published, delay=args.mq_delay)
+
+    reducer = StreamReducer.from_json(args.reduction) if args.reduction else None
+    client = MQTTClient(SensorService(repository, publisher, reducer), BombaService(repository, publisher), connect=False)
+    if client.pipeline is not None:
+        client.pipeline.start()
+
+    tracemalloc.start()
+    mem_start = tracemalloc.get_traced_memory()[0]
+
+    messages = build_messages(args.devices, args.bomba_ratio)
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    deadline = time.perf_counter() + args.duration if args.duration > 0 else None
+
+    started = time.perf_counter()
+    next_send = started
+    sent = 0
+    for seq, msg in messages:
+        if deadline is not None:
+            if time.perf_counter() >= deadline:
+                break
+        elif sent >= args.messages:
+            break
+        if interval:
+            next_send += interval
+            pause = next_send - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+        with lock:
+            sent_at[seq] = time.perf_counter()
+        t0 = time.perf_counter()
+        client.on_message(None, None, msg)
+        latencies.observe("on_message", time.perf_counter() - t0)
+        sent += 1
+    send_elapsed = time.perf_counter() - started
+
+    with lock:
+        target[0] = sent
+        if completed[0] >= sent:
+            done.set()
+    if reducer is None:
+        done.wait(timeout=60)
+    # Con reductor se publican menos mensajes de los enviados: basta con vaciar el pipeline
+    if client.pipeline is not None:
+        client.pipeline.stop()
+    repository.flush()
+    elapsed = time.perf_counter() - started
+
+    mem_end, mem_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Mensajes enviados: {sent} en {send_elapsed:.2f}s ({sent / send_elapsed:,.0f} msg/s ofrecidos)")
+    print(f"Mensajes completados: {completed[0]} en {elapsed:.2f}s ({completed[0] / elapsed:,.0f} msg/s)")
+    print(f"{'etapa':<12} {'p50 ms':>10} {'p99 ms':>10}")
+    for stage in ("on_message", "db", "publish", "end_to_end"):
+        pct = latencies.percentiles(stage)
+        print(f"{stage:<12} {pct[50] * 1000:>10.3f} {pct[99] * 1000:>10.3f}")
+    if client.pipeline is not None:
+        stats = client.pipeline.stats()
+        print(f"Pipeline: {json.dumps({k: v for k, v in stats.items() if k != 'stages'})}")
+        for name, snap in stats["stages"].items():
+            print(f"  {name:<24} avg {snap['avg_ms']:.3f} ms · p99 {snap['p99_ms']:.3f} ms")
+    if reducer is not None:
+        stats = reducer.stats()
+        print(f"Reductor: {stats['received']} lecturas recibidas, {stats['forwarded']} reenviadas")
+    print(f"Memoria: +{(mem_end - mem_start) / 1024:,.0f} KiB al final · pico {mem_peak / 1024:,.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
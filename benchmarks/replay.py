@@ -0,0 +1,165 @@
+"""Reproduce una captura de tráfico MQTT (MQTT_CAPTURE_PATH) contra el consumidor.
+
+Inyecta los mensajes grabados en `MQTTClient.on_message` (sin broker), de
+modo que pasan por el enrutado, la deduplicación, el pipeline y
+`SensorService`/`BombaService` igual que en producción. Sirve para
+reprocesar un periodo tras corregir un error (`--postgres --rabbitmq`
+escriben en los destinos reales de `.env`, con el buffer por lotes de
+PostgresRepository) o para medir un cambio en el camino caliente con
+tráfico real (`--profile`).
+
+Por defecto los mensajes sin `ts` reciben la hora en que se grabaron, así
+que la fecha guardada es la original y volver a reproducir la misma captura
+no duplica lecturas en PostgreSQL.
+
+Uso:
+    python benchmarks/replay.py captura.egcap                  # velocidad original
+    python benchmarks/replay.py captura.egcap --speed 10       # 10 veces más rápido
+    python benchmarks/replay.py captura.egcap --speed 0 --profile replay.prof
+    python benchmarks/replay.py captura.egcap --speed 0 --postgres --rabbitmq
+"""
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.fakes import StageLatencies, InMemoryRepository, InMemoryPublisher, TimedRepository
+from benchmarks.load_generator import FakeMessage
+from src.easygrow_consumer.application.services import SensorService, BombaService
+from src.easygrow_consumer.application.reduction import StreamReducer
+from src.easygrow_consumer.infrastructure.capture import read_capture
+from src.easygrow_consumer.infrastructure.payloads import decode, DEVICE_TIMESTAMP_KEY
+
+
+def stamp(payload: bytes, ts: float) -> bytes:
+    """Añade la hora de captura como `ts` si el dispositivo no la envió."""
+    try:
+        message = decode(payload)
+    except ValueError:
+        # Payload inválido: se reproduce tal cual para que se descarte igual que en su momento
+        return payload
+    if message.get(DEVICE_TIMESTAMP_KEY) is not None:
+        return payload
+    message[DEVICE_TIMESTAMP_KEY] = ts
+    return json.dumps(message).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una captura de tráfico MQTT contra el consumidor EasyGrow")
+    parser.add_argument("path", help="archivo grabado con MQTT_CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="multiplicador sobre el ritmo original; 0 = lo más rápido posible")
+    parser.add_argument("--limit", type=int, default=0, help="máximo de mensajes a reproducir (0 = todos)")
+    parser.add_argument("--workers", type=int, default=None, help="sobrescribe MQTT_WORKERS")
+    parser.add_argument("--reduction", default="", help="REDUCTION_CONFIG (JSON o ruta) para el reductor de flujo")
+    parser.add_argument("--postgres", action="store_true", help="usar PostgresRepository real (.env)")
+    parser.add_argument("--rabbitmq", action="store_true", help="publicar en el RabbitMQ real (.env)")
+    parser.add_argument("--now", action="store_true",
+                        help="fechar con la hora de reproducción en vez de la de captura")
+    parser.add_argument("--profile", default="",
+                        help="guarda un perfil cProfile en esta ruta (procesa en línea, MQTT_WORKERS=0)")
+    args = parser.parse_args()
+
+    if args.profile:
+        # cProfile solo ve el hilo en el que se activa: sin workers todo el camino ocurre aquí
+        os.environ["MQTT_WORKERS"] = "0"
+    elif args.workers is not None:
+        os.environ["MQTT_WORKERS"] = str(args.workers)
+
+    # Importación diferida: MQTT_WORKERS debe estar fijado antes de crear el cliente
+    from src.easygrow_consumer.infrastructure.mqttclient import MQTTClient
+
+    latencies = StageLatencies()
+    if args.postgres:
+        from src.easygrow_consumer.infrastructure.bd import PostgresRepository
+        repository = TimedRepository(PostgresRepository(), latencies)
+    else:
+        repository = InMemoryRepository(latencies)
+    if args.rabbitmq:
+        if os.getenv("RABBITMQ_CONFIRMS", "0") == "1":
+            from src.easygrow_consumer.infrastructure.rabbit_mq_confirm_publisher import ConfirmingRabbitMQPublisher
+            publisher = ConfirmingRabbitMQPublisher()
+        else:
+            from src.easygrow_consumer.infrastructure.rabbit_mq_publisher import RabbitMQPublisher
+            publisher = RabbitMQPublisher()
+    else:
+        publisher = InMemoryPublisher(latencies)
+
+    reducer = StreamReducer.from_json(args.reduction) if args.reduction else None
+    sensor_service = SensorService(repository, publisher, reducer)
+    client = MQTTClient(sensor_service, BombaService(repository, publisher), connect=False)
+    if client.pipeline is not None:
+        client.pipeline.start()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    first_ts = None
+    last_ts = None
+    replayed = 0
+    started = time.perf_counter()
+    for ts, topic, payload in read_capture(args.path):
+        if args.limit and replayed >= args.limit:
+            break
+        if first_ts is None:
+            first_ts = ts
+        last_ts = ts
+        if args.speed > 0:
+            # Respetar los huecos originales entre mensajes, escalados por --speed
+            pause = started + (ts - first_ts) / args.speed - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+        if not args.now:
+            payload = stamp(payload, ts)
+        t0 = time.perf_counter()
+        client.on_message(None, None, FakeMessage(topic, payload))
+        latencies.observe("on_message", time.perf_counter() - t0)
+        replayed += 1
+    send_elapsed = time.perf_counter() - started
+
+    if client.pipeline is not None:
+        client.pipeline.stop()
+    # Las ventanas de agregación abiertas van al buffer antes de vaciarlo, como al apagar main.py
+    emitted = sensor_service.flush_reduced()
+    flushed = repository.flush()
+    elapsed = time.perf_counter() - started
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    span = (last_ts - first_ts) if replayed else 0.0
+    print(f"Mensajes reproducidos: {replayed} en {elapsed:.2f}s ({replayed / elapsed:,.0f} msg/s)"
+          if elapsed > 0 else f"Mensajes reproducidos: {replayed}")
+    if span > 0:
+        print(f"Periodo grabado: {span:.1f}s · reproducido a {span / send_elapsed:.1f}x")
+    print(f"Lecturas escritas al vaciar el buffer: {flushed}")
+    print(f"{'etapa':<12} {'p50 ms':>10} {'p99 ms':>10}")
+    for stage in ("on_message", "db", "publish"):
+        pct = latencies.percentiles(stage)
+        print(f"{stage:<12} {pct[50] * 1000:>10.3f} {pct[99] * 1000:>10.3f}")
+    if client.pipeline is not None:
+        stats = client.pipeline.stats()
+        print(f"Pipeline: {json.dumps({k: v for k, v in stats.items() if k != 'stages'})}")
+    if reducer is not None:
+        stats = reducer.stats()
+        print(f"Reductor: {stats['received']} lecturas recibidas, {stats['forwarded']} reenviadas "
+              f"({emitted} al cerrar las ventanas abiertas)")
+    if profiler is not None:
+        print(f"Perfil guardado en {args.profile} (las 20 funciones con más tiempo acumulado):")
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(20)
+
+    if args.postgres:
+        repository.close()
+    if args.rabbitmq:
+        publisher.close()
+
+
+if __name__ == "__main__":
+    main()
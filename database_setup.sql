@@ -42,19 +42,66 @@ CREATE TABLE IF NOT EXISTS sensores (
 );
 
 -- Tabla de Datos de Sensores
+-- Particionada por rango de fecha: el consumidor crea las particiones por
+-- adelantado y separa/elimina las antiguas (ver DB_PARTITIONS en .env; con el
+-- valor por defecto "auto" se activa solo al detectar esta tabla particionada).
+-- La MAC ya queda ligada al dispositivo a través de id_sensor, por lo que no
+-- se comprueba una segunda clave foránea en cada inserción.
+-- Una lectura se identifica por (id_sensor, fecha, valor): el consumidor inserta
+-- con ON CONFLICT DO NOTHING, así que reentregas y reenvíos no se duplican, y
+-- dos lecturas distintas con la misma marca de tiempo se guardan ambas.
 CREATE TABLE IF NOT EXISTS datos_sensores (
-    id_dato SERIAL PRIMARY KEY,
+    id_dato BIGSERIAL,
     id_sensor INTEGER NOT NULL,
     mac_address VARCHAR(17) NOT NULL,
     valor FLOAT NOT NULL,
     fecha TIMESTAMP NOT NULL,
+    PRIMARY KEY (id_dato, fecha),
+    CONSTRAINT uq_datos_sensores_lectura UNIQUE (id_sensor, fecha, valor),
     CONSTRAINT fk_sensor FOREIGN KEY (id_sensor) 
-        REFERENCES sensores(id_sensor) ON DELETE CASCADE,
-    CONSTRAINT fk_dispositivo_sensor FOREIGN KEY (mac_address) 
-        REFERENCES dispositivos(mac_address) ON DELETE CASCADE
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+) PARTITION BY RANGE (fecha);
+
+-- Recoge las lecturas fuera del rango de las particiones creadas
+CREATE TABLE IF NOT EXISTS datos_sensores_default PARTITION OF datos_sensores DEFAULT;
+
+-- Resúmenes por hora y por día, actualizados por el consumidor al escribir
+-- (DB_ROLLUPS=auto, por defecto: se activan al detectar estas tablas)
+CREATE TABLE IF NOT EXISTS datos_sensores_hora (
+    id_sensor INTEGER NOT NULL,
+    hora TIMESTAMP NOT NULL,
+    muestras INTEGER NOT NULL,
+    suma FLOAT NOT NULL,
+    minimo FLOAT NOT NULL,
+    maximo FLOAT NOT NULL,
+    PRIMARY KEY (id_sensor, hora),
+    CONSTRAINT fk_sensor_hora FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS datos_sensores_dia (
+    id_sensor INTEGER NOT NULL,
+    dia DATE NOT NULL,
+    muestras INTEGER NOT NULL,
+    suma FLOAT NOT NULL,
+    minimo FLOAT NOT NULL,
+    maximo FLOAT NOT NULL,
+    PRIMARY KEY (id_sensor, dia),
+    CONSTRAINT fk_sensor_dia FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
 );
 
--- Tabla de Eventos de Bombas
+-- Último valor por sensor (una fila por sensor)
+CREATE TABLE IF NOT EXISTS datos_sensores_ultimo (
+    id_sensor INTEGER PRIMARY KEY,
+    mac_address VARCHAR(17) NOT NULL,
+    valor FLOAT NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    CONSTRAINT fk_sensor_ultimo FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+-- Tabla de Eventos de Bombas (todos los encendidos y apagados, escritos por lotes)
 CREATE TABLE IF NOT EXISTS eventos_bomba (
     id_evento SERIAL PRIMARY KEY,
     id_sensor INTEGER NOT NULL,
@@ -63,21 +110,45 @@ CREATE TABLE IF NOT EXISTS eventos_bomba (
     valor_humedad FLOAT NOT NULL,
     tiempo_encendida_seg INTEGER,
     fecha TIMESTAMP NOT NULL,
+    CONSTRAINT uq_eventos_bomba UNIQUE (id_sensor, evento, fecha),
     CONSTRAINT fk_sensor_bomba FOREIGN KEY (id_sensor) 
         REFERENCES sensores(id_sensor) ON DELETE CASCADE,
     CONSTRAINT fk_dispositivo_bomba FOREIGN KEY (mac_address) 
         REFERENCES dispositivos(mac_address) ON DELETE CASCADE
 );
 
+-- Tabla de Activaciones de Bombas (duración de cada encendido)
+CREATE TABLE IF NOT EXISTS activaciones_bombas (
+    id_activacion SERIAL PRIMARY KEY,
+    id_sensor INTEGER NOT NULL,
+    mac_address VARCHAR(17) NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    duracion_segundos INTEGER,
+    CONSTRAINT uq_activaciones_bombas UNIQUE (id_sensor, fecha),
+    CONSTRAINT fk_sensor_activacion FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+-- Contadores por sensor de las activaciones, actualizados en la misma
+-- transacción que cada lote (sin recorrer activaciones_bombas)
+CREATE TABLE IF NOT EXISTS activaciones_bombas_resumen (
+    id_sensor INTEGER PRIMARY KEY,
+    activaciones INTEGER NOT NULL,
+    segundos_encendida BIGINT NOT NULL,
+    ultima_activacion TIMESTAMP NOT NULL,
+    CONSTRAINT fk_sensor_resumen_bomba FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
 -- ============================================================
 -- ÍNDICES PARA OPTIMIZAR CONSULTAS
 -- ============================================================
 
-CREATE INDEX IF NOT EXISTS idx_datos_sensores_id_sensor ON datos_sensores(id_sensor);
+-- (id_sensor, fecha) ya está indexado por uq_datos_sensores_lectura (prefijo)
 CREATE INDEX IF NOT EXISTS idx_datos_sensores_mac_address ON datos_sensores(mac_address);
 CREATE INDEX IF NOT EXISTS idx_datos_sensores_fecha ON datos_sensores(fecha);
 CREATE INDEX IF NOT EXISTS idx_sensores_id_dispositivo ON sensores(id_dispositivo);
-CREATE INDEX IF NOT EXISTS idx_eventos_bomba_id_sensor ON eventos_bomba(id_sensor);
+-- (id_sensor, ...) ya está indexado por uq_eventos_bomba
 CREATE INDEX IF NOT EXISTS idx_eventos_bomba_mac_address ON eventos_bomba(mac_address);
 CREATE INDEX IF NOT EXISTS idx_eventos_bomba_fecha ON eventos_bomba(fecha);
 
@@ -98,6 +169,10 @@ CREATE INDEX IF NOT EXISTS idx_eventos_bomba_fecha ON eventos_bomba(fecha);
 -- ============================================================
 
 -- Vista para ver últimos datos de sensores
+-- Lee de datos_sensores_ultimo en lugar de recorrer todo el histórico;
+-- rn se conserva (siempre 1) por compatibilidad con las consultas existentes.
+-- La tabla la mantiene el consumidor con los resúmenes activos (DB_ROLLUPS=auto
+-- o 1); con DB_ROLLUPS=0 esta vista queda vacía.
 CREATE OR REPLACE VIEW v_ultimos_datos_sensores AS
 SELECT 
     d.mac_address,
@@ -105,13 +180,35 @@ SELECT
     s.descripcion as sensor,
     s.tipo,
     s.unidad_medida,
-    ds.valor,
-    ds.fecha,
-    ROW_NUMBER() OVER (PARTITION BY ds.id_sensor ORDER BY ds.fecha DESC) as rn
-FROM datos_sensores ds
-JOIN sensores s ON ds.id_sensor = s.id_sensor
+    u.valor,
+    u.fecha,
+    1::bigint as rn
+FROM datos_sensores_ultimo u
+JOIN sensores s ON u.id_sensor = s.id_sensor
 JOIN dispositivos d ON s.id_dispositivo = d.id_dispositivo;
 
+-- Resumen horario con el promedio ya calculado
+CREATE OR REPLACE VIEW v_datos_sensores_hora AS
+SELECT 
+    h.id_sensor,
+    h.hora,
+    h.muestras,
+    h.suma / h.muestras as promedio,
+    h.minimo,
+    h.maximo
+FROM datos_sensores_hora h;
+
+-- Resumen diario con el promedio ya calculado
+CREATE OR REPLACE VIEW v_datos_sensores_dia AS
+SELECT 
+    dd.id_sensor,
+    dd.dia,
+    dd.muestras,
+    dd.suma / dd.muestras as promedio,
+    dd.minimo,
+    dd.maximo
+FROM datos_sensores_dia dd;
+
 -- Vista para ver últimos eventos de bombas
 CREATE OR REPLACE VIEW v_ultimos_eventos_bomba AS
 SELECT 
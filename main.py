@@ -1,13 +1,26 @@
 import sys
 import os
+import signal
+import time
+import asyncio
 import logging
+from dotenv import load_dotenv
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.easygrow_consumer.infrastructure.bd import PostgresRepository
 from src.easygrow_consumer.infrastructure.rabbit_mq_publisher import RabbitMQPublisher
+from src.easygrow_consumer.infrastructure.rabbit_mq_confirm_publisher import ConfirmingRabbitMQPublisher
 from src.easygrow_consumer.application.services import SensorService, BombaService
+from src.easygrow_consumer.application.reduction import StreamReducer
+from src.easygrow_consumer.application.pump_tracker import PumpTracker
 from src.easygrow_consumer.infrastructure.mqttclient import MQTTClient
+from src.easygrow_consumer.infrastructure.spool import StoreAndForward, SINK_DB, SINK_MQ
+from src.easygrow_consumer.infrastructure.bootstrap import LazyConnector, LazyRepository, LazyPublisher
+from src.easygrow_consumer.infrastructure.metrics import REGISTRY, HEALTH, start_http_server
+from src.easygrow_consumer.infrastructure.supervisor import (
+    WorkerSupervisor, HealthReporter, StopFlag, StopRequested, worker_path,
+)
 
 
 # Configurar logging con timestamps y niveles
@@ -19,54 +32,319 @@ logging.basicConfig(
 logger = logging.getLogger("easygrow.main")
 
 
+def _shutdown(db_repo, mq_pub, store_forward=None, sensor_service=None, pump_tracker=None):
+    """Vacía el buffer de lecturas y cierra las conexiones abiertas."""
+    if pump_tracker:
+        # Guarda el estado de las bombas para el próximo arranque
+        pump_tracker.stop()
+
+    if sensor_service:
+        # Las ventanas de agregación abiertas se emiten antes del último flush
+        sensor_service.stop()
+        try:
+            emitted = sensor_service.flush_reduced()
+            if emitted:
+                logger.info(f"📉 Ventanas de agregación cerradas al apagar: {emitted}")
+        except Exception:
+            logger.exception("Error cerrando las ventanas de agregación")
+
+    if store_forward:
+        # Detener el reenvío antes de cerrar los destinos
+        store_forward.stop()
+
+    try:
+        if db_repo:
+            try:
+                flushed = db_repo.flush()
+                logger.info(f"💾 Lecturas pendientes escritas en PostgreSQL: {flushed}")
+            except Exception:
+                logger.exception("Error escribiendo lecturas pendientes en PostgreSQL")
+            try:
+                db_repo.close()
+                logger.info("Conexión a PostgreSQL cerrada")
+            except Exception:
+                logger.exception("Error cerrando conexión a PostgreSQL")
+    except Exception:
+        logger.exception("Error al intentar limpiar recursos de BD")
+
+    try:
+        if mq_pub:
+            mq_pub.close()
+            logger.info("RabbitMQ publisher cerrado")
+    except Exception:
+        logger.exception("Error cerrando RabbitMQ publisher")
+
+    if store_forward:
+        # Se cierra al final: el último flush puede haber dejado lecturas en el spool
+        store_forward.close()
+
+
+def _build_reducer():
+    """Reductor de flujo de sensores desde REDUCTION_CONFIG (JSON o ruta a un JSON); None si no se define."""
+    config = os.getenv("REDUCTION_CONFIG", "")
+    if not config:
+        return None
+    reducer = StreamReducer.from_json(config)
+    readings = REGISTRY.gauge("easygrow_reduction_readings", "Lecturas recibidas/reenviadas por el reductor", ("result",))
+    readings.labels(result="received").set_function(lambda: reducer.received)
+    readings.labels(result="forwarded").set_function(lambda: reducer.forwarded)
+    logger.info(f"📉 Reducción de flujo activa: default={reducer.default}, reglas={list(reducer.rules)}")
+    return reducer
+
+
+async def run_async():
+    """Runtime asyncio: asyncpg + aio-pika + aiomqtt sobre un único event loop."""
+    # Importación diferida: estas dependencias solo son necesarias en este modo
+    from src.easygrow_consumer.infrastructure.async_bd import AsyncPostgresRepository
+    from src.easygrow_consumer.infrastructure.async_rabbit_mq_publisher import AsyncRabbitMQPublisher
+    from src.easygrow_consumer.infrastructure.async_mqttclient import AsyncMQTTClient
+    from src.easygrow_consumer.application.services import AsyncSensorService, AsyncBombaService
+
+    db_repo = AsyncPostgresRepository()
+    mq_pub = AsyncRabbitMQPublisher()
+    sensor_service = AsyncSensorService(db_repo, mq_pub, _build_reducer())
+    pump_tracker = PumpTracker.from_env()
+    summaries_task = None
+    expiry_task = None
+    try:
+        await asyncio.gather(db_repo.connect(), mq_pub.connect())
+
+        mqtt_client = AsyncMQTTClient(
+            sensor_service,
+            AsyncBombaService(db_repo, mq_pub, pump_tracker),
+        )
+        if pump_tracker is not None:
+            summaries_task = asyncio.create_task(_publish_pump_summaries(pump_tracker, mq_pub))
+        if sensor_service.reducer is not None:
+            expiry_task = asyncio.create_task(_expire_reduced(sensor_service))
+        logger.info("🎯 Preparado para escuchar mensajes MQTT (runtime asyncio)")
+        await mqtt_client.start()
+    finally:
+        if summaries_task is not None:
+            summaries_task.cancel()
+            pump_tracker.stop()
+        if expiry_task is not None:
+            expiry_task.cancel()
+        try:
+            await sensor_service.flush_reduced()
+        except Exception:
+            logger.exception("Error cerrando las ventanas de agregación")
+        try:
+            flushed = await db_repo.flush()
+            logger.info(f"💾 Lecturas pendientes escritas en PostgreSQL: {flushed}")
+        except Exception:
+            logger.exception("Error escribiendo lecturas pendientes en PostgreSQL")
+        await db_repo.close()
+        await mq_pub.close()
+
+
+async def _publish_pump_summaries(tracker, mq_pub):
+    """Equivalente asyncio del hilo de PumpTracker.start()."""
+    while True:
+        await asyncio.sleep(tracker.report_interval)
+        try:
+            for summary in tracker.report():
+                await mq_pub.publish(summary)
+        except Exception:
+            logger.exception("❌ Error publicando los resúmenes de bombas")
+
+
+def _build_publisher():
+    if os.getenv("RABBITMQ_CONFIRMS", "0") == "1":
+        return ConfirmingRabbitMQPublisher()
+    return RabbitMQPublisher()
+
+
+def _lazy_sinks():
+    """PostgreSQL y RabbitMQ conectando a la vez en segundo plano (CONSUMER_STARTUP=lazy).
+
+    Con spool los datos que lleguen antes de la conexión se guardan en él al
+    instante; sin spool los workers del pipeline esperan y los mensajes se
+    acumulan en sus colas.
+    """
+    wait = 0 if os.getenv("SPOOL_PATH", "spool/easygrow_spool.sqlite3") else None
+    db_connector = LazyConnector("postgres", PostgresRepository)
+    mq_connector = LazyConnector("rabbitmq", _build_publisher)
+    db_connector.when_ready(lambda _: logger.info("✅ Conexión a PostgreSQL establecida"))
+    mq_connector.when_ready(lambda _: logger.info("✅ RabbitMQ publisher inicializado"))
+    db_connector.start()
+    mq_connector.start()
+    return LazyRepository(db_connector, wait), LazyPublisher(mq_connector, wait)
+
+
+async def _expire_reduced(sensor_service):
+    """Equivalente asyncio de SensorService.start(): cierra las ventanas vencidas."""
+    while True:
+        await asyncio.sleep(sensor_service.reducer.sweep_interval)
+        try:
+            await sensor_service.flush_reduced(force=False)
+        except Exception:
+            logger.exception("❌ Error cerrando las ventanas de agregación vencidas")
+
+
+def _start_metrics():
+    """Expone /metrics si METRICS_PORT está definido (vacío lo desactiva)."""
+    port = os.getenv("METRICS_PORT", "9108")
+    if not port:
+        return
+    try:
+        start_http_server(int(port), os.getenv("METRICS_ADDR", "127.0.0.1"))
+    except Exception:
+        # Las métricas no deben impedir que el consumidor arranque
+        logger.exception("❌ No se pudo iniciar el servidor de métricas")
+
+
 def main():
+    load_dotenv()
+    processes = int(os.getenv("CONSUMER_PROCESSES", "1"))
+    runtime = os.getenv("CONSUMER_RUNTIME", "sync")
+    _start_metrics()
+
+    if runtime == "async":
+        if processes > 1:
+            logger.warning("⚠️ CONSUMER_PROCESSES solo aplica al runtime sync; se usa un único proceso")
+        logger.info("🚀 Iniciando EasyGrow Consumer (runtime asyncio)...")
+        try:
+            asyncio.run(run_async())
+        except KeyboardInterrupt:
+            logger.info("\n👋 Aplicación detenida por el usuario (KeyboardInterrupt)")
+        except Exception:
+            logger.exception("La aplicación terminó debido a un error crítico")
+            sys.exit(1)
+        return
+
+    if processes > 1:
+        # Supervisor: N procesos con sus propias conexiones, repartidos por el broker
+        WorkerSupervisor.from_env(_worker_main, processes).run()
+        return
+
+    _run_sync()
+
+
+def _worker_main(index, health_conn):
+    """Punto de entrada de cada proceso worker lanzado por el supervisor."""
+    # El supervisor coordina el apagado (SIGTERM): Ctrl+C en la terminal no debe cortar al worker a medias
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_flag = StopFlag().install()
+    load_dotenv()
+
+    # Suscripción compartida y archivos locales propios de este worker
+    os.environ["MQTT_SHARE_GROUP"] = os.getenv("MQTT_SHARE_GROUP") or "easygrow"
+    os.environ["MQTT_CLIENT_ID"] = f"{os.getenv('MQTT_CLIENT_ID') or 'easygrow'}-w{index}-{os.getpid()}"
+    os.environ["SPOOL_PATH"] = worker_path(os.getenv("SPOOL_PATH", "spool/easygrow_spool.sqlite3"), index)
+    os.environ["PUMP_STATE_PATH"] = worker_path(os.getenv("PUMP_STATE_PATH", "spool/pump_state.json"), index)
+    if os.getenv("MQTT_CAPTURE_PATH"):
+        os.environ["MQTT_CAPTURE_PATH"] = worker_path(os.environ["MQTT_CAPTURE_PATH"], index)
+    if os.getenv("MQTT_SPILL_DIR"):
+        os.environ["MQTT_SPILL_DIR"] = os.path.join(os.environ["MQTT_SPILL_DIR"], f"w{index}")
+    # Las métricas agregadas las expone el supervisor
+    os.environ["METRICS_PORT"] = ""
+
+    _run_sync(stop_flag, health_conn, index)
+
+
+def _run_sync(stop_flag=None, health_conn=None, worker_index=None):
+    """Runtime sync; si se pasa `stop_flag` se ejecuta como worker del supervisor."""
     logger.info("🚀 Iniciando EasyGrow Consumer...")
 
     db_repo = None
     mq_pub = None
+    store_forward = None
     sensor_service = None
     bomba_service = None
+    pump_tracker = None
     mqtt_client = None
 
+    # sequential: conecta cada dependencia antes de escuchar MQTT (falla si alguna no está)
+    # lazy: escucha MQTT de inmediato y conecta PostgreSQL/RabbitMQ en segundo plano
+    lazy = os.getenv("CONSUMER_STARTUP", "sequential") == "lazy"
+
     try:
         # Inicializar repositorios compartidos
-        try:
-            logger.info("Conectando a PostgreSQL...")
-            db_repo = PostgresRepository()
-            logger.info("✅ Conexión a PostgreSQL establecida")
-        except Exception:
-            logger.exception("❌ Falló la conexión a PostgreSQL")
-            raise
+        if lazy:
+            logger.info("Conectando a PostgreSQL y RabbitMQ en segundo plano...")
+            db_repo, mq_pub = _lazy_sinks()
+        else:
+            try:
+                logger.info("Conectando a PostgreSQL...")
+                db_repo = PostgresRepository()
+                HEALTH.readiness("postgres", db_repo.ping)
+                logger.info("✅ Conexión a PostgreSQL establecida")
+            except Exception:
+                logger.exception("❌ Falló la conexión a PostgreSQL")
+                raise
 
-        try:
-            logger.info("Inicializando RabbitMQ publisher...")
-            mq_pub = RabbitMQPublisher()
-            logger.info("✅ RabbitMQ publisher inicializado")
-        except Exception:
-            logger.exception("❌ Falló la inicialización de RabbitMQPublisher")
-            raise
+            try:
+                logger.info("Inicializando RabbitMQ publisher...")
+                mq_pub = _build_publisher()
+                HEALTH.readiness("rabbitmq", mq_pub.ping)
+                logger.info("✅ RabbitMQ publisher inicializado")
+            except Exception:
+                logger.exception("❌ Falló la inicialización de RabbitMQPublisher")
+                raise
+
+        # Spool local: guarda lo que PostgreSQL o RabbitMQ no acepten y lo reenvía después
+        repository, publisher = db_repo, mq_pub
+        if os.getenv("SPOOL_PATH", "spool/easygrow_spool.sqlite3"):
+            try:
+                store_forward = StoreAndForward.from_env(db_repo, mq_pub)
+                store_forward.start()
+                repository = store_forward.spooling_repository
+                publisher = store_forward.spooling_publisher
+            except Exception:
+                logger.exception("❌ Error al inicializar el spool local")
+                raise
 
         # Inicializar servicios (ambos usan el mismo publisher)
         try:
             logger.info("Creando servicios de aplicación (Sensor y Bomba)...")
-            sensor_service = SensorService(db_repo, mq_pub)
-            bomba_service = BombaService(db_repo, mq_pub)
+            sensor_service = SensorService(repository, publisher, _build_reducer())
+            sensor_service.start()
+            pump_tracker = PumpTracker.from_env()
+            bomba_service = BombaService(repository, publisher, pump_tracker)
             logger.info("✅ Servicios creados correctamente")
         except Exception:
             logger.exception("❌ Error al crear los servicios SensorService/BombaService")
             raise
 
+        if pump_tracker is not None:
+            # Los resúmenes se publican directamente: son acumulados y no pasan por el spool
+            pump_tracker.start(mq_pub.publish)
+            logger.info(f"💧 Resúmenes de bombas cada {pump_tracker.report_interval}s")
+
         # Inicializar cliente MQTT con ambos servicios
         try:
             logger.info("Inicializando cliente MQTT...")
-            mqtt_client = MQTTClient(sensor_service, bomba_service)
+            mqtt_client = MQTTClient(sensor_service, bomba_service, lazy=lazy)
             logger.info("✅ Cliente MQTT creado")
         except Exception:
             logger.exception("❌ Error al inicializar MQTTClient")
             raise
 
+        # /readyz: dependencias conectadas; /healthz: bucle MQTT y workers del pipeline vivos
+        HEALTH.readiness("mqtt", lambda: mqtt_client.connected)
+        HEALTH.liveness("mqtt_loop", lambda: time.monotonic() - mqtt_client.last_loop < 30)
+        if mqtt_client.pipeline is not None:
+            HEALTH.liveness("pipeline", mqtt_client.pipeline.alive)
+        HEALTH.milestone("ready")
+
+        if stop_flag is not None:
+            # Estado periódico al supervisor; al recibir SIGTERM se detiene el cliente
+            stop_flag.started()
+            HealthReporter(
+                worker_index, stop_flag, health_conn,
+                on_stop=mqtt_client.stop,
+                collect=lambda: {
+                    "connected": int(mqtt_client.connected),
+                    "queue_depth": sum(mqtt_client.pipeline.stats()["queue_depth"]) if mqtt_client.pipeline else 0,
+                    "spool_pending": store_forward.spool.pending(SINK_DB) + store_forward.spool.pending(SINK_MQ)
+                    if store_forward else 0,
+                },
+                interval=float(os.getenv("WORKER_HEALTH_INTERVAL", "10")),
+            ).start()
+
         logger.info("🎯 Preparado para escuchar mensajes MQTT")
-        logger.info("📡 Tópicos: sensor/# y bomba/estado")
+        logger.info(f"📡 Tópicos: {', '.join(mqtt_client.topics)}")
         logger.info("📦 Colas RabbitMQ: datos_sensores y eventos_bomba")
 
         # Iniciar el loop de MQTT
@@ -80,25 +358,18 @@ def main():
             logger.exception("❌ Excepción durante mqtt_client.start()")
             raise
 
+        # Apagado ordenado: escribir las lecturas que sigan en el buffer
+        _shutdown(db_repo, mq_pub, store_forward, sensor_service, pump_tracker)
+
+    except StopRequested:
+        # SIGTERM del supervisor durante el arranque (p. ej. reintentando conectar)
+        logger.info("🛑 Parada solicitada durante el arranque")
+        _shutdown(db_repo, mq_pub, store_forward, sensor_service, pump_tracker)
+
     except Exception:
         logger.error("La aplicación terminó debido a un error crítico. Revisa los logs para más detalles")
         # Intentar cerrar conexiones si existen
-        try:
-            if mq_pub:
-                mq_pub.close()
-                logger.info("RabbitMQ publisher cerrado")
-        except Exception:
-            logger.exception("Error cerrando RabbitMQ publisher")
-
-        try:
-            if db_repo and hasattr(db_repo, 'conn'):
-                try:
-                    db_repo.conn.close()
-                    logger.info("Conexión a PostgreSQL cerrada")
-                except Exception:
-                    logger.exception("Error cerrando conexión a PostgreSQL")
-        except Exception:
-            logger.exception("Error al intentar limpiar recursos de BD")
+        _shutdown(db_repo, mq_pub, store_forward, sensor_service, pump_tracker)
 
         # Salir con código de error
         sys.exit(1)
@@ -0,0 +1,179 @@
+-- ============================================================
+-- Migración 001: particionar datos_sensores y crear resúmenes
+-- Base de Datos: PostgreSQL (11 o superior)
+-- Descripción: Convierte datos_sensores en una tabla particionada por
+-- mes sobre `fecha`, copia el histórico y crea las tablas de resumen
+-- por hora/día y de último valor por sensor, rellenándolas con los
+-- datos existentes.
+--
+-- Uso:
+--   psql -U easygrow -d easygrow_db -f migrations/001_particionar_datos_sensores.sql
+--
+-- Detén el consumidor mientras se ejecuta. La tabla original queda como
+-- datos_sensores_legacy para poder verificar antes de eliminarla.
+--
+-- Particiones: las lecturas fuera de las particiones creadas aquí caen en
+-- datos_sensores_default. El consumidor mantiene las de los próximos meses
+-- por defecto (DB_PARTITIONS=auto detecta la tabla particionada); no lo
+-- desactives con DB_PARTITIONS=0 salvo que las crees tú. Si la partición por
+-- defecto ya tiene filas de un mes, PartitionManager.ensure() las mueve a la
+-- partición nueva al crearla (CREATE ... PARTITION OF fallaría con "updated
+-- partition constraint for default partition would be violated").
+-- ============================================================
+
+BEGIN;
+
+-- 1. Apartar la tabla actual (con su índice, secuencia e índices secundarios)
+ALTER TABLE datos_sensores RENAME TO datos_sensores_legacy;
+ALTER INDEX IF EXISTS datos_sensores_pkey RENAME TO datos_sensores_legacy_pkey;
+ALTER SEQUENCE IF EXISTS datos_sensores_id_dato_seq RENAME TO datos_sensores_legacy_id_dato_seq;
+ALTER INDEX IF EXISTS idx_datos_sensores_id_sensor RENAME TO idx_datos_sensores_legacy_id_sensor;
+ALTER INDEX IF EXISTS idx_datos_sensores_mac_address RENAME TO idx_datos_sensores_legacy_mac_address;
+ALTER INDEX IF EXISTS idx_datos_sensores_fecha RENAME TO idx_datos_sensores_legacy_fecha;
+
+-- 2. Nueva tabla particionada
+CREATE TABLE datos_sensores (
+    id_dato BIGSERIAL,
+    id_sensor INTEGER NOT NULL,
+    mac_address VARCHAR(17) NOT NULL,
+    valor FLOAT NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    PRIMARY KEY (id_dato, fecha),
+    CONSTRAINT fk_sensor FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+) PARTITION BY RANGE (fecha);
+
+CREATE TABLE datos_sensores_default PARTITION OF datos_sensores DEFAULT;
+
+-- 3. Particiones mensuales para el histórico y los dos meses siguientes.
+-- Los nombres (datos_sensores_pAAAAMM) son los que usa el PartitionManager.
+DO $$
+DECLARE
+    desde DATE;
+    hasta DATE := (date_trunc('month', now()) + interval '3 months')::date;
+BEGIN
+    SELECT COALESCE(date_trunc('month', min(fecha)), date_trunc('month', now()))::date
+    INTO desde FROM datos_sensores_legacy;
+
+    WHILE desde < hasta LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF datos_sensores FOR VALUES FROM (%L) TO (%L)',
+            'datos_sensores_p' || to_char(desde, 'YYYYMM'),
+            desde,
+            (desde + interval '1 month')::date
+        );
+        desde := (desde + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+-- 4. Copiar el histórico conservando los identificadores
+INSERT INTO datos_sensores (id_dato, id_sensor, mac_address, valor, fecha)
+SELECT id_dato, id_sensor, mac_address, valor, fecha FROM datos_sensores_legacy;
+
+SELECT setval(
+    pg_get_serial_sequence('datos_sensores', 'id_dato'),
+    COALESCE((SELECT max(id_dato) FROM datos_sensores), 0) + 1,
+    false
+);
+
+CREATE INDEX IF NOT EXISTS idx_datos_sensores_id_sensor ON datos_sensores(id_sensor, fecha);
+CREATE INDEX IF NOT EXISTS idx_datos_sensores_mac_address ON datos_sensores(mac_address);
+CREATE INDEX IF NOT EXISTS idx_datos_sensores_fecha ON datos_sensores(fecha);
+
+-- 5. Tablas de resumen
+CREATE TABLE IF NOT EXISTS datos_sensores_hora (
+    id_sensor INTEGER NOT NULL,
+    hora TIMESTAMP NOT NULL,
+    muestras INTEGER NOT NULL,
+    suma FLOAT NOT NULL,
+    minimo FLOAT NOT NULL,
+    maximo FLOAT NOT NULL,
+    PRIMARY KEY (id_sensor, hora),
+    CONSTRAINT fk_sensor_hora FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS datos_sensores_dia (
+    id_sensor INTEGER NOT NULL,
+    dia DATE NOT NULL,
+    muestras INTEGER NOT NULL,
+    suma FLOAT NOT NULL,
+    minimo FLOAT NOT NULL,
+    maximo FLOAT NOT NULL,
+    PRIMARY KEY (id_sensor, dia),
+    CONSTRAINT fk_sensor_dia FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS datos_sensores_ultimo (
+    id_sensor INTEGER PRIMARY KEY,
+    mac_address VARCHAR(17) NOT NULL,
+    valor FLOAT NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    CONSTRAINT fk_sensor_ultimo FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+INSERT INTO datos_sensores_hora (id_sensor, hora, muestras, suma, minimo, maximo)
+SELECT id_sensor, date_trunc('hour', fecha), count(*), sum(valor), min(valor), max(valor)
+FROM datos_sensores
+GROUP BY 1, 2
+ON CONFLICT DO NOTHING;
+
+INSERT INTO datos_sensores_dia (id_sensor, dia, muestras, suma, minimo, maximo)
+SELECT id_sensor, date_trunc('day', fecha)::date, count(*), sum(valor), min(valor), max(valor)
+FROM datos_sensores
+GROUP BY 1, 2
+ON CONFLICT DO NOTHING;
+
+INSERT INTO datos_sensores_ultimo (id_sensor, mac_address, valor, fecha)
+SELECT DISTINCT ON (id_sensor) id_sensor, mac_address, valor, fecha
+FROM datos_sensores
+ORDER BY id_sensor, fecha DESC
+ON CONFLICT DO NOTHING;
+
+-- 6. Vistas sobre las tablas nuevas. El consumidor las mantiene al detectar
+-- las tablas de resumen (DB_ROLLUPS=auto, por defecto); con DB_ROLLUPS=0
+-- v_ultimos_datos_sensores deja de actualizarse.
+CREATE OR REPLACE VIEW v_ultimos_datos_sensores AS
+SELECT 
+    d.mac_address,
+    d.nombre as dispositivo,
+    s.descripcion as sensor,
+    s.tipo,
+    s.unidad_medida,
+    u.valor,
+    u.fecha,
+    1::bigint as rn
+FROM datos_sensores_ultimo u
+JOIN sensores s ON u.id_sensor = s.id_sensor
+JOIN dispositivos d ON s.id_dispositivo = d.id_dispositivo;
+
+CREATE OR REPLACE VIEW v_datos_sensores_hora AS
+SELECT 
+    h.id_sensor,
+    h.hora,
+    h.muestras,
+    h.suma / h.muestras as promedio,
+    h.minimo,
+    h.maximo
+FROM datos_sensores_hora h;
+
+CREATE OR REPLACE VIEW v_datos_sensores_dia AS
+SELECT 
+    dd.id_sensor,
+    dd.dia,
+    dd.muestras,
+    dd.suma / dd.muestras as promedio,
+    dd.minimo,
+    dd.maximo
+FROM datos_sensores_dia dd;
+
+COMMIT;
+
+-- Tras verificar los datos:
+-- DROP TABLE datos_sensores_legacy;
+
+-- ============================================================
+-- FIN DE LA MIGRACIÓN
+-- ============================================================
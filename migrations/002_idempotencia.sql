@@ -0,0 +1,68 @@
+-- ============================================================
+-- Migración 002: ingesta idempotente
+-- Base de Datos: PostgreSQL (11 o superior)
+-- Descripción: Añade las restricciones únicas con las que el consumidor
+-- inserta usando ON CONFLICT DO NOTHING, de modo que las reentregas
+-- MQTT (QoS 1) y los reenvíos del spool no dupliquen filas:
+--   - datos_sensores:       (id_sensor, fecha)
+--   - activaciones_bombas:  (id_sensor, fecha)
+-- Elimina antes los duplicados que ya existan y crea activaciones_bombas
+-- si faltaba.
+--
+-- Uso (después de la migración 001):
+--   psql -U easygrow -d easygrow_db -f migrations/002_idempotencia.sql
+--
+-- Detén el consumidor mientras se ejecuta: la versión nueva necesita las
+-- restricciones para poder preparar sus sentencias.
+-- ============================================================
+
+BEGIN;
+
+-- 1. Lecturas duplicadas: se conserva la primera que se insertó
+DELETE FROM datos_sensores a
+USING datos_sensores b
+WHERE a.id_sensor = b.id_sensor
+  AND a.fecha = b.fecha
+  AND a.id_dato > b.id_dato;
+
+-- 2. Restricción única (incluye fecha, la clave de partición) y limpieza del
+--    índice que ahora es redundante
+ALTER TABLE datos_sensores
+    ADD CONSTRAINT uq_datos_sensores_lectura UNIQUE (id_sensor, fecha);
+DROP INDEX IF EXISTS idx_datos_sensores_id_sensor;
+
+-- 3. Activaciones de bombas
+CREATE TABLE IF NOT EXISTS activaciones_bombas (
+    id_activacion SERIAL PRIMARY KEY,
+    id_sensor INTEGER NOT NULL,
+    mac_address VARCHAR(17) NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    duracion_segundos INTEGER,
+    CONSTRAINT fk_sensor_activacion FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+DELETE FROM activaciones_bombas a
+USING activaciones_bombas b
+WHERE a.id_sensor = b.id_sensor
+  AND a.fecha = b.fecha
+  AND a.id_activacion > b.id_activacion;
+
+ALTER TABLE activaciones_bombas
+    ADD CONSTRAINT uq_activaciones_bombas UNIQUE (id_sensor, fecha);
+
+-- 4. Recalcular los resúmenes, que pudieron contar lecturas duplicadas
+--    (las tablas existen desde la migración 001)
+TRUNCATE datos_sensores_hora, datos_sensores_dia;
+
+INSERT INTO datos_sensores_hora (id_sensor, hora, muestras, suma, minimo, maximo)
+SELECT id_sensor, date_trunc('hour', fecha), count(*), sum(valor), min(valor), max(valor)
+FROM datos_sensores
+GROUP BY 1, 2;
+
+INSERT INTO datos_sensores_dia (id_sensor, dia, muestras, suma, minimo, maximo)
+SELECT id_sensor, date_trunc('day', fecha)::date, count(*), sum(valor), min(valor), max(valor)
+FROM datos_sensores
+GROUP BY 1, 2;
+
+COMMIT;
@@ -0,0 +1,50 @@
+-- ============================================================
+-- Migración 003: eventos de bomba por lotes y resumen de activaciones
+-- Base de Datos: PostgreSQL (11 o superior)
+-- Descripción: El consumidor escribe ahora todos los eventos de bomba en
+-- eventos_bomba (ON CONFLICT DO NOTHING sobre id_sensor, evento, fecha) y
+-- mantiene por sensor el número de activaciones y el tiempo total de
+-- encendido en activaciones_bombas_resumen, en lugar de contarlos con
+-- COUNT(*) sobre todo el histórico.
+--
+-- Uso (después de la migración 002):
+--   psql -U easygrow -d easygrow_db -f migrations/003_eventos_bomba.sql
+--
+-- Detén el consumidor mientras se ejecuta: la versión nueva necesita la
+-- restricción y la tabla para poder preparar sus sentencias.
+-- ============================================================
+
+BEGIN;
+
+-- 1. Eventos duplicados: se conserva el primero que se insertó
+DELETE FROM eventos_bomba a
+USING eventos_bomba b
+WHERE a.id_sensor = b.id_sensor
+  AND a.evento = b.evento
+  AND a.fecha = b.fecha
+  AND a.id_evento > b.id_evento;
+
+ALTER TABLE eventos_bomba
+    ADD CONSTRAINT uq_eventos_bomba UNIQUE (id_sensor, evento, fecha);
+DROP INDEX IF EXISTS idx_eventos_bomba_id_sensor;
+
+-- 2. Resumen de activaciones por sensor, relleno con el histórico
+CREATE TABLE IF NOT EXISTS activaciones_bombas_resumen (
+    id_sensor INTEGER PRIMARY KEY,
+    activaciones INTEGER NOT NULL,
+    segundos_encendida BIGINT NOT NULL,
+    ultima_activacion TIMESTAMP NOT NULL,
+    CONSTRAINT fk_sensor_resumen_bomba FOREIGN KEY (id_sensor) 
+        REFERENCES sensores(id_sensor) ON DELETE CASCADE
+);
+
+INSERT INTO activaciones_bombas_resumen (id_sensor, activaciones, segundos_encendida, ultima_activacion)
+SELECT id_sensor, count(*), coalesce(sum(duracion_segundos), 0), max(fecha)
+FROM activaciones_bombas
+GROUP BY id_sensor
+ON CONFLICT (id_sensor) DO UPDATE SET
+    activaciones = EXCLUDED.activaciones,
+    segundos_encendida = EXCLUDED.segundos_encendida,
+    ultima_activacion = EXCLUDED.ultima_activacion;
+
+COMMIT;
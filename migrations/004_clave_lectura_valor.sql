@@ -0,0 +1,29 @@
+-- ============================================================
+-- Migración 004: clave de lectura con el valor
+-- Base de Datos: PostgreSQL (11 o superior)
+-- Descripción: uq_datos_sensores_lectura pasa de (id_sensor, fecha) a
+-- (id_sensor, fecha, valor). Con la clave anterior, dos lecturas distintas
+-- de un sensor con la misma marca de tiempo (p. ej. `ts` en segundos y
+-- varias muestras por segundo) se descartaban en silencio con
+-- ON CONFLICT DO NOTHING. Las reentregas y reenvíos de una misma lectura
+-- siguen chocando, porque repiten sensor, fecha y valor.
+--
+-- Uso (después de la migración 002):
+--   psql -U easygrow -d easygrow_db -f migrations/004_clave_lectura_valor.sql
+--
+-- Detén el consumidor mientras se ejecuta: la versión nueva prepara sus
+-- sentencias con ON CONFLICT (id_sensor, fecha, valor). La restricción se
+-- reconstruye sobre toda la tabla, lo que en históricos grandes tarda.
+-- ============================================================
+
+BEGIN;
+
+ALTER TABLE datos_sensores
+    DROP CONSTRAINT IF EXISTS uq_datos_sensores_lectura;
+
+-- Incluye fecha (la clave de partición); su prefijo (id_sensor, fecha)
+-- sigue sirviendo a las consultas por sensor y rango de fechas
+ALTER TABLE datos_sensores
+    ADD CONSTRAINT uq_datos_sensores_lectura UNIQUE (id_sensor, fecha, valor);
+
+COMMIT;
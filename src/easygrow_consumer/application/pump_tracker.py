@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from src.easygrow_consumer.domain.entities import BombaEvent, BombaResumen
+
+logger = logging.getLogger("easygrow.pumps")
+
+SNAPSHOT_VERSION = 1
+
+
+def _is_off(evento: str) -> bool:
+    evento = evento.upper()
+    return "DESACTIV" in evento or "APAG" in evento or evento == "OFF"
+
+
+def _is_on(evento: str) -> bool:
+    evento = evento.upper()
+    return "ACTIV" in evento or "ENCEND" in evento or evento == "ON"
+
+
+class _PumpState:
+    __slots__ = (
+        "mac_address", "id_sensor", "on_since", "activaciones", "segundos",
+        "intervals", "last_change", "stuck_reported",
+    )
+
+    def __init__(self, mac_address: str, id_sensor: int):
+        self.mac_address = mac_address
+        self.id_sensor = id_sensor
+        self.on_since: Optional[datetime] = None
+        self.activaciones = 0
+        self.segundos = 0.0
+        # Encendidos (inicio, fin) recientes para el ciclo de trabajo
+        self.intervals = deque()
+        self.last_change: Optional[datetime] = None
+        self.stuck_reported = False
+
+
+class PumpTracker:
+    """Máquina de estados por bomba (mac_address, id_sensor) alimentada por sus eventos.
+
+    Empareja encendido y apagado para calcular el tiempo encendida sin
+    depender solo de `tiempo_encendida_seg`, y mantiene de forma incremental
+    el ciclo de trabajo de la última `duty_window`, el agua estimada con
+    `flow_lpm` (litros por minuto) y si la bomba lleva más de `stuck_after`
+    segundos encendida. `report()` devuelve un BombaResumen por bomba y
+    guarda el estado en `state_path` para que un reinicio no lo pierda.
+    """
+
+    def __init__(self, flow_lpm: float = 0.0, stuck_after: float = 1800.0, duty_window: float = 3600.0,
+                 report_interval: float = 60.0, state_path: Optional[str] = None):
+        self.flow_lpm = flow_lpm
+        self.stuck_after = timedelta(seconds=stuck_after)
+        self.duty_window = timedelta(seconds=duty_window)
+        self.report_interval = report_interval
+        self.state_path = state_path
+
+        self._pumps: Dict[Tuple[str, int], _PumpState] = {}
+        self._lock = threading.Lock()
+        self.ignored = 0
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["PumpTracker"]:
+        """Tracker configurado en .env, o None si no se activa con PUMP_TRACKER=1."""
+        if os.getenv("PUMP_TRACKER", "0") != "1":
+            return None
+        tracker = cls(
+            flow_lpm=float(os.getenv("PUMP_FLOW_LPM", "0")),
+            stuck_after=float(os.getenv("PUMP_STUCK_AFTER", "1800")),
+            duty_window=float(os.getenv("PUMP_DUTY_WINDOW", "3600")),
+            report_interval=float(os.getenv("PUMP_SUMMARY_INTERVAL", "60")),
+            state_path=os.getenv("PUMP_STATE_PATH", "spool/pump_state.json") or None,
+        )
+        tracker.restore()
+        return tracker
+
+    def observe(self, event: BombaEvent):
+        if _is_off(event.evento):
+            on = False
+        elif _is_on(event.evento):
+            on = True
+        else:
+            self.ignored += 1
+            logger.debug(f"ℹ️ Evento de bomba no reconocido: {event.evento}")
+            return
+
+        key = (event.mac_address, event.id_sensor)
+        with self._lock:
+            pump = self._pumps.get(key)
+            if pump is None:
+                pump = self._pumps[key] = _PumpState(event.mac_address, event.id_sensor)
+            if on:
+                # Un encendido repetido conserva el inicio original
+                if pump.on_since is None:
+                    pump.on_since = event.fecha
+                    pump.last_change = event.fecha
+                return
+            self._finish(pump, event)
+
+    def _finish(self, pump: _PumpState, event: BombaEvent):
+        reported = event.tiempo_encendida_seg
+        if pump.on_since is not None and event.fecha >= pump.on_since:
+            seconds = (event.fecha - pump.on_since).total_seconds()
+            if reported is not None and abs(reported - seconds) > max(5.0, 0.1 * seconds):
+                logger.debug(
+                    f"⚠️ Bomba {pump.mac_address}/{pump.id_sensor}: duración informada {reported}s, "
+                    f"calculada {seconds:.0f}s"
+                )
+        elif reported is not None and reported > 0:
+            # Se perdió el encendido (p. ej. antes de arrancar el consumidor)
+            seconds = float(reported)
+        else:
+            pump.on_since = None
+            return
+
+        pump.activaciones += 1
+        pump.segundos += seconds
+        pump.intervals.append((event.fecha - timedelta(seconds=seconds), event.fecha))
+        pump.on_since = None
+        pump.last_change = event.fecha
+        pump.stuck_reported = False
+
+    def summaries(self, now: Optional[datetime] = None) -> List[BombaResumen]:
+        now = now or datetime.now()
+        start = now - self.duty_window
+        window = self.duty_window.total_seconds()
+        summaries = []
+        with self._lock:
+            for pump in self._pumps.values():
+                while pump.intervals and pump.intervals[0][1] <= start:
+                    pump.intervals.popleft()
+                busy = sum(
+                    (min(end, now) - max(begin, start)).total_seconds()
+                    for begin, end in pump.intervals
+                    if end > start and begin < now
+                )
+                running = 0.0
+                if pump.on_since is not None:
+                    busy += max(0.0, (now - max(pump.on_since, start)).total_seconds())
+                    running = max(0.0, (now - pump.on_since).total_seconds())
+
+                stuck = pump.on_since is not None and now - pump.on_since > self.stuck_after
+                if stuck and not pump.stuck_reported:
+                    pump.stuck_reported = True
+                    logger.warning(
+                        f"🚨 Bomba {pump.mac_address}/{pump.id_sensor} encendida desde {pump.on_since} "
+                        f"({running / 60:.0f} min)"
+                    )
+
+                seconds = pump.segundos + running
+                summaries.append(BombaResumen(
+                    mac_address=pump.mac_address,
+                    id_sensor=pump.id_sensor,
+                    encendida=pump.on_since is not None,
+                    activaciones=pump.activaciones,
+                    segundos_encendida=seconds,
+                    ciclo_trabajo=min(1.0, busy / window) if window > 0 else 0.0,
+                    litros_estimados=seconds / 60 * self.flow_lpm,
+                    atascada=stuck,
+                    ultimo_cambio=pump.last_change,
+                    fecha=now,
+                ))
+        return summaries
+
+    def report(self) -> List[BombaResumen]:
+        """Resúmenes actuales; de paso guarda el estado en disco."""
+        summaries = self.summaries()
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar el estado de las bombas: {e}")
+        return summaries
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            pumps = [
+                {
+                    "mac_address": p.mac_address,
+                    "id_sensor": p.id_sensor,
+                    "on_since": p.on_since.isoformat() if p.on_since else None,
+                    "activaciones": p.activaciones,
+                    "segundos": p.segundos,
+                    "intervals": [(b.isoformat(), e.isoformat()) for b, e in p.intervals],
+                    "last_change": p.last_change.isoformat() if p.last_change else None,
+                }
+                for p in self._pumps.values()
+            ]
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Escritura atómica: un corte a mitad no deja un archivo corrupto
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "pumps": pumps}, f, separators=(",", ":"))
+        os.replace(tmp, self.state_path)
+
+    def restore(self) -> int:
+        """Carga el estado guardado. Devuelve cuántas bombas se recuperaron."""
+        if not self.state_path:
+            return 0
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Estado de bombas ilegible, se empieza de cero: {e}")
+            return 0
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return 0
+
+        def when(value):
+            return datetime.fromisoformat(value) if value else None
+
+        with self._lock:
+            for item in snapshot.get("pumps", []):
+                pump = _PumpState(item["mac_address"], item["id_sensor"])
+                pump.on_since = when(item["on_since"])
+                pump.activaciones = item["activaciones"]
+                pump.segundos = item["segundos"]
+                pump.intervals.extend((when(b), when(e)) for b, e in item["intervals"])
+                pump.last_change = when(item["last_change"])
+                self._pumps[(pump.mac_address, pump.id_sensor)] = pump
+        logger.info(f"💧 Estado de {len(snapshot.get('pumps', []))} bombas recuperado de {self.state_path}")
+        return len(self._pumps)
+
+    def start(self, publish: Callable[[BombaResumen], None]):
+        """Publica los resúmenes con `publish` cada `report_interval` segundos."""
+        self._thread = threading.Thread(target=self._loop, args=(publish,), name="pump-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar el estado de las bombas: {e}")
+
+    def _loop(self, publish: Callable[[BombaResumen], None]):
+        while not self._stop_event.wait(self.report_interval):
+            try:
+                for summary in self.report():
+                    publish(summary)
+            except Exception:
+                # Los resúmenes son acumulados: el siguiente periodo lo recupera
+                logger.exception("❌ Error publicando los resúmenes de bombas")
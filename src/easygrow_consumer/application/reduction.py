@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from src.easygrow_consumer.domain.entities import SensorData
+
+# Estadístico con el que se resume cada ventana de agregación
+BUCKET_STATS = ("avg", "min", "max", "last")
+
+# Estados sin ventana abierta ni lecturas en este tiempo se descartan
+IDLE_STATE_TTL = 3600.0
+
+
+@dataclass(frozen=True, slots=True)
+class ReductionRule:
+    """Cómo se reduce el flujo de un tipo de sensor.
+
+    - deadband: solo se reenvía si el valor cambia más que este umbral respecto
+      al último reenviado (0 = reenviar siempre).
+    - bucket_seconds: agrupa las lecturas en ventanas de N segundos y reenvía
+      una sola por ventana, resumida con `bucket_stat` (0 = sin agregación).
+    - heartbeat_seconds: aunque no supere el deadband, se reenvía si el último
+      valor reenviado es más antiguo que esto (0 = sin heartbeat; solo tiene
+      efecto junto con un deadband).
+    """
+
+    deadband: float = 0.0
+    bucket_seconds: float = 0.0
+    heartbeat_seconds: float = 0.0
+    bucket_stat: str = "avg"
+
+    def __post_init__(self):
+        if self.bucket_stat not in BUCKET_STATS:
+            raise ValueError(f"❌ bucket_stat inválido: {self.bucket_stat} (opciones: {', '.join(BUCKET_STATS)})")
+        if min(self.deadband, self.bucket_seconds, self.heartbeat_seconds) < 0:
+            raise ValueError("❌ Los parámetros de reducción no pueden ser negativos")
+
+    @property
+    def passthrough(self) -> bool:
+        return not (self.deadband or self.bucket_seconds)
+
+
+class _SensorState:
+    """Estado compacto por sensor: último valor reenviado y ventana abierta."""
+
+    __slots__ = (
+        "sent_value", "sent_at", "seen_at",
+        "bucket_start", "deadline", "count", "total", "minimum", "maximum", "last", "template",
+    )
+
+    def __init__(self):
+        self.sent_value: Optional[float] = None
+        self.sent_at = 0.0
+        self.seen_at = 0.0
+        self.bucket_start: Optional[float] = None
+        # Hora local (reloj del proceso) a la que vence la ventana abierta
+        self.deadline = 0.0
+        self.count = 0
+        self.total = 0.0
+        self.minimum = 0.0
+        self.maximum = 0.0
+        self.last = 0.0
+        # Primera lectura de la ventana: de ella salen la MAC, el nombre y la fecha
+        self.template: Optional[SensorData] = None
+
+
+class StreamReducer:
+    """Deadband, agregación por ventanas y heartbeat delante del guardado/publicación.
+
+    Las reglas se indexan por nombre de sensor (`SensorData.nombre`); la regla
+    "default" se aplica al resto. El estado se lleva por (mac_address, nombre).
+    """
+
+    def __init__(self, rules: Dict[str, ReductionRule], sweep_interval: float = 1.0):
+        self.rules = dict(rules)
+        self.default = self.rules.pop("default", ReductionRule())
+        self.sweep_interval = sweep_interval
+        self._states: Dict[Tuple[str, str], _SensorState] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+        self.received = 0
+        self.forwarded = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "StreamReducer":
+        """Crea el reductor desde un dict {"default": {...}, "<nombre sensor>": {...}}."""
+        rules = {name: ReductionRule(**params) for name, params in config.items()}
+        return cls(rules)
+
+    @classmethod
+    def from_json(cls, text: str) -> "StreamReducer":
+        """Acepta el JSON directamente o la ruta de un archivo que lo contiene."""
+        text = text.strip()
+        if not text.startswith("{"):
+            with open(text, encoding="utf-8") as f:
+                text = f.read()
+        return cls.from_config(json.loads(text))
+
+    def rule_for(self, nombre: str) -> ReductionRule:
+        return self.rules.get(nombre, self.default)
+
+    def offer(self, data: SensorData) -> List[SensorData]:
+        """Registra una lectura y devuelve las que deben guardarse y publicarse (0, 1 o 2)."""
+        rule = self.rule_for(data.nombre)
+        if rule.passthrough:
+            with self._lock:
+                self.received += 1
+                self.forwarded += 1
+            return [data]
+
+        # Las ventanas y el deadband usan la fecha de la lectura; la caducidad, el reloj local
+        ts = data.fecha.timestamp()
+        now = time.time()
+        out = []
+        with self._lock:
+            self.received += 1
+            state = self._states.get((data.mac_address, data.nombre))
+            if state is None:
+                state = self._states[(data.mac_address, data.nombre)] = _SensorState()
+            state.seen_at = now
+
+            if not rule.bucket_seconds:
+                if self._should_send(rule, state, data.valor, ts):
+                    out.append(data)
+            else:
+                start = ts - ts % rule.bucket_seconds
+                if state.bucket_start is not None and start != state.bucket_start:
+                    # La lectura abre una ventana nueva: se cierra la anterior
+                    closed = self._close_bucket(rule, state)
+                    if closed is not None:
+                        out.append(closed)
+                if state.bucket_start is None:
+                    state.bucket_start = start
+                    state.deadline = now + (start + rule.bucket_seconds - ts)
+                    state.template = data
+                    state.minimum = state.maximum = data.valor
+                state.count += 1
+                state.total += data.valor
+                state.last = data.valor
+                if data.valor < state.minimum:
+                    state.minimum = data.valor
+                elif data.valor > state.maximum:
+                    state.maximum = data.valor
+
+            out.extend(self._sweep_locked(now))
+            self.forwarded += len(out)
+        return out
+
+    def expire(self, now: Optional[float] = None, force: bool = False) -> List[SensorData]:
+        """Cierra las ventanas vencidas (todas con `force`, p. ej. al apagar)."""
+        with self._lock:
+            self._next_sweep = 0.0
+            out = self._sweep_locked(time.time() if now is None else now, force)
+            self.forwarded += len(out)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            sensors = len(self._states)
+        return {"sensors": sensors, "received": self.received, "forwarded": self.forwarded}
+
+    def _should_send(self, rule: ReductionRule, state: _SensorState, value: float, ts: float) -> bool:
+        send = (
+            state.sent_value is None
+            or not rule.deadband
+            or abs(value - state.sent_value) > rule.deadband
+            or (rule.heartbeat_seconds and ts - state.sent_at >= rule.heartbeat_seconds)
+        )
+        if send:
+            state.sent_value = value
+            state.sent_at = ts
+        return bool(send)
+
+    def _close_bucket(self, rule: ReductionRule, state: _SensorState) -> Optional[SensorData]:
+        if rule.bucket_stat == "avg":
+            value = state.total / state.count
+        elif rule.bucket_stat == "min":
+            value = state.minimum
+        elif rule.bucket_stat == "max":
+            value = state.maximum
+        else:
+            value = state.last
+        template = state.template
+        start = state.bucket_start
+        state.bucket_start = None
+        state.template = None
+        state.count = 0
+        state.total = 0.0
+
+        if not self._should_send(rule, state, value, start):
+            return None
+        # La lectura resumida lleva la fecha de inicio de su ventana
+        fecha = template.fecha - timedelta(seconds=template.fecha.timestamp() - start)
+        return SensorData(template.mac_address, template.nombre, value, fecha)
+
+    def _sweep_locked(self, now: float, force: bool = False) -> List[SensorData]:
+        if not force and now < self._next_sweep:
+            return []
+        self._next_sweep = now + self.sweep_interval
+        out = []
+        for key, state in list(self._states.items()):
+            rule = self.rule_for(key[1])
+            if state.bucket_start is not None:
+                if force or now >= state.deadline:
+                    closed = self._close_bucket(rule, state)
+                    if closed is not None:
+                        out.append(closed)
+            elif now - state.seen_at > IDLE_STATE_TTL:
+                del self._states[key]
+        return out
@@ -1,31 +1,132 @@
+import logging
+import threading
+from typing import Optional
 from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
-from src.easygrow_consumer.domain.repository import SensorDataRepository, BombaRepository, MessageQueuePublisher
+from src.easygrow_consumer.domain.repository import (
+    SensorDataRepository, BombaRepository, MessageQueuePublisher,
+    AsyncSensorDataRepository, AsyncBombaRepository, AsyncMessageQueuePublisher,
+)
+from src.easygrow_consumer.application.reduction import StreamReducer
+from src.easygrow_consumer.application.pump_tracker import PumpTracker
+
+logger = logging.getLogger("easygrow.services")
 
 class SensorService:
-    def __init__(self, repository: SensorDataRepository, publisher: MessageQueuePublisher):
+    def __init__(self, repository: SensorDataRepository, publisher: MessageQueuePublisher,
+                 reducer: Optional[StreamReducer] = None):
         self.repository = repository
         self.publisher = publisher
+        # Deadband/agregación opcional: decide qué lecturas llegan a BD y RabbitMQ
+        self.reducer = reducer
+        self._stop_event = threading.Event()
+        self._expiry_thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Cierra las ventanas vencidas periódicamente, aunque su sensor deje de enviar."""
+        if self.reducer is None:
+            return
+        self._expiry_thread = threading.Thread(target=self._expiry_loop, name="reducer-expiry", daemon=True)
+        self._expiry_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._expiry_thread is not None:
+            self._expiry_thread.join(timeout=5)
 
     def handle_sensor_data(self, data: SensorData):
+        if self.reducer is None:
+            self._forward(data)
+            return
+        for reading in self.reducer.offer(data):
+            self._forward(reading)
+
+    def flush_reduced(self, force: bool = True) -> int:
+        """Reenvía las ventanas de agregación vencidas (todas con `force`, p. ej. al apagar).
+        Devuelve cuántas lecturas salieron."""
+        if self.reducer is None:
+            return 0
+        readings = self.reducer.expire(force=force)
+        for reading in readings:
+            self._forward(reading)
+        return len(readings)
+
+    def _forward(self, data: SensorData):
         self.repository.save_sensor_data(data)
         self.publisher.publish(data)
 
+    def _expiry_loop(self):
+        while not self._stop_event.wait(self.reducer.sweep_interval):
+            try:
+                self.flush_reduced(force=False)
+            except Exception:
+                logger.exception("❌ Error cerrando las ventanas de agregación vencidas")
+
 class BombaService:
-    def __init__(self, repository: BombaRepository, publisher: MessageQueuePublisher):
+    def __init__(self, repository: BombaRepository, publisher: MessageQueuePublisher,
+                 tracker: Optional[PumpTracker] = None):
         self.repository = repository
         self.publisher = publisher
+        # Estado por bomba (ciclo de trabajo, agua, bomba atascada) calculado en memoria
+        self.tracker = tracker
 
     def handle_bomba_event(self, event: BombaEvent):
-        print(f"🔧 Procesando evento: {event.evento}")
-        print(f"🔍 Tiempo encendida: {event.tiempo_encendida_seg}")
-        
-        # SOLO guardar en BD cuando la bomba se DESACTIVA (tiene tiempo de encendido)
-        if event.tiempo_encendida_seg is not None and event.tiempo_encendida_seg > 0:
-            print(f"💾 Guardando activación en BD (bomba desactivada)")
-            self.repository.save_bomba_activation(event)
-        else:
-            print(f"ℹ️ Evento de activación - NO se guarda en BD (solo se publica)")
-        
+        logger.debug(f"🔧 Procesando evento: {event.evento}")
+        logger.debug(f"🔍 Tiempo encendida: {event.tiempo_encendida_seg}")
+
+        # Todos los eventos van a eventos_bomba por lotes; el repositorio registra
+        # la activación cuando la bomba se DESACTIVA (tiene tiempo de encendido)
+        self.repository.save_bomba_event(event)
+        if self.tracker is not None:
+            self.tracker.observe(event)
+
         # Publicar TODOS los eventos a RabbitMQ
         self.publisher.publish(event)
-        print(f"📤 Evento publicado a RabbitMQ: {event.evento}")
\ No newline at end of file
+        logger.debug(f"📤 Evento publicado a RabbitMQ: {event.evento}")
+
+
+class AsyncSensorService:
+    """Misma lógica que SensorService sobre puertos asíncronos."""
+
+    def __init__(self, repository: AsyncSensorDataRepository, publisher: AsyncMessageQueuePublisher,
+                 reducer: Optional[StreamReducer] = None):
+        self.repository = repository
+        self.publisher = publisher
+        self.reducer = reducer
+
+    async def handle_sensor_data(self, data: SensorData):
+        if self.reducer is None:
+            await self._forward(data)
+            return
+        for reading in self.reducer.offer(data):
+            await self._forward(reading)
+
+    async def flush_reduced(self, force: bool = True) -> int:
+        if self.reducer is None:
+            return 0
+        readings = self.reducer.expire(force=force)
+        for reading in readings:
+            await self._forward(reading)
+        return len(readings)
+
+    async def _forward(self, data: SensorData):
+        await self.repository.save_sensor_data(data)
+        await self.publisher.publish(data)
+
+class AsyncBombaService:
+    """Misma lógica que BombaService sobre puertos asíncronos."""
+
+    def __init__(self, repository: AsyncBombaRepository, publisher: AsyncMessageQueuePublisher,
+                 tracker: Optional[PumpTracker] = None):
+        self.repository = repository
+        self.publisher = publisher
+        self.tracker = tracker
+
+    async def handle_bomba_event(self, event: BombaEvent):
+        # Todos los eventos van a eventos_bomba por lotes; el repositorio registra
+        # la activación cuando la bomba se DESACTIVA (tiene tiempo de encendido)
+        await self.repository.save_bomba_event(event)
+        if self.tracker is not None:
+            self.tracker.observe(event)
+
+        # Publicar TODOS los eventos a RabbitMQ
+        await self.publisher.publish(event)
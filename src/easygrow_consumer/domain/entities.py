@@ -2,18 +2,33 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 
-@dataclass
+# slots=True: sin __dict__ por instancia, menos memoria al acumular lotes
+@dataclass(slots=True)
 class SensorData:
     mac_address: str
     nombre: str
     valor: float
     fecha: datetime = field(default_factory=datetime.now)
 
-@dataclass
+@dataclass(slots=True)
 class BombaEvent:
     mac_address: str
     evento: str
     id_sensor: int
     valor_humedad: float
     tiempo_encendida_seg: Optional[int] = None
-    fecha: datetime = field(default_factory=datetime.now)
\ No newline at end of file
+    fecha: datetime = field(default_factory=datetime.now)
+
+@dataclass(slots=True)
+class BombaResumen:
+    """Estado acumulado de una bomba, calculado en el consumidor a partir de sus eventos."""
+    mac_address: str
+    id_sensor: int
+    encendida: bool
+    activaciones: int
+    segundos_encendida: float
+    ciclo_trabajo: float  # fracción del periodo de observación con la bomba encendida
+    litros_estimados: float
+    atascada: bool
+    ultimo_cambio: Optional[datetime] = None
+    fecha: datetime = field(default_factory=datetime.now)
@@ -10,7 +10,32 @@ class BombaRepository(ABC):
     @abstractmethod
     def save_bomba_activation(self, event: BombaEvent) -> None:
         pass
+
+    @abstractmethod
+    def save_bomba_event(self, event: BombaEvent) -> None:
+        pass
 class MessageQueuePublisher(ABC):
     @abstractmethod
     def publish(self, data: SensorData) -> None:
         pass
+
+
+# Puertos asíncronos (runtime asyncio)
+class AsyncSensorDataRepository(ABC):
+    @abstractmethod
+    async def save_sensor_data(self, data: SensorData) -> None:
+        pass
+
+class AsyncBombaRepository(ABC):
+    @abstractmethod
+    async def save_bomba_activation(self, event: BombaEvent) -> None:
+        pass
+
+    @abstractmethod
+    async def save_bomba_event(self, event: BombaEvent) -> None:
+        pass
+
+class AsyncMessageQueuePublisher(ABC):
+    @abstractmethod
+    async def publish(self, data: SensorData) -> None:
+        pass
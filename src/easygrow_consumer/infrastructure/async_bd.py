@@ -0,0 +1,296 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+import asyncpg
+from dotenv import load_dotenv
+from src.easygrow_consumer.domain.repository import AsyncSensorDataRepository, AsyncBombaRepository
+from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
+from src.easygrow_consumer.infrastructure.sensor_cache import SensorIdCache
+from src.easygrow_consumer.infrastructure import rollups
+from src.easygrow_consumer.infrastructure.metrics import MESSAGES_DROPPED
+
+INSERT_SENSOR_ROWS = """
+    INSERT INTO datos_sensores (id_sensor, mac_address, valor, fecha)
+    SELECT * FROM unnest($1::integer[], $2::varchar[], $3::float8[], $4::timestamp[])
+    ON CONFLICT (id_sensor, fecha, valor) DO NOTHING
+    RETURNING id_sensor, mac_address, valor, fecha
+"""
+
+# Mismas sentencias que las preparadas de PostgresRepository (ver bd.py)
+INSERT_BOMBA_EVENTS = """
+    INSERT INTO eventos_bomba (id_sensor, mac_address, evento, valor_humedad, tiempo_encendida_seg, fecha)
+    SELECT u.*
+    FROM unnest($1::integer[], $2::varchar[], $3::varchar[], $4::float8[], $5::integer[], $6::timestamp[])
+        AS u (id_sensor, mac_address, evento, valor_humedad, tiempo_encendida_seg, fecha)
+    JOIN sensores s ON s.id_sensor = u.id_sensor
+    JOIN dispositivos d ON d.mac_address = u.mac_address
+    ON CONFLICT (id_sensor, evento, fecha) DO NOTHING
+"""
+
+INSERT_ACTIVATIONS = """
+    INSERT INTO activaciones_bombas (id_sensor, mac_address, fecha, duracion_segundos)
+    SELECT u.*
+    FROM unnest($1::integer[], $2::varchar[], $3::timestamp[], $4::integer[])
+        AS u (id_sensor, mac_address, fecha, duracion_segundos)
+    JOIN sensores s ON s.id_sensor = u.id_sensor
+    ON CONFLICT (id_sensor, fecha) DO NOTHING
+    RETURNING id_sensor, fecha, duracion_segundos
+"""
+
+# Errores por el contenido de alguna fila: reintentar el mismo lote fallaría siempre
+POISON_ERRORS = (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+# Conexión caída o servidor no disponible: el lote se reencola para la siguiente ventana
+TRANSIENT_ERRORS = (asyncpg.PostgresConnectionError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+
+class AsyncPostgresRepository(AsyncSensorDataRepository, AsyncBombaRepository):
+    """Versión asyncpg de PostgresRepository: pool de conexiones, caché de sensores e inserción por lotes."""
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        load_dotenv()
+        self.batch_size = batch_size or int(os.getenv("DB_BATCH_SIZE", "200"))
+        self.flush_interval = flush_interval or float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+        # "auto" (por defecto): se decide en connect() según existan las tablas de resúmenes
+        self.rollups_mode = os.getenv("DB_ROLLUPS", "auto")
+        self.rollups = self.rollups_mode == "1"
+        # Tope de cada buffer mientras PostgreSQL no responde (este runtime no tiene spool)
+        self.buffer_max = int(os.getenv("DB_BUFFER_MAX", "100000"))
+
+        self.pool: Optional[asyncpg.Pool] = None
+        self.sensor_cache = SensorIdCache(
+            ttl=float(os.getenv("SENSOR_CACHE_TTL", "300")),
+            negative_ttl=float(os.getenv("SENSOR_CACHE_NEGATIVE_TTL", "60")),
+            max_size=int(os.getenv("SENSOR_CACHE_MAX_SIZE", "10000")),
+            refresh_interval=float(os.getenv("SENSOR_CACHE_REFRESH_INTERVAL", "60")),
+        )
+
+        self._buffer = []
+        self._event_buffer = []
+        self._flush_lock = asyncio.Lock()
+        self._tasks = []
+
+    async def connect(self):
+        try:
+            self.pool = await asyncpg.create_pool(
+                host=os.getenv("DB_HOST"),
+                port=int(os.getenv("BD_PORT", "5432")),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASS"),
+                database=os.getenv("DB_SCHEMA"),
+                min_size=int(os.getenv("DB_POOL_MIN", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX", "10")),
+            )
+            print("✅ Conexión exitosa a PostgreSQL (asyncpg)")
+        except Exception as e:
+            print(f"❌ Error al conectar a PostgreSQL: {e}")
+            raise e
+
+        if self.rollups_mode == "auto":
+            async with self.pool.acquire() as conn:
+                self.rollups = bool(await conn.fetchval(rollups.TABLES_EXIST))
+        print(f"🧮 Resúmenes por hora/día y último valor: {'activos' if self.rollups else 'desactivados'}")
+
+        loaded = self.sensor_cache.replace_all(await self._load_all_sensor_ids())
+        print(f"🗂️ Caché de sensores precargada: {loaded} sensores")
+
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+        if self.sensor_cache.refresh_interval > 0:
+            self._tasks.append(asyncio.create_task(self._refresh_loop()))
+
+    async def save_sensor_data(self, data: SensorData):
+        self._buffer.append(data)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def save_bomba_event(self, event: BombaEvent):
+        self._event_buffer.append(event)
+        if len(self._event_buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Escribe los eventos de bomba y las lecturas pendientes. Devuelve cuántas lecturas se insertaron."""
+        error = None
+        try:
+            await self._flush_events()
+        except Exception as e:
+            # Las lecturas se escriben igualmente; el error se propaga al final
+            error = e
+        written = await self._flush_readings()
+        if error is not None:
+            raise error
+        return written
+
+    async def _flush_events(self) -> int:
+        return await self._flush_buffer("_event_buffer", self.write_bomba_batch, "eventos de bomba")
+
+    async def _flush_readings(self) -> int:
+        return await self._flush_buffer("_buffer", self.write_sensor_batch, "lecturas")
+
+    async def _flush_buffer(self, name: str, write: Callable[[list], Awaitable[int]], label: str) -> int:
+        """Escribe el contenido del buffer `name` con `write(batch)` (mismo criterio que PostgresRepository)."""
+        async with self._flush_lock:
+            batch = getattr(self, name)
+            if not batch:
+                return 0
+            setattr(self, name, [])
+
+            try:
+                return await write(batch)
+            except Exception as e:
+                print(f"❌ Error al escribir lote de {len(batch)} {label}: {e}")
+                if isinstance(e, TRANSIENT_ERRORS):
+                    # Devolver el lote al inicio del buffer para no perder datos
+                    self._requeue(name, batch, label)
+                    raise
+                if not isinstance(e, POISON_ERRORS):
+                    MESSAGES_DROPPED.labels(reason="db_error").inc(len(batch))
+                    print(f"❌ Lote de {len(batch)} {label} descartado: el error no se resuelve reintentando")
+                    return 0
+
+            # Alguna fila inválida: se aísla partiendo el lote para escribir el resto
+            retry = []
+            written = await self._write_isolating(batch, write, label, retry)
+            if retry:
+                self._requeue(name, retry, label)
+            return written
+
+    async def _write_isolating(self, batch: list, write, label: str, retry: list) -> int:
+        """Escribe `batch` partiéndolo en mitades hasta aislar las filas que PostgreSQL rechaza,
+        que se descartan. Lo que falla por la conexión se añade a `retry`, en orden."""
+        try:
+            return await write(batch)
+        except POISON_ERRORS as e:
+            if len(batch) == 1:
+                MESSAGES_DROPPED.labels(reason="db_poison").inc()
+                print(f"❌ {label.capitalize()}: fila rechazada por PostgreSQL, se descarta: {batch[0]} ({e})")
+                return 0
+            middle = len(batch) // 2
+            return (await self._write_isolating(batch[:middle], write, label, retry)
+                    + await self._write_isolating(batch[middle:], write, label, retry))
+        except TRANSIENT_ERRORS:
+            retry.extend(batch)
+            return 0
+        except Exception as e:
+            MESSAGES_DROPPED.labels(reason="db_error").inc(len(batch))
+            print(f"❌ {len(batch)} {label} descartados: {e}")
+            return 0
+
+    def _requeue(self, name: str, batch: list, label: str):
+        """Devuelve `batch` al inicio del buffer `name`, descartando lo más antiguo si pasa de `buffer_max`."""
+        buffer = getattr(self, name)
+        buffer[:0] = batch
+        excess = len(buffer) - self.buffer_max
+        if excess > 0:
+            del buffer[:excess]
+            MESSAGES_DROPPED.labels(reason="buffer_full").inc(excess)
+            print(f"⚠️ Buffer de {label} lleno: descartados {excess} registros antiguos")
+
+    async def write_bomba_batch(self, events) -> int:
+        """Inserta en una transacción los eventos y, para los apagados con duración, la activación y el resumen."""
+        rows = [
+            (e.id_sensor, e.mac_address, e.evento, e.valor_humedad, e.tiempo_encendida_seg, e.fecha)
+            for e in events
+        ]
+        if not rows:
+            return 0
+        finished = [
+            (id_sensor, mac, fecha, duracion)
+            for id_sensor, mac, _evento, _humedad, duracion, fecha in rows
+            if duracion is not None and duracion > 0
+        ]
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                status = await conn.execute(INSERT_BOMBA_EVENTS, *zip(*rows))
+                if finished:
+                    activations = [tuple(r) for r in await conn.fetch(INSERT_ACTIVATIONS, *zip(*finished))]
+                    if activations:
+                        await conn.executemany(
+                            rollups.UPSERT_RESUMEN_BOMBA, rollups.summarize_activations(activations)
+                        )
+        # execute() devuelve la etiqueta del comando: "INSERT 0 <filas>"
+        return int(status.split()[-1])
+
+    async def write_sensor_batch(self, batch) -> int:
+        """Resuelve los sensores del lote y lo inserta en una transacción; propaga cualquier error."""
+        ids, pending = self.sensor_cache.lookup((data.nombre, data.mac_address) for data in batch)
+        if pending:
+            ids.update(self.sensor_cache.store(pending, await self._load_sensor_ids(pending)))
+
+        rows = []
+        for data in batch:
+            id_sensor = ids.get((data.nombre, data.mac_address))
+            if id_sensor is None:
+                print(f"⚠️ No se encontró el sensor con nombre '{data.nombre}' y MAC '{data.mac_address}'.")
+                continue
+            rows.append((id_sensor, data.mac_address, data.valor, data.fecha))
+
+        inserted = []
+        if rows:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    # COPY no admite ON CONFLICT: unnest mantiene un único round trip
+                    # e ignora las lecturas ya guardadas (reentregas, spool)
+                    inserted = [tuple(r) for r in await conn.fetch(INSERT_SENSOR_ROWS, *zip(*rows))]
+                    if self.rollups and inserted:
+                        hourly, daily, latest = rollups.summarize(inserted)
+                        await conn.executemany(rollups.UPSERT_HORA, hourly)
+                        await conn.executemany(rollups.UPSERT_DIA, daily)
+                        await conn.executemany(rollups.UPSERT_ULTIMO, latest)
+        return len(inserted)
+
+    async def save_bomba_activation(self, event: BombaEvent):
+        """Escribe el evento y su activación de inmediato, sin pasar por el buffer."""
+        await self.write_bomba_batch([event])
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        try:
+            await self.flush()
+        finally:
+            if self.pool is not None:
+                await self.pool.close()
+
+    async def _load_sensor_ids(self, keys):
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT s.descripcion, d.mac_address, s.id_sensor
+                FROM sensores s
+                JOIN dispositivos d ON s.id_dispositivo = d.id_dispositivo
+                WHERE (s.descripcion, d.mac_address) IN (
+                    SELECT * FROM unnest($1::text[], $2::text[])
+                )
+                """,
+                [k[0] for k in keys], [k[1] for k in keys]
+            )
+        return {(r["descripcion"], r["mac_address"]): r["id_sensor"] for r in rows}
+
+    async def _load_all_sensor_ids(self):
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT s.descripcion, d.mac_address, s.id_sensor
+                FROM sensores s
+                JOIN dispositivos d ON s.id_dispositivo = d.id_dispositivo
+                """
+            )
+        return {(r["descripcion"], r["mac_address"]): r["id_sensor"] for r in rows}
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                # El lote ya fue devuelto al buffer; se reintenta en la siguiente ventana
+                pass
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.sensor_cache.refresh_interval)
+            try:
+                self.sensor_cache.replace_all(await self._load_all_sensor_ids())
+            except Exception as e:
+                print(f"⚠️ Error refrescando caché de sensores: {e}")
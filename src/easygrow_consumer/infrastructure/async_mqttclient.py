@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import zlib
+from datetime import datetime
+import aiomqtt
+from dotenv import load_dotenv
+from src.easygrow_consumer.application.services import AsyncSensorService, AsyncBombaService
+from src.easygrow_consumer.infrastructure.payloads import decode
+from src.easygrow_consumer.infrastructure.serializers import message_type_for
+from src.easygrow_consumer.infrastructure.router import TopicRouter, IGNORE
+from src.easygrow_consumer.infrastructure.dedup import DedupWindow
+from src.easygrow_consumer.infrastructure.capture import CaptureWriter
+from src.easygrow_consumer.infrastructure.metrics import (
+    MESSAGES_RECEIVED, MESSAGES_PROCESSED, MESSAGES_DROPPED, RECONNECTS, topic_label, set_topic_labeler,
+)
+
+
+class AsyncMQTTClient:
+    """Listener MQTT asyncio: reparte los mensajes en tareas por shard de mac_address.
+
+    Cada shard es una cola acotada con una única tarea consumidora, de modo que
+    el orden por dispositivo se conserva mientras miles de mensajes de
+    dispositivos distintos solapan su E/S de BD y RabbitMQ.
+    """
+
+    def __init__(self, sensor_service: AsyncSensorService, bomba_service: AsyncBombaService,
+                 router: TopicRouter = None):
+        load_dotenv()
+        self.sensor_service = sensor_service
+        self.bomba_service = bomba_service
+
+        self.host = os.getenv("MOSQUITTOHOST")
+        self.username = os.getenv("USERMOSQUITTO")
+        self.password = os.getenv("PASSMOSQUITTO")
+        if not all([self.host, self.username, self.password]):
+            raise ValueError("❌ Faltan variables de entorno MQTT")
+
+        self.concurrency = int(os.getenv("ASYNC_MQTT_CONCURRENCY", "64"))
+        self.queue_size = int(os.getenv("MQTT_QUEUE_SIZE", "1000"))
+        self.dedup = DedupWindow.from_env()
+        self.capture = CaptureWriter.from_env()
+
+        self.router = router or TopicRouter.from_env()
+        self.subscriptions = self.router.subscriptions()
+        set_topic_labeler(self.router.label)
+        self.handlers = {
+            "sensor": self.sensor_service.handle_sensor_data,
+            "bomba": self.bomba_service.handle_bomba_event,
+        }
+        unknown = {route.handler for route in self.router.routes} - set(self.handlers) - {IGNORE}
+        if unknown:
+            raise ValueError(f"❌ Manejadores MQTT desconocidos: {', '.join(sorted(unknown))}")
+
+        self.logger = logging.getLogger("easygrow.mqtt.async")
+        self._queues = []
+
+    async def start(self):
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.concurrency)]
+        workers = [asyncio.create_task(self._worker(q)) for q in self._queues]
+        try:
+            while True:
+                try:
+                    self.logger.info(f"🔌 Conectando a MQTT broker en {self.host}...")
+                    async with aiomqtt.Client(
+                        hostname=self.host, port=1883, username=self.username,
+                        password=self.password, keepalive=60,
+                    ) as client:
+                        self.logger.info("✅ Conectado a MQTT broker")
+                        for topic, qos in self.subscriptions:
+                            await client.subscribe(topic, qos=qos)
+                        self.logger.info(
+                            f"📡 Suscrito a tópicos: {', '.join(topic for topic, _ in self.subscriptions)}")
+                        async for message in client.messages:
+                            await self._enqueue(message.topic.value, message.payload)
+                except aiomqtt.MqttError as e:
+                    self.logger.warning(f"⚠️ Desconexión del broker MQTT ({e}); reintentando en 2s")
+                    RECONNECTS.labels(target="mqtt").inc()
+                    await asyncio.sleep(2)
+        finally:
+            # Procesar lo ya recibido antes de salir
+            if self.capture is not None:
+                self.capture.close()
+            for q in self._queues:
+                await q.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _enqueue(self, topic: str, raw: bytes):
+        if self.capture is not None:
+            self.capture.record(topic, raw)
+        MESSAGES_RECEIVED.labels(topic=topic_label(topic)).inc()
+        # Hora de llegada, para los payloads sin `ts` (el worker puede tardar en atenderlo)
+        fecha = datetime.now()
+        try:
+            payload = decode(raw)
+        except ValueError as e:
+            MESSAGES_DROPPED.labels(reason="invalid_payload").inc()
+            self.logger.exception(f"❌ Error al procesar mensaje en tópico {topic}: {e}")
+            return
+        # aiomqtt no expone la marca DUP: solo se filtran los mensajes con identificador
+        if self.dedup is not None and self.dedup.is_duplicate(topic, payload):
+            MESSAGES_DROPPED.labels(reason="duplicate").inc()
+            return
+        key = str(payload.get("mac_address", "")).encode()
+        # put() espera si el shard está lleno: la contrapresión llega al socket MQTT
+        await self._queues[zlib.crc32(key) % len(self._queues)].put((topic, payload, fecha))
+
+    async def _worker(self, q: asyncio.Queue):
+        while True:
+            topic, payload, fecha = await q.get()
+            try:
+                await self._dispatch(topic, payload, fecha)
+            except Exception as e:
+                self.logger.exception(f"❌ Error al procesar mensaje en tópico {topic}: {e}")
+            finally:
+                q.task_done()
+
+    async def _dispatch(self, topic, payload, fecha=None):
+        route = self.router.match(topic)
+        if route is None:
+            MESSAGES_DROPPED.labels(reason="unknown_topic").inc()
+            self.logger.warning(f"⚠️ Tópico no reconocido: {topic}")
+        elif route.handler == IGNORE:
+            MESSAGES_DROPPED.labels(reason="ignored").inc()
+        else:
+            try:
+                entity = route.build(topic, payload, fecha)
+            except ValueError:
+                MESSAGES_DROPPED.labels(reason="invalid_payload").inc()
+                raise
+            # Mismas etiquetas que el runtime síncrono: type=SENSOR|BOMBA
+            kind = message_type_for(entity)
+            try:
+                await self.handlers[route.handler](entity)
+            except Exception:
+                MESSAGES_PROCESSED.labels(type=kind, result="error").inc()
+                raise
+            MESSAGES_PROCESSED.labels(type=kind, result="ok").inc()
@@ -0,0 +1,61 @@
+import os
+from typing import Optional
+import aio_pika
+from dotenv import load_dotenv
+from src.easygrow_consumer.domain.repository import AsyncMessageQueuePublisher
+from src.easygrow_consumer.infrastructure.serializers import serializer_for
+
+
+class AsyncRabbitMQPublisher(AsyncMessageQueuePublisher):
+    """Publicador aio-pika con reconexión automática (connect_robust)."""
+
+    def __init__(self):
+        load_dotenv()
+        self.sensor_queue = os.getenv("RABBITMQ_SENSOR_QUEUE", "datos_sensores")
+        self.bomba_queue = os.getenv("RABBITMQ_BOMBA_QUEUE", "eventos_bomba")
+        self.summary_queue = os.getenv("RABBITMQ_PUMP_SUMMARY_QUEUE", "resumen_bombas")
+        # Cola de destino por tipo de mensaje (ver serializers.SERIALIZERS)
+        self.queues = {"SENSOR": self.sensor_queue, "BOMBA": self.bomba_queue, "RESUMEN_BOMBA": self.summary_queue}
+
+        self.username = os.getenv("RABBITMQ_USER")
+        self.password = os.getenv("RABBITMQ_PASSWORD")
+        self.host = os.getenv("RABBITMQ_HOST")
+        if not all([self.username, self.password, self.host]):
+            raise ValueError("❌ Faltan variables de entorno para RabbitMQ")
+
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+
+    async def connect(self):
+        try:
+            print(f"🔌 Conectando a RabbitMQ en {self.host}...")
+            self.connection = await aio_pika.connect_robust(
+                host=self.host, login=self.username, password=self.password, heartbeat=600
+            )
+            self.channel = await self.connection.channel()
+            for name in self.queues.values():
+                await self.channel.declare_queue(name, durable=True)
+            print("✅ Conectado correctamente a RabbitMQ (aio-pika)")
+        except Exception as e:
+            print(f"❌ Error al conectar a RabbitMQ: {e}")
+            raise e
+
+    async def publish(self, data) -> None:
+        message_type, encode = serializer_for(data)
+        queue = self.queues[message_type]
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=encode(data),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                content_type="application/json",
+            ),
+            routing_key=queue,
+        )
+
+    async def close(self):
+        try:
+            if self.connection is not None and not self.connection.is_closed:
+                await self.connection.close()
+                print("🔌 Conexión a RabbitMQ cerrada")
+        except Exception as e:
+            print(f"❌ Error al cerrar conexión RabbitMQ: {e}")
@@ -0,0 +1,60 @@
+import os
+import random
+import threading
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Backoff:
+    """Espera exponencial con jitter completo: cada intento espera un valor
+    aleatorio entre 0 y min(maximum, initial * multiplier^n).
+
+    El jitter evita que varios procesos (o varias pasarelas que arrancan a la
+    vez tras un corte de luz) reintenten contra el mismo servicio al unísono.
+    """
+
+    def __init__(self, initial: float = 0.5, maximum: float = 30.0, multiplier: float = 2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.attempts = 0
+
+    @classmethod
+    def from_env(cls) -> "Backoff":
+        return cls(
+            initial=float(os.getenv("RETRY_INITIAL_DELAY", "0.5")),
+            maximum=float(os.getenv("RETRY_MAX_DELAY", "30")),
+        )
+
+    def next_delay(self) -> float:
+        ceiling = min(self.maximum, self.initial * self.multiplier ** self.attempts)
+        self.attempts += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempts = 0
+
+
+def retry(fn: Callable[[], T], backoff: Backoff, stop_event: Optional[threading.Event] = None,
+          on_error: Optional[Callable[[Exception, float], None]] = None,
+          max_attempts: int = 0) -> Optional[T]:
+    """Llama a `fn()` hasta que no lance, esperando según `backoff` entre intentos.
+
+    Devuelve None si `stop_event` se activa antes; con `max_attempts` > 0
+    propaga el último error al agotar los intentos.
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            result = fn()
+            backoff.reset()
+            return result
+        except Exception as e:
+            if max_attempts and backoff.attempts + 1 >= max_attempts:
+                raise
+            delay = backoff.next_delay()
+            if on_error is not None:
+                on_error(e, delay)
+            stop_event.wait(delay)
+    return None
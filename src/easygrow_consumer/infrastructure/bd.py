@@ -1,76 +1,507 @@
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extras import execute_batch
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from typing import Callable, Optional
 from dotenv import load_dotenv
 from src.easygrow_consumer.domain.repository import SensorDataRepository, BombaRepository
 from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
+from src.easygrow_consumer.infrastructure.sensor_cache import SensorIdCache
+from src.easygrow_consumer.infrastructure import rollups
+from src.easygrow_consumer.infrastructure.partitions import PartitionManager
+from src.easygrow_consumer.infrastructure.metrics import REGISTRY, MESSAGES_DROPPED, STAGE_SECONDS, RECONNECTS
+
+# Sentencias preparadas en el servidor para cada conexión del pool
+PREPARED_STATEMENTS = {
+    # Todo el lote en una sentencia; las lecturas ya guardadas (reentregas
+    # MQTT, reenvíos del spool) chocan con uq_datos_sensores_lectura y se
+    # ignoran. RETURNING devuelve solo las nuevas, que son las que se resumen.
+    "ins_dato_sensor": """
+        PREPARE ins_dato_sensor (integer[], varchar[], float8[], timestamp[]) AS
+        INSERT INTO datos_sensores (id_sensor, mac_address, valor, fecha)
+        SELECT * FROM unnest($1, $2, $3, $4)
+        ON CONFLICT (id_sensor, fecha, valor) DO NOTHING
+        RETURNING id_sensor, mac_address, valor, fecha
+    """,
+    # Eventos de bomba por lotes. Los JOIN descartan los de sensores o MAC
+    # desconocidos en lugar de hacer fallar el lote entero por clave foránea.
+    "ins_evento_bomba": """
+        PREPARE ins_evento_bomba (integer[], varchar[], varchar[], float8[], integer[], timestamp[]) AS
+        INSERT INTO eventos_bomba (id_sensor, mac_address, evento, valor_humedad, tiempo_encendida_seg, fecha)
+        SELECT u.*
+        FROM unnest($1, $2, $3, $4, $5, $6)
+            AS u (id_sensor, mac_address, evento, valor_humedad, tiempo_encendida_seg, fecha)
+        JOIN sensores s ON s.id_sensor = u.id_sensor
+        JOIN dispositivos d ON d.mac_address = u.mac_address
+        ON CONFLICT (id_sensor, evento, fecha) DO NOTHING
+    """,
+    "ins_activacion_bomba": """
+        PREPARE ins_activacion_bomba (integer[], varchar[], timestamp[], integer[]) AS
+        INSERT INTO activaciones_bombas (id_sensor, mac_address, fecha, duracion_segundos)
+        SELECT u.*
+        FROM unnest($1, $2, $3, $4) AS u (id_sensor, mac_address, fecha, duracion_segundos)
+        JOIN sensores s ON s.id_sensor = u.id_sensor
+        ON CONFLICT (id_sensor, fecha) DO NOTHING
+        RETURNING id_sensor, fecha, duracion_segundos
+    """,
+    "ups_resumen_bomba": "PREPARE ups_resumen_bomba (integer, integer, bigint, timestamp) AS"
+                         + rollups.UPSERT_RESUMEN_BOMBA,
+    "buscar_sensores": """
+        PREPARE buscar_sensores (text[], text[]) AS
+        SELECT s.descripcion, d.mac_address, s.id_sensor
+        FROM sensores s
+        JOIN dispositivos d ON s.id_dispositivo = d.id_dispositivo
+        WHERE (s.descripcion, d.mac_address) IN (SELECT * FROM unnest($1, $2))
+    """,
+}
+
+# Upserts de resúmenes, solo con los resúmenes activos (las tablas deben existir para poder preparar)
+ROLLUP_STATEMENTS = {
+    "ups_rollup_hora": "PREPARE ups_rollup_hora (integer, timestamp, integer, float8, float8, float8) AS"
+                       + rollups.UPSERT_HORA,
+    "ups_rollup_dia": "PREPARE ups_rollup_dia (integer, date, integer, float8, float8, float8) AS"
+                      + rollups.UPSERT_DIA,
+    "ups_ultimo": "PREPARE ups_ultimo (integer, varchar, float8, timestamp) AS" + rollups.UPSERT_ULTIMO,
+}
+
+ROWS_INSERTED = REGISTRY.counter("easygrow_db_rows_inserted_total", "Filas insertadas en PostgreSQL", ("table",))
+FLUSH_ERRORS = REGISTRY.counter("easygrow_db_flush_errors_total", "Lotes que no se pudieron escribir")
+BUFFERED = REGISTRY.gauge("easygrow_db_buffered_readings", "Lecturas en el buffer de escritura")
+BUFFERED_EVENTS = REGISTRY.gauge("easygrow_db_buffered_bomba_events", "Eventos de bomba en el buffer de escritura")
+SENSOR_CACHE = REGISTRY.gauge("easygrow_sensor_cache", "Contadores de la caché de sensores", ("stat",))
+
+logger = logging.getLogger("easygrow.db")
+
+# Errores que indican una conexión rota: se descarta y se reintenta con otra
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Errores por el contenido de alguna fila: reintentar el mismo lote fallaría siempre
+POISON_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+# Errores transitorios al vaciar el buffer: el lote se reencola para la siguiente ventana
+TRANSIENT_ERRORS = CONNECTION_ERRORS + (PoolError,)
+
+
+class _PooledConnection(PGConnection):
+    """Conexión que recuerda si ya tiene sus sentencias preparadas y cuándo se usó."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = False
+        self.last_used = time.monotonic()
 
 
 class PostgresRepository(SensorDataRepository, BombaRepository):
-    def __init__(self):
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
         load_dotenv()
+
+        # Parámetros del buffer de escritura por lotes
+        self.batch_size = batch_size or int(os.getenv("DB_BATCH_SIZE", "200"))
+        self.flush_interval = flush_interval or float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+
+        # Parámetros del pool
+        self.pool_min = int(os.getenv("DB_POOL_MIN", "1"))
+        self.pool_max = int(os.getenv("DB_POOL_MAX", "10"))
+        # Solo se hace `SELECT 1` al entregar conexiones que llevan este tiempo sin usarse
+        self.health_check_idle = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+        # ping() (/readyz y /metrics) no espera más que esto por una conexión libre,
+        # y su resultado se reutiliza durante DB_PING_CACHE segundos
+        self.ping_timeout = float(os.getenv("DB_PING_TIMEOUT", "1"))
+        self.ping_cache = float(os.getenv("DB_PING_CACHE", "5"))
+        self._last_ping = (float("-inf"), False)
+
+        self._statements = dict(PREPARED_STATEMENTS)
+
+        # Tope de cada buffer mientras PostgreSQL no responde (sin spool); después se descartan los más antiguos
+        self.buffer_max = int(os.getenv("DB_BUFFER_MAX", "100000"))
+
+        self._buffer = []
+        self._event_buffer = []
+        self._buffer_lock = threading.Lock()
+        # Si se define, recibe los lotes (lecturas o eventos de bomba) que no se
+        # pudieron escribir en lugar de reencolarlos
+        self.on_flush_error: Optional[Callable[[list], None]] = None
+        self._stop_event = threading.Event()
+        # getconn() falla si el pool está agotado; el semáforo hace esperar en su lugar
+        self._slots = threading.BoundedSemaphore(self.pool_max)
+
         try:
-            self.conn = psycopg2.connect(
+            self.pool = ThreadedConnectionPool(
+                self.pool_min,
+                self.pool_max,
                 host=os.getenv("DB_HOST"),
+                port=os.getenv("BD_PORT", "5432"),
                 user=os.getenv("DB_USER"),
                 password=os.getenv("DB_PASS"),
-                dbname=os.getenv("DB_SCHEMA")
+                dbname=os.getenv("DB_SCHEMA"),
+                connection_factory=_PooledConnection,
             )
-            self.conn.autocommit = True
-            print("✅ Conexión exitosa a PostgreSQL")
+            print(f"✅ Conexión exitosa a PostgreSQL (pool {self.pool_min}-{self.pool_max})")
         except Exception as e:
             print(f"❌ Error al conectar a PostgreSQL: {e}")
             raise e
 
+        # Resúmenes por hora/día y último valor, en la misma transacción que el lote.
+        # Con "auto" (por defecto) se activan si existen sus tablas: v_ultimos_datos_sensores
+        # lee de datos_sensores_ultimo. Se decide antes de preparar la primera conexión.
+        rollups_mode = os.getenv("DB_ROLLUPS", "auto")
+        self.rollups = rollups_mode == "1" or (rollups_mode == "auto" and self._rollup_tables_exist())
+        if self.rollups:
+            self._statements.update(ROLLUP_STATEMENTS)
+        print(f"🧮 Resúmenes por hora/día y último valor: {'activos' if self.rollups else 'desactivados'}")
+
+        # Caché de resolución (descripcion, mac_address) -> id_sensor
+        self.sensor_cache = SensorIdCache(
+            load_all=self._load_all_sensor_ids,
+            load_many=self._load_sensor_ids,
+            ttl=float(os.getenv("SENSOR_CACHE_TTL", "300")),
+            negative_ttl=float(os.getenv("SENSOR_CACHE_NEGATIVE_TTL", "60")),
+            max_size=int(os.getenv("SENSOR_CACHE_MAX_SIZE", "10000")),
+            refresh_interval=float(os.getenv("SENSOR_CACHE_REFRESH_INTERVAL", "60")),
+        )
+        for stat in ("hits", "misses", "negative_hits", "evictions", "size"):
+            SENSOR_CACHE.labels(stat=stat).set_function(lambda stat=stat: self.sensor_cache.stats()[stat])
+        BUFFERED.labels().set_function(lambda: len(self._buffer))
+        BUFFERED_EVENTS.labels().set_function(lambda: len(self._event_buffer))
+
+        loaded = self.sensor_cache.preload()
+        self.sensor_cache.start_refresh()
+        print(f"🗂️ Caché de sensores precargada: {loaded} sensores")
+
+        # Particiones por fecha de datos_sensores: creación anticipada y retención.
+        # Con "auto" (por defecto) se activa si la tabla está particionada: sin
+        # mantenimiento todas las filas acabarían en la partición por defecto.
+        self.partitions: Optional[PartitionManager] = None
+        partitions = os.getenv("DB_PARTITIONS", "auto")
+        if partitions == "1" or (partitions == "auto" and self._run(PartitionManager.is_partitioned)):
+            self.partitions = PartitionManager.from_env(self._run)
+            self.partitions.start()
+
+        # Hilo que vacía el buffer cuando se cumple la ventana de tiempo
+        self._flusher = threading.Thread(target=self._flush_loop, name="pg-flusher", daemon=True)
+        self._flusher.start()
+        print(f"📦 Escritura por lotes: tamaño={self.batch_size}, intervalo={self.flush_interval}s")
+
     def save_sensor_data(self, data: SensorData):
-        with self.conn.cursor() as cur:
-            # Buscar el id_sensor con la descripción y la mac_address
+        # Solo se encola la lectura; la escritura real ocurre en flush()
+        with self._buffer_lock:
+            self._buffer.append(data)
+            if len(self._buffer) < self.batch_size:
+                return
+        self.flush()
+
+    def save_bomba_event(self, event: BombaEvent):
+        # Igual que las lecturas: se encola y se escribe por lotes en flush()
+        with self._buffer_lock:
+            self._event_buffer.append(event)
+            if len(self._event_buffer) < self.batch_size:
+                return
+        self.flush()
+
+    def flush(self) -> int:
+        """Escribe los eventos de bomba y las lecturas pendientes. Devuelve cuántas lecturas se insertaron."""
+        error = None
+        try:
+            self._flush_buffer("_event_buffer", self.write_bomba_batch, "eventos de bomba")
+        except Exception as e:
+            # Las lecturas se escriben igualmente; el error se propaga al final
+            error = e
+        written = self._flush_buffer("_buffer", self.write_sensor_batch, "lecturas")
+        if error is not None:
+            raise error
+        return written
+
+    def _flush_buffer(self, name: str, write: Callable[[list], int], label: str) -> int:
+        """Escribe en una transacción el contenido del buffer `name` con `write(batch)`."""
+        with self._buffer_lock:
+            batch = getattr(self, name)
+            if not batch:
+                return 0
+            setattr(self, name, [])
+
+        try:
+            return write(batch)
+        except Exception as e:
+            FLUSH_ERRORS.inc()
+            print(f"❌ Error al escribir lote de {len(batch)} {label}: {e}")
+            if self.on_flush_error is not None:
+                # El lote queda a salvo fuera del proceso (p. ej. en el spool local,
+                # que aparta él mismo las filas inválidas al reenviarlo)
+                self.on_flush_error(batch)
+                return 0
+            if isinstance(e, TRANSIENT_ERRORS):
+                # Devolver el lote al inicio del buffer para no perder datos
+                self._requeue(name, batch, label)
+                raise
+            if not isinstance(e, POISON_ERRORS):
+                MESSAGES_DROPPED.labels(reason="db_error").inc(len(batch))
+                logger.error(f"❌ Lote de {len(batch)} {label} descartado: el error no se resuelve reintentando")
+                return 0
+
+        # Alguna fila inválida: se aísla partiendo el lote para escribir el resto
+        retry = []
+        written = self._write_isolating(batch, write, label, retry)
+        if retry:
+            self._requeue(name, retry, label)
+        return written
+
+    def _write_isolating(self, batch: list, write: Callable[[list], int], label: str, retry: list) -> int:
+        """Escribe `batch` partiéndolo en mitades hasta aislar las filas que PostgreSQL rechaza,
+        que se descartan. Lo que falla por la conexión se añade a `retry`, en orden."""
+        try:
+            return write(batch)
+        except POISON_ERRORS as e:
+            if len(batch) == 1:
+                MESSAGES_DROPPED.labels(reason="db_poison").inc()
+                logger.error(f"❌ {label.capitalize()}: fila rechazada por PostgreSQL, se descarta: {batch[0]} ({e})")
+                return 0
+            middle = len(batch) // 2
+            return (self._write_isolating(batch[:middle], write, label, retry)
+                    + self._write_isolating(batch[middle:], write, label, retry))
+        except TRANSIENT_ERRORS:
+            retry.extend(batch)
+            return 0
+        except Exception as e:
+            MESSAGES_DROPPED.labels(reason="db_error").inc(len(batch))
+            logger.error(f"❌ {len(batch)} {label} descartados: {e}")
+            return 0
+
+    def _requeue(self, name: str, batch: list, label: str):
+        """Devuelve `batch` al inicio del buffer `name`, descartando lo más antiguo si pasa de `buffer_max`."""
+        with self._buffer_lock:
+            buffer = getattr(self, name)
+            buffer[:0] = batch
+            excess = len(buffer) - self.buffer_max
+            if excess > 0:
+                del buffer[:excess]
+        if excess > 0:
+            MESSAGES_DROPPED.labels(reason="buffer_full").inc(excess)
+            logger.warning(f"⚠️ Buffer de {label} lleno: descartados {excess} registros antiguos")
+
+    def write_sensor_batch(self, batch) -> int:
+        """Resuelve los sensores del lote y lo inserta en una transacción; propaga cualquier error."""
+        with STAGE_SECONDS.labels(stage="lookup", type="SENSOR").time():
+            ids = self.sensor_cache.resolve_many((data.nombre, data.mac_address) for data in batch)
+
+        rows = []
+        for data in batch:
+            id_sensor = ids.get((data.nombre, data.mac_address))
+            if id_sensor is None:
+                MESSAGES_DROPPED.labels(reason="unknown_sensor").inc()
+                logger.warning(f"⚠️ No se encontró el sensor con nombre '{data.nombre}' y MAC '{data.mac_address}'.")
+                continue
+            rows.append((id_sensor, data.mac_address, data.valor, data.fecha))
+
+        inserted = 0
+        if rows:
+            with STAGE_SECONDS.labels(stage="db_insert", type="SENSOR").time():
+                inserted = self._run(self._insert_sensor_rows, rows)
+            ROWS_INSERTED.labels(table="datos_sensores").inc(inserted)
+            if inserted < len(rows):
+                MESSAGES_DROPPED.labels(reason="duplicate").inc(len(rows) - inserted)
+        logger.debug(f"✅ Lote guardado: {inserted} de {len(rows)} lecturas en datos_sensores")
+        return inserted
+
+    def _insert_sensor_rows(self, cur, rows) -> int:
+        # Una sola EXECUTE con el lote en columnas (arrays)
+        cur.execute("EXECUTE ins_dato_sensor (%s, %s, %s, %s)", [list(column) for column in zip(*rows)])
+        inserted = cur.fetchall()
+        if self.rollups and inserted:
+            hourly, daily, latest = rollups.summarize(inserted)
+            execute_batch(cur, "EXECUTE ups_rollup_hora (%s, %s, %s, %s, %s, %s)", hourly, page_size=len(hourly))
+            execute_batch(cur, "EXECUTE ups_rollup_dia (%s, %s, %s, %s, %s, %s)", daily, page_size=len(daily))
+            execute_batch(cur, "EXECUTE ups_ultimo (%s, %s, %s, %s)", latest, page_size=len(latest))
+        return len(inserted)
+
+    def write_bomba_batch(self, events) -> int:
+        """Inserta en una transacción los eventos de bomba y, para los apagados con
+        duración, la activación y los contadores por sensor. Devuelve cuántos eventos se insertaron."""
+        rows = [
+            (e.id_sensor, e.mac_address, e.evento, e.valor_humedad, e.tiempo_encendida_seg, e.fecha)
+            for e in events
+        ]
+        if not rows:
+            return 0
+        with STAGE_SECONDS.labels(stage="db_insert", type="BOMBA").time():
+            inserted, activations = self._run(self._insert_bomba_rows, rows)
+        ROWS_INSERTED.labels(table="eventos_bomba").inc(inserted)
+        ROWS_INSERTED.labels(table="activaciones_bombas").inc(activations)
+        logger.debug(f"✅ Lote guardado: {inserted} de {len(rows)} eventos de bomba, {activations} activaciones")
+        return inserted
+
+    def _insert_bomba_rows(self, cur, rows):
+        # tiempo_encendida_seg puede ser todo NULL: sin el cast el array llegaría como text[]
+        cur.execute("EXECUTE ins_evento_bomba (%s, %s, %s, %s, %s::integer[], %s)", [list(c) for c in zip(*rows)])
+        inserted = cur.rowcount
+
+        # Solo el apagado trae la duración: es el que cuenta como activación
+        finished = [
+            (id_sensor, mac, fecha, duracion)
+            for id_sensor, mac, _evento, _humedad, duracion, fecha in rows
+            if duracion is not None and duracion > 0
+        ]
+        if not finished:
+            return inserted, 0
+        cur.execute("EXECUTE ins_activacion_bomba (%s, %s, %s, %s)", [list(c) for c in zip(*finished)])
+        activations = cur.fetchall()
+        if activations:
+            summary = rollups.summarize_activations(activations)
+            execute_batch(cur, "EXECUTE ups_resumen_bomba (%s, %s, %s, %s)", summary, page_size=len(summary))
+        return inserted, len(activations)
+
+    def _load_sensor_ids(self, keys):
+        """Resuelve en una sola consulta el id_sensor de varios pares (descripcion, mac_address)."""
+        keys = list(keys)
+
+        def query(cur):
+            cur.execute("EXECUTE buscar_sensores (%s, %s)", ([k[0] for k in keys], [k[1] for k in keys]))
+            return {(descripcion, mac): id_sensor for descripcion, mac, id_sensor in cur.fetchall()}
+
+        return self._run(query)
+
+    def _load_all_sensor_ids(self):
+        """Carga el catálogo completo de sensores para precargar/refrescar la caché."""
+        def query(cur):
             cur.execute(
                 """
-                SELECT s.id_sensor
+                SELECT s.descripcion, d.mac_address, s.id_sensor
                 FROM sensores s
                 JOIN dispositivos d ON s.id_dispositivo = d.id_dispositivo
-                WHERE s.descripcion = %s AND d.mac_address = %s
-                """,
-                (data.nombre, data.mac_address)
+                """
             )
+            return {(descripcion, mac): id_sensor for descripcion, mac, id_sensor in cur.fetchall()}
 
-            sensor_row = cur.fetchone()
-
-            if sensor_row:
-                id_sensor = sensor_row[0]
-                cur.execute(
-                    """
-                    INSERT INTO datos_sensores (id_sensor, mac_address, valor, fecha)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (id_sensor, data.mac_address, data.valor, data.fecha)
-                )
-                print(f"✅ Dato guardado para sensor ID {id_sensor}")
-            else:
-                print(f"⚠️ No se encontró el sensor con nombre '{data.nombre}' y MAC '{data.mac_address}'.")
+        return self._run(query)
 
-    def save_bomba_activation(self, event: BombaEvent):
-        print(f"🔍 Guardando activación de bomba para MAC: {event.mac_address}")
-        print(f"🔍 Duración: {event.tiempo_encendida_seg} segundos")
-        
-        with self.conn.cursor() as cur:
+    def _rollup_tables_exist(self) -> bool:
+        # Conexión directa del pool: _run() prepararía la conexión sin las sentencias de resúmenes
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(rollups.TABLES_EXIST)
+                return bool(cur.fetchone()[0])
+        finally:
+            conn.rollback()
+            self.pool.putconn(conn)
+
+    def _run(self, fn, *args, timeout: Optional[float] = None):
+        """Ejecuta `fn(cur, *args)` en una transacción; si la conexión estaba rota reintenta una vez con otra.
+
+        `timeout` limita la espera por una conexión libre (PoolError al agotarse)."""
+        for attempt in range(2):
+            try:
+                with self._connection(timeout) as conn, conn.cursor() as cur:
+                    return fn(cur, *args)
+            except CONNECTION_ERRORS as e:
+                if attempt:
+                    raise
+                RECONNECTS.labels(target="postgres").inc()
+                print(f"⚠️ Conexión a PostgreSQL perdida, reintentando con una nueva: {e}")
+
+    @contextmanager
+    def _connection(self, timeout: Optional[float] = None):
+        """Toma una conexión sana del pool y la devuelve al terminar la transacción."""
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"sin conexiones libres tras {timeout}s")
+        conn = None
+        broken = False
+        try:
+            conn = self._checkout()
+            with conn:
+                yield conn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                conn.last_used = time.monotonic()
+                self.pool.putconn(conn, close=broken or bool(conn.closed))
+            self._slots.release()
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            conn = self.pool.getconn()
             try:
-                # Ya no buscamos el id_sensor, lo usamos directamente
-                cur.execute(
-                    """
-                    INSERT INTO activaciones_bombas (id_sensor, mac_address, fecha, duracion_segundos)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (event.id_sensor, event.mac_address, event.fecha, event.tiempo_encendida_seg)
-                )
-                print(f"✅ Activación guardada - Sensor ID: {event.id_sensor}, Duración: {event.tiempo_encendida_seg}s")
-
-                # Verificar que se guardó
-                cur.execute("SELECT COUNT(*) FROM activaciones_bombas WHERE id_sensor = %s", (event.id_sensor,))
-                count = cur.fetchone()[0]
-                print(f"📊 Total activaciones para sensor {event.id_sensor}: {count}")
-
-            except Exception as e:
-                print(f"❌ Error al guardar activación de bomba: {e}")
-                import traceback
-                traceback.print_exc()
\ No newline at end of file
+                if conn.closed:
+                    raise psycopg2.InterfaceError("conexión cerrada")
+                if time.monotonic() - conn.last_used > self.health_check_idle:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                    conn.rollback()
+                if not conn.prepared:
+                    self._prepare(conn)
+                return conn
+            except CONNECTION_ERRORS as e:
+                # Conexión muerta: se descarta y el pool abrirá una nueva
+                RECONNECTS.labels(target="postgres").inc()
+                print(f"⚠️ Descartando conexión a PostgreSQL no válida: {e}")
+                self.pool.putconn(conn, close=True)
+            except Exception:
+                self.pool.putconn(conn, close=True)
+                raise
+
+    def _prepare(self, conn: _PooledConnection):
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for statement in self._statements.values():
+                    cur.execute(statement)
+        finally:
+            conn.autocommit = False
+        conn.prepared = True
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # El lote ya fue devuelto al buffer; se reintenta en la siguiente ventana
+                pass
+
+    def ping(self) -> bool:
+        """Comprobación de disponibilidad (/readyz): toma una conexión del pool y ejecuta SELECT 1.
+
+        Con el pool agotado responde "no listo" tras `ping_timeout` en lugar de
+        bloquear el scrape; el resultado se reutiliza durante `ping_cache` segundos."""
+        checked_at, ready = self._last_ping
+        if time.monotonic() - checked_at < self.ping_cache:
+            return ready
+
+        def select_one(cur):
+            cur.execute("SELECT 1")
+            return cur.fetchone()[0] == 1
+
+        try:
+            ready = bool(self._run(select_one, timeout=self.ping_timeout))
+        except Exception:
+            ready = False
+        self._last_ping = (time.monotonic(), ready)
+        return ready
+
+    def close(self):
+        """Detiene el hilo de vaciado, escribe lo pendiente y cierra el pool."""
+        self._stop_event.set()
+        self._flusher.join(timeout=self.flush_interval + 1)
+        self.sensor_cache.stop()
+        if self.partitions is not None:
+            self.partitions.stop()
+        try:
+            self.flush()
+        finally:
+            self.pool.closeall()
+
+    def save_bomba_activation(self, event: BombaEvent):
+        """Escribe el evento y su activación de inmediato, sin pasar por el buffer."""
+        logger.debug(f"🔍 Guardando activación de bomba para MAC: {event.mac_address}")
+        logger.debug(f"🔍 Duración: {event.tiempo_encendida_seg} segundos")
+        try:
+            self.write_bomba_batch([event])
+        except Exception as e:
+            # Se propaga para que el llamador pueda guardar el evento en el spool
+            print(f"❌ Error al guardar activación de bomba: {e}")
+            raise
@@ -0,0 +1,170 @@
+import logging
+import threading
+from typing import Callable, List, Optional
+from src.easygrow_consumer.domain.repository import SensorDataRepository, BombaRepository, MessageQueuePublisher
+from src.easygrow_consumer.infrastructure.backoff import Backoff, retry
+from src.easygrow_consumer.infrastructure.metrics import HEALTH, RECONNECTS
+
+logger = logging.getLogger("easygrow.bootstrap")
+
+
+class SinkNotReady(ConnectionError):
+    """El destino todavía no está conectado."""
+
+
+class LazyConnector:
+    """Crea un destino (repositorio o publicador) en un hilo propio, reintentando con backoff.
+
+    Permite arrancar PostgreSQL, RabbitMQ y MQTT a la vez: el consumidor
+    empieza a recibir mensajes sin esperar a la dependencia más lenta.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], object], backoff: Optional[Backoff] = None):
+        self.name = name
+        self.factory = factory
+        self.backoff = backoff or Backoff.from_env()
+        self.instance = None
+
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._on_ready: List[Callable[[object], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        HEALTH.readiness(name, self.healthy)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def healthy(self) -> bool:
+        """Conectado y, si la instancia tiene ping(), respondiendo ahora mismo."""
+        if not self.ready:
+            return False
+        ping = getattr(self.instance, "ping", None)
+        return ping() if ping is not None else True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._connect, name=f"connect-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def when_ready(self, callback: Callable[[object], None]):
+        """Ejecuta `callback(instancia)` al conectar, o ya mismo si está conectado."""
+        with self._lock:
+            if not self.ready:
+                self._on_ready.append(callback)
+                return
+        callback(self.instance)
+
+    def get(self, wait: Optional[float] = 0):
+        """Instancia conectada. Con `wait` None espera hasta que conecte (o se pida parar)."""
+        if self.ready:
+            return self.instance
+        if wait is None:
+            while not self._ready.wait(0.5):
+                if self._stop_event.is_set():
+                    break
+        elif wait > 0:
+            self._ready.wait(wait)
+        if not self.ready:
+            raise SinkNotReady(f"{self.name} todavía no está conectado")
+        return self.instance
+
+    def _connect(self):
+        def on_error(error, delay):
+            RECONNECTS.labels(target=self.name).inc()
+            logger.warning(f"⚠️ {self.name} no disponible ({error}); reintento en {delay:.1f}s")
+
+        logger.info(f"🔌 Conectando a {self.name} en segundo plano...")
+        instance = retry(self.factory, self.backoff, self._stop_event, on_error=on_error)
+        if instance is None:
+            return
+        with self._lock:
+            for callback in self._on_ready:
+                callback(instance)
+            self._on_ready = []
+            self.instance = instance
+            self._ready.set()
+        HEALTH.milestone(f"{self.name}_ready")
+
+
+class LazyRepository(SensorDataRepository, BombaRepository):
+    """Repositorio que delega en el de `connector` cuando está disponible.
+
+    Con `wait=0` falla en el acto mientras no haya conexión (el spool guarda
+    el dato y lo reenvía después); con `wait=None` bloquea al worker, y los
+    mensajes se acumulan en las colas del pipeline.
+    """
+
+    def __init__(self, connector: LazyConnector, wait: Optional[float] = 0):
+        self._connector = connector
+        self._wait = wait
+        self._on_flush_error = None
+
+    @property
+    def on_flush_error(self):
+        return self._on_flush_error
+
+    @on_flush_error.setter
+    def on_flush_error(self, callback):
+        # Se aplica al repositorio real en cuanto exista
+        self._on_flush_error = callback
+        self._connector.when_ready(lambda repo: setattr(repo, "on_flush_error", callback))
+
+    def _target(self):
+        return self._connector.get(self._wait)
+
+    def save_sensor_data(self, data):
+        self._target().save_sensor_data(data)
+
+    def save_bomba_event(self, event):
+        self._target().save_bomba_event(event)
+
+    def save_bomba_activation(self, event):
+        self._target().save_bomba_activation(event)
+
+    def write_sensor_batch(self, batch) -> int:
+        return self._target().write_sensor_batch(batch)
+
+    def write_bomba_batch(self, events) -> int:
+        return self._target().write_bomba_batch(events)
+
+    def flush(self) -> int:
+        # Sin conexión no hay nada en el buffer del repositorio real
+        return self._connector.instance.flush() if self._connector.ready else 0
+
+    def close(self):
+        self._connector.stop()
+        if self._connector.ready:
+            self._connector.instance.close()
+
+
+class LazyPublisher(MessageQueuePublisher):
+    """Publicador que delega en el de `connector` cuando está disponible (ver LazyRepository)."""
+
+    def __init__(self, connector: LazyConnector, wait: Optional[float] = 0):
+        self._connector = connector
+        self._wait = wait
+        self._on_undeliverable = None
+
+    @property
+    def on_undeliverable(self):
+        return self._on_undeliverable
+
+    @on_undeliverable.setter
+    def on_undeliverable(self, callback):
+        # Solo lo usa el publicador con confirmaciones; en el resto es un atributo inerte
+        self._on_undeliverable = callback
+        self._connector.when_ready(lambda publisher: setattr(publisher, "on_undeliverable", callback))
+
+    def publish(self, data) -> None:
+        self._connector.get(self._wait).publish(data)
+
+    def close(self):
+        self._connector.stop()
+        if self._connector.ready:
+            self._connector.instance.close()
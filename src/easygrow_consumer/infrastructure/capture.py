@@ -0,0 +1,143 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator, Optional, Tuple
+from src.easygrow_consumer.infrastructure.metrics import REGISTRY
+
+logger = logging.getLogger("easygrow.capture")
+
+CAPTURED = REGISTRY.counter("easygrow_capture_records_total", "Mensajes MQTT grabados en el archivo de captura")
+
+# Formato: MAGIC y después bloques [longitud comprimida, nº de registros] + zlib(registros);
+# cada registro es [epoch, long. tópico, long. payload] + tópico + payload
+MAGIC = b"EGCAP\x01"
+_BLOCK = struct.Struct(">II")
+_RECORD = struct.Struct(">dHI")
+
+
+def _valid_end(mm, size: int) -> int:
+    """Desplazamiento tras el último bloque completo (un corte puede dejar uno a medias)."""
+    offset = len(MAGIC)
+    while offset + _BLOCK.size <= size:
+        length, _ = _BLOCK.unpack_from(mm, offset)
+        if offset + _BLOCK.size + length > size:
+            break
+        offset += _BLOCK.size + length
+    return offset
+
+
+class CaptureWriter:
+    """Graba el tráfico MQTT crudo (hora, tópico, payload) en un archivo de solo añadido.
+
+    Los registros se acumulan en memoria y se escriben comprimidos en bloques
+    de `block_records`, o cuando el bloque abierto tiene más de
+    `flush_interval` segundos (al llegar otro mensaje o al llamar a flush());
+    un corte pierde como mucho ese bloque.
+    """
+
+    def __init__(self, path: str, block_records: int = 256, flush_interval: float = 1.0):
+        self.path = path
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._records = []
+        self._block_started = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a+b")
+        self._prepare()
+        logger.info(f"🎞️ Grabando tráfico MQTT en {self.path}")
+
+    @classmethod
+    def from_env(cls) -> Optional["CaptureWriter"]:
+        """Captura en MQTT_CAPTURE_PATH, o None si no está definida."""
+        path = os.getenv("MQTT_CAPTURE_PATH", "")
+        if not path:
+            return None
+        return cls(
+            path,
+            block_records=int(os.getenv("MQTT_CAPTURE_BLOCK", "256")),
+            flush_interval=float(os.getenv("MQTT_CAPTURE_FLUSH_INTERVAL", "1")),
+        )
+
+    def _prepare(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+            return
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"❌ {self.path} no es un archivo de captura")
+            end = _valid_end(mm, size)
+        if end < size:
+            # Bloque incompleto de una ejecución anterior: se descarta para poder seguir añadiendo
+            logger.warning(f"⚠️ Captura {self.path}: descartados {size - end} bytes de un bloque incompleto")
+            self._file.truncate(end)
+
+    def record(self, topic: str, payload: bytes, ts: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            if not self._records:
+                self._block_started = now
+            self._records.append((time.time() if ts is None else ts, topic, payload))
+            if len(self._records) >= self.block_records or now - self._block_started >= self.flush_interval:
+                self._write_block()
+
+    def flush(self, force: bool = False):
+        """Escribe el bloque abierto si venció `flush_interval` (o siempre con `force`)."""
+        with self._lock:
+            if self._records and (force or time.monotonic() - self._block_started >= self.flush_interval):
+                self._write_block()
+
+    def close(self):
+        self.flush(force=True)
+        with self._lock:
+            self._file.close()
+
+    def _write_block(self):
+        parts = []
+        for ts, topic, payload in self._records:
+            encoded = topic.encode()
+            parts.append(_RECORD.pack(ts, len(encoded), len(payload)))
+            parts.append(encoded)
+            parts.append(payload)
+        body = zlib.compress(b"".join(parts))
+        self._file.write(_BLOCK.pack(len(body), len(self._records)) + body)
+        self._file.flush()
+        CAPTURED.inc(len(self._records))
+        self._records = []
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, str, bytes]]:
+    """Recorre (epoch, tópico, payload) de un archivo de captura, mapeado en memoria."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"❌ {path} no es un archivo de captura")
+            offset = len(MAGIC)
+            while offset + _BLOCK.size <= size:
+                length, count = _BLOCK.unpack_from(mm, offset)
+                start = offset + _BLOCK.size
+                if start + length > size:
+                    logger.warning(f"⚠️ Captura {path}: bloque final incompleto, se ignora")
+                    return
+                block = zlib.decompress(mm[start:start + length])
+                position = 0
+                for _ in range(count):
+                    ts, topic_len, payload_len = _RECORD.unpack_from(block, position)
+                    position += _RECORD.size
+                    topic = block[position:position + topic_len].decode()
+                    position += topic_len
+                    yield ts, topic, block[position:position + payload_len]
+                    position += payload_len
+                offset = start + length
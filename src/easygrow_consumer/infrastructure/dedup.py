@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Hashable, Optional, Tuple
+from src.easygrow_consumer.infrastructure.metrics import REGISTRY
+
+DEDUP_KEYS = REGISTRY.gauge("easygrow_dedup_keys", "Claves en la ventana de deduplicación")
+
+# Campos del payload que identifican una lectura concreta del dispositivo
+ID_FIELDS = ("msg_id", "seq", "ts")
+
+
+def message_key(topic: str, message: dict) -> Tuple[Hashable, bool]:
+    """Clave de deduplicación de un mensaje decodificado.
+
+    Devuelve (clave, identificada). Si el dispositivo envía `msg_id`, `seq`
+    o `ts`, la clave es (tópico, mac, sensor/evento, identificador) y dos
+    mensajes con la misma clave son la misma lectura. Si no, la clave es el
+    contenido completo, que solo prueba que es una reentrega cuando el
+    broker la marca como tal: un sensor puede repetir legítimamente el
+    mismo valor.
+    """
+    for field in ID_FIELDS:
+        value = message.get(field)
+        if value is not None:
+            return (
+                topic,
+                message.get("mac_address"),
+                message.get("nombre", message.get("evento")),
+                field,
+                value,
+            ), True
+    try:
+        key = (topic, tuple(sorted(message.items())))
+        hash(key)
+        return key, False
+    except TypeError:
+        # Valores no hashables (listas, objetos anidados)
+        return (topic, repr(sorted(message.items(), key=lambda item: item[0]))), False
+
+
+class DedupWindow:
+    """Conjunto acotado de claves vistas en los últimos `window_seconds`.
+
+    Las claves se agrupan en `buckets` conjuntos por intervalo de tiempo; al
+    avanzar el reloj se descarta el más antiguo entero, sin recorrer claves.
+    Si se supera `max_keys` también se descarta el más antiguo antes de
+    tiempo, de modo que la memoria queda acotada incluso con ráfagas.
+    """
+
+    def __init__(self, window_seconds: float = 300.0, buckets: int = 10, max_keys: int = 200_000):
+        self.window_seconds = window_seconds
+        self.buckets = max(1, buckets)
+        self.max_keys = max_keys
+        self._span = window_seconds / self.buckets
+        # (índice del intervalo, claves) del más antiguo al más reciente
+        self._ring = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        DEDUP_KEYS.labels().set_function(lambda: self._size)
+
+    @classmethod
+    def from_env(cls) -> Optional["DedupWindow"]:
+        """Ventana configurada en .env, o None si DEDUP_WINDOW=0."""
+        window = float(os.getenv("DEDUP_WINDOW", "300"))
+        if window <= 0:
+            return None
+        return cls(window, max_keys=int(os.getenv("DEDUP_MAX_KEYS", "200000")))
+
+    def is_duplicate(self, topic: str, message: dict, redelivered: bool = False) -> bool:
+        """Registra el mensaje y dice si ya se había visto.
+
+        Los mensajes sin identificador solo se descartan si llegan con la
+        marca DUP de MQTT (reentrega QoS 1 del broker). El runtime asyncio no
+        la conoce (aiomqtt no la expone) y nunca pasa `redelivered`: ahí solo
+        se deduplican los mensajes con identificador (ver SETUP_DATABASE.md).
+        """
+        key, identified = message_key(topic, message)
+        return self.seen(key, check=identified or redelivered)
+
+    def seen(self, key: Hashable, check: bool = True) -> bool:
+        now_index = int(time.monotonic() // self._span)
+        with self._lock:
+            self._rotate(now_index)
+            if check:
+                for _, keys in self._ring:
+                    if key in keys:
+                        self.duplicates += 1
+                        return True
+            if not self._ring or self._ring[-1][0] != now_index:
+                self._ring.append((now_index, set()))
+            keys = self._ring[-1][1]
+            if key not in keys:
+                keys.add(key)
+                self._size += 1
+            return False
+
+    def _rotate(self, now_index: int):
+        ring = self._ring
+        while ring and (ring[0][0] <= now_index - self.buckets or self._size >= self.max_keys):
+            _, keys = ring.popleft()
+            self._size -= len(keys)
+
+    def __len__(self) -> int:
+        return self._size
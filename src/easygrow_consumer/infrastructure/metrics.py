@@ -0,0 +1,371 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger("easygrow.metrics")
+
+# Buckets por defecto (segundos): de 50 µs a 10 s
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    """Escapa un valor de etiqueta según el formato de texto de Prometheus (\\, \" y saltos de línea)."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Devuelve (creándolo si hace falta) el hijo con esos valores de etiqueta."""
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def total(self, **match) -> float:
+        """Suma de los hijos cuyas etiquetas coinciden con `match` (todas si está vacío)."""
+        return sum(
+            child.value for values, child in list(self._children.items())
+            if all(values[self.labelnames.index(k)] == str(v) for k, v in match.items())
+        )
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_fn")
+
+    def __init__(self):
+        self._value = 0.0
+        self._fn: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, fn: Callable[[], float]):
+        """El valor se calcula al exponer las métricas (p. ej. profundidad de una cola)."""
+        self._fn = fn
+
+    @property
+    def value(self):
+        return self._fn() if self._fn is not None else self._value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "count", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q: float) -> float:
+        """Estimación del cuantil por interpolación lineal dentro del bucket."""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for i, c in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if seen + c >= rank and c:
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+            lower = upper
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        avg = self.sum / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": avg * 1000,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+        }
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def snapshots(self, **match) -> Dict[str, dict]:
+        """`snapshot()` de los hijos que coinciden con `match`, por sus valores de etiqueta."""
+        return {
+            " ".join(values): child.snapshot()
+            for values, child in sorted(self._children.items())
+            if all(values[self.labelnames.index(k)] == str(v) for k, v in match.items())
+        }
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, c in zip(self.buckets, child.counts):
+            cumulative += c
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {child.count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {child.sum}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas del proceso; `counter/gauge/histogram` devuelven la existente si ya se creó."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registro por defecto del proceso
+REGISTRY = Registry()
+
+# Métricas compartidas por todo el pipeline
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "easygrow_mqtt_messages_received_total", "Mensajes MQTT recibidos", ("topic",))
+MESSAGES_PROCESSED = REGISTRY.counter(
+    "easygrow_messages_processed_total", "Mensajes procesados por tipo y resultado", ("type", "result"))
+MESSAGES_DROPPED = REGISTRY.counter(
+    "easygrow_messages_dropped_total", "Mensajes descartados por motivo", ("reason",))
+STAGE_SECONDS = REGISTRY.histogram(
+    "easygrow_stage_duration_seconds", "Duración de cada etapa del pipeline", ("stage", "type"))
+RECONNECTS = REGISTRY.counter(
+    "easygrow_reconnects_total", "Reconexiones por dependencia", ("target",))
+
+
+# Referencia para medir el arranque (el módulo se importa al inicio del proceso)
+PROCESS_STARTED = time.monotonic()
+STARTUP_SECONDS = REGISTRY.gauge(
+    "easygrow_startup_seconds", "Segundos desde el arranque del proceso hasta cada hito", ("milestone",))
+COMPONENT_READY = REGISTRY.gauge(
+    "easygrow_component_ready", "1 si la dependencia está conectada", ("component",))
+
+
+class HealthChecks:
+    """Comprobaciones de vida (/healthz) y de disponibilidad (/readyz).
+
+    Cada comprobación es una función sin argumentos que devuelve un bool; la
+    respuesta es 200 si todas se cumplen y 503 si alguna falla.
+    """
+
+    def __init__(self):
+        self._checks: Dict[str, Dict[str, Callable[[], bool]]] = {"liveness": {}, "readiness": {}}
+        self._milestones = set()
+        self._lock = threading.Lock()
+
+    def liveness(self, name: str, check: Callable[[], bool]):
+        self._checks["liveness"][name] = check
+
+    def readiness(self, name: str, check: Callable[[], bool]):
+        self._checks["readiness"][name] = check
+        COMPONENT_READY.labels(component=name).set_function(lambda: int(self._safe(check)))
+
+    def status(self, kind: str) -> Tuple[bool, Dict[str, bool]]:
+        results = {name: self._safe(check) for name, check in list(self._checks[kind].items())}
+        return all(results.values()), results
+
+    def milestone(self, name: str) -> Optional[float]:
+        """Registra (solo la primera vez) los segundos desde el arranque hasta el hito `name`."""
+        if name in self._milestones:
+            return None
+        with self._lock:
+            if name in self._milestones:
+                return None
+            self._milestones.add(name)
+        elapsed = time.monotonic() - PROCESS_STARTED
+        STARTUP_SECONDS.labels(milestone=name).set(elapsed)
+        logger.info(f"⏱️ Arranque: {name} a los {elapsed:.2f}s")
+        return elapsed
+
+    @staticmethod
+    def _safe(check: Callable[[], bool]) -> bool:
+        try:
+            return bool(check())
+        except Exception:
+            return False
+
+
+HEALTH = HealthChecks()
+
+
+# Con un TopicRouter activo la etiqueta es el filtro de la ruta (ver set_topic_labeler)
+_topic_labeler: Optional[Callable[[str], str]] = None
+
+
+def set_topic_labeler(labeler: Optional[Callable[[str], str]]):
+    global _topic_labeler
+    _topic_labeler = labeler
+
+
+def topic_label(topic: str) -> str:
+    """Etiqueta de baja cardinalidad para un tópico MQTT."""
+    if _topic_labeler is not None:
+        return _topic_labeler(topic)
+    if topic.startswith("sensor/"):
+        return "sensor/#"
+    if topic == "bomba/estado":
+        return topic
+    return "other"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    health = HEALTH
+    probes = {"/healthz": "liveness", "/readyz": "readiness"}
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self._reply(200, self.registry.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        kind = self.probes.get(path)
+        if kind is None:
+            self.send_error(404)
+            return
+        ok, checks = self.health.status(kind)
+        body = json.dumps({"status": "ok" if ok else "fail", "checks": checks}).encode()
+        self._reply(200 if ok else 503, body, "application/json")
+
+    def _reply(self, code: int, body: bytes, content_type: str):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Sin log por cada scrape
+        pass
+
+
+def start_http_server(port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expone /metrics, /healthz y /readyz en un hilo de fondo."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"📈 Métricas disponibles en http://{addr}:{port}/metrics (sondas /healthz y /readyz)")
+    return server
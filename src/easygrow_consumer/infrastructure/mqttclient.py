@@ -1,15 +1,26 @@
-import json
 import os
+import threading
 import time
 import logging
+from datetime import datetime
 import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
-from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
 from src.easygrow_consumer.application.services import SensorService, BombaService
+from src.easygrow_consumer.infrastructure.pipeline import MessagePipeline
+from src.easygrow_consumer.infrastructure.payloads import decode
+from src.easygrow_consumer.infrastructure.router import TopicRouter, IGNORE
+from src.easygrow_consumer.infrastructure.dedup import DedupWindow
+from src.easygrow_consumer.infrastructure.backoff import Backoff
+from src.easygrow_consumer.infrastructure.capture import CaptureWriter
+from src.easygrow_consumer.infrastructure.metrics import (
+    HEALTH, MESSAGES_RECEIVED, MESSAGES_PROCESSED, MESSAGES_DROPPED, RECONNECTS, STAGE_SECONDS, topic_label,
+    set_topic_labeler,
+)
 
 
 class MQTTClient:
-    def __init__(self, sensor_service: SensorService, bomba_service: BombaService):
+    def __init__(self, sensor_service: SensorService, bomba_service: BombaService, connect: bool = True,
+                 lazy: bool = False, router: TopicRouter = None):
         load_dotenv()
         self.sensor_service = sensor_service
         self.bomba_service = bomba_service
@@ -19,18 +30,55 @@ class MQTTClient:
         self.username = os.getenv("USERMOSQUITTO")
         self.password = os.getenv("PASSMOSQUITTO")
 
-        if not all([self.host, self.username, self.password]):
+        if connect and not all([self.host, self.username, self.password]):
             raise ValueError("❌ Faltan variables de entorno MQTT")
 
         # Logger
         self.logger = logging.getLogger("easygrow.mqtt")
 
+        # Con MQTT_SHARE_GROUP varios procesos se reparten los mensajes mediante
+        # suscripciones compartidas de MQTT v5 ($share/<grupo>/<filtro>)
+        self.share_group = os.getenv("MQTT_SHARE_GROUP", "")
+        # Rutas de tópico a manejador (MQTT_ROUTES); QoS 1 por defecto: el broker
+        # reentrega lo no confirmado y los duplicados se filtran abajo
+        self.router = router or TopicRouter.from_env()
+        self.subscriptions = self.router.subscriptions(self.share_group)
+        self.topics = [topic for topic, _ in self.subscriptions]
+        set_topic_labeler(self.router.label)
+        # Manejador de cada ruta según su "handler"
+        self.handlers = {"sensor": self._handle_sensor_message, "bomba": self._handle_bomba_message}
+        unknown = {route.handler for route in self.router.routes} - set(self.handlers) - {IGNORE}
+        if unknown:
+            raise ValueError(f"❌ Manejadores MQTT desconocidos: {', '.join(sorted(unknown))}")
+        self.dedup = DedupWindow.from_env()
+        # Grabación del tráfico crudo para reproducirlo después (benchmarks/replay.py)
+        self.capture = CaptureWriter.from_env() if connect else None
+        self._stop_event = threading.Event()
+        self._backoff = Backoff.from_env()
+        # Latido del bucle de start() para la comprobación de liveness
+        self.last_loop = time.monotonic()
+        self._first_message = True
+
+        # Pipeline de procesamiento: on_message solo encola y los workers procesan.
+        # Con MQTT_WORKERS=0 se procesa en el hilo de red de paho como antes.
+        self.pipeline = None
+        if int(os.getenv("MQTT_WORKERS", "4")) > 0:
+            self.pipeline = MessagePipeline.from_env(self._dispatch)
+
         # Cliente MQTT
-        self.client = mqtt.Client()
+        client_id = os.getenv("MQTT_CLIENT_ID", "")
+        if self.share_group:
+            self.client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
+        else:
+            self.client = mqtt.Client(client_id=client_id)
         self.client.username_pw_set(self.username, self.password)
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
+        self.connected = False
+        if not connect:
+            # Uso en proceso (benchmarks): los mensajes se inyectan con on_message
+            return
         # Configurar reintentos controlados por cliente
         try:
             # ajustes de reconexión de la librería
@@ -39,80 +87,92 @@ class MQTTClient:
             self.logger.info(f"🔌 Conectando a MQTT broker en {self.host}...")
             # No bloqueamos aquí: conectamos y dejaremos el loop activo en start()
             self.client.connect(self.host, port=1883, keepalive=60)
-            self.connected = False
         except Exception as e:
+            if lazy:
+                # Arranque perezoso: start() seguirá reintentando con backoff
+                self.logger.warning(f"⚠️ Broker MQTT no disponible todavía: {e}")
+                return
             self.logger.exception(f"❌ Error al conectar al broker MQTT: {e}")
             raise e
 
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         if rc == 0:
             self.logger.info("✅ Conectado a MQTT broker")
             self.connected = True
-            # Suscribirse a ambos tópicos
-            self.client.subscribe("sensor/#")
-            self.client.subscribe("bomba/estado")
-            self.logger.info("📡 Suscrito a tópicos: sensor/# y bomba/estado")
+            self._backoff.reset()
+            HEALTH.milestone("mqtt_connected")
+            # Suscribirse a los filtros de las rutas
+            for topic, qos in self.subscriptions:
+                self.client.subscribe(topic, qos=qos)
+            self.logger.info(f"📡 Suscrito a tópicos: {', '.join(self.topics)}")
         else:
             self.logger.error(f"❌ Error de conexión: código {rc}")
 
     def on_message(self, client, userdata, msg):
+        if self.capture is not None:
+            self.capture.record(msg.topic, msg.payload)
+        kind = topic_label(msg.topic)
+        MESSAGES_RECEIVED.labels(topic=kind).inc()
+        if self._first_message:
+            self._first_message = False
+            HEALTH.milestone("first_message")
         try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode())
-            
-            if topic.startswith("sensor/"):
-                # Manejo de datos de sensores (YL-69, DHT22, etc.)
-                self._handle_sensor_message(payload)
-            elif topic == "bomba/estado":
-                # Manejo de eventos de bomba
-                self._handle_bomba_message(payload)
+            received = time.monotonic()
+            # Hora de llegada: es la fecha de la lectura si el dispositivo no envía `ts`,
+            # aunque el mensaje espere en la cola o pase por el desborde a disco
+            fecha = datetime.now()
+            payload = decode(msg.payload)
+            STAGE_SECONDS.labels(stage="parse", type=kind).observe(time.monotonic() - received)
+
+            if self.dedup is not None and self.dedup.is_duplicate(msg.topic, payload, bool(msg.dup)):
+                MESSAGES_DROPPED.labels(reason="duplicate").inc()
+                self.logger.debug(f"🔁 Mensaje duplicado descartado en tópico {msg.topic}")
+                return
+
+            if self.pipeline is not None:
+                # No bloquear el hilo de red: el procesamiento ocurre en los workers
+                self.pipeline.enqueue(msg.topic, payload, received, fecha)
             else:
-                self.logger.warning(f"⚠️ Tópico no reconocido: {topic}")
+                self._dispatch(msg.topic, payload, fecha)
 
         except Exception as e:
+            if isinstance(e, ValueError):
+                MESSAGES_DROPPED.labels(reason="invalid_payload").inc()
             self.logger.exception(f"❌ Error al procesar mensaje en tópico {msg.topic}: {e}")
 
-    def _handle_sensor_message(self, payload):
-        """Maneja mensajes de sensores regulares"""
-        from datetime import datetime
-        required_keys = ["mac_address", "valor", "nombre"]
-        if not all(k in payload for k in required_keys):
-            raise ValueError("❌ JSON incompleto para sensor. Se esperaba mac_address, valor y nombre.")
-
-        data = SensorData(
-            mac_address=payload["mac_address"],
-            nombre=payload["nombre"],
-            valor=payload["valor"],
-            fecha=datetime.now()  # Capturar fecha justo al procesar el mensaje
-        )
+    def _dispatch(self, topic, payload, fecha=None):
+        """Envía el mensaje decodificado al manejador de la ruta que corresponde a su tópico"""
+        route = self.router.match(topic)
+        if route is None:
+            MESSAGES_DROPPED.labels(reason="unknown_topic").inc()
+            self.logger.warning(f"⚠️ Tópico no reconocido: {topic}")
+            return
+        if route.handler == IGNORE:
+            MESSAGES_DROPPED.labels(reason="ignored").inc()
+            return
+        self.handlers[route.handler](route.build(topic, payload, fecha))
+
+    def _handle_sensor_message(self, data):
+        """Maneja mensajes de sensores regulares (YL-69, DHT22, etc.)"""
         try:
             self.sensor_service.handle_sensor_data(data)
-            self.logger.info(f"📦 Dato de sensor procesado: {data}")
+            MESSAGES_PROCESSED.labels(type="SENSOR", result="ok").inc()
+            self.logger.debug(f"📦 Dato de sensor procesado: {data}")
         except Exception:
+            MESSAGES_PROCESSED.labels(type="SENSOR", result="error").inc()
             self.logger.exception("❌ Error procesando dato de sensor")
 
-    def _handle_bomba_message(self, payload):
+    def _handle_bomba_message(self, event):
         """Maneja mensajes de eventos de bomba"""
-        from datetime import datetime
-        required_keys = ["mac_address", "evento", "valor_humedad","id_sensor"]
-        if not all(k in payload for k in required_keys):
-            raise ValueError("❌ JSON incompleto para bomba. Se esperaba mac_address, evento, valor_humedad e id_sensor.")
-
-        event = BombaEvent(
-            mac_address=payload["mac_address"],
-            evento=payload["evento"],
-            id_sensor=payload["id_sensor"],
-            valor_humedad=payload["valor_humedad"],
-            tiempo_encendida_seg=payload.get("tiempo_encendida_seg"),  # Opcional
-            fecha=datetime.now()  # Capturar fecha justo al procesar el mensaje
-        )
         try:
             self.bomba_service.handle_bomba_event(event)
-            self.logger.info(f"🔧 Evento de bomba procesado: {event}")
+            MESSAGES_PROCESSED.labels(type="BOMBA", result="ok").inc()
+            self.logger.debug(f"🔧 Evento de bomba procesado: {event}")
         except Exception:
+            MESSAGES_PROCESSED.labels(type="BOMBA", result="error").inc()
             self.logger.exception("❌ Error procesando evento de bomba")
 
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, client, userdata, rc, properties=None):
         # rc == 0 means a clean disconnect
         self.connected = False
         if rc == 0:
@@ -122,18 +182,26 @@ class MQTTClient:
 
     def start(self):
         """Inicia el loop MQTT en background y supervisa la conexión para reconectar si es necesario."""
+        if self.pipeline is not None:
+            self.pipeline.start()
         self.client.loop_start()
         try:
-            while True:
-                # Si no estamos conectados, intentamos reconectar periódicamente
+            while not self._stop_event.is_set():
+                self.last_loop = time.monotonic()
+                if self.capture is not None:
+                    self.capture.flush()
+                delay = 2
+                # Si no estamos conectados, intentamos reconectar con espera exponencial
                 if not getattr(self, 'connected', False):
                     try:
                         self.logger.info("Intentando reconectar al broker MQTT...")
+                        RECONNECTS.labels(target="mqtt").inc()
                         self.client.reconnect()
                         # si reconnect no lanza, dejaremos que on_connect marque el estado
                     except Exception as e:
-                        self.logger.warning(f"Reconexión fallida: {e}")
-                time.sleep(2)
+                        delay = self._backoff.next_delay()
+                        self.logger.warning(f"Reconexión fallida: {e}; reintento en {delay:.1f}s")
+                self._stop_event.wait(delay)
         except KeyboardInterrupt:
             self.logger.info("Deteniendo cliente MQTT por KeyboardInterrupt")
         finally:
@@ -141,4 +209,14 @@ class MQTTClient:
                 self.client.loop_stop()
                 self.client.disconnect()
             except Exception:
-                pass
\ No newline at end of file
+                pass
+            if self.capture is not None:
+                self.capture.close()
+            if self.pipeline is not None:
+                # Procesar lo que ya se recibió antes de devolver el control
+                self.pipeline.stop()
+                self.logger.info(f"📊 Estadísticas del pipeline: {self.pipeline.stats()}")
+
+    def stop(self):
+        """Pide a start() que se desconecte y vacíe el pipeline (seguro desde otro hilo o una señal)."""
+        self._stop_event.set()
@@ -0,0 +1,257 @@
+"""Mantenimiento de las particiones por rango de fecha de datos_sensores.
+
+Se ejecuta en un hilo del consumidor (DB_PARTITIONS=1) o, por ejemplo desde
+cron con el runtime asyncio, como script:
+
+    python -m src.easygrow_consumer.infrastructure.partitions
+"""
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger("easygrow.partitions")
+
+PARENT_TABLE = "datos_sensores"
+DEFAULT_PARTITION = "datos_sensores_default"
+
+# Granularidad -> (formato del sufijo, expresión regular del sufijo)
+INTERVALS = {
+    "month": ("%Y%m", re.compile(r"^datos_sensores_p(\d{6})$")),
+    "day": ("%Y%m%d", re.compile(r"^datos_sensores_p(\d{8})$")),
+}
+
+RETENTION_DETACH = "detach"
+RETENTION_DROP = "drop"
+
+
+def _period_start(day: date, interval: str) -> date:
+    return day.replace(day=1) if interval == "month" else day
+
+
+def _next_period(start: date, interval: str) -> date:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+class PartitionManager:
+    """Crea particiones por adelantado y separa o elimina las que superan la retención.
+
+    `run(fn)` debe ejecutar `fn(cur)` en una transacción (p. ej.
+    `PostgresRepository._run`). Los resúmenes por hora/día no se tocan: son
+    los que conservan el histórico una vez eliminadas las particiones.
+    """
+
+    def __init__(self, run: Callable, interval: str = "month", ahead: int = 2,
+                 retention_days: int = 0, retention_mode: str = RETENTION_DETACH,
+                 check_interval: float = 3600.0):
+        if interval not in INTERVALS:
+            raise ValueError(f"❌ Intervalo de partición inválido: {interval} (opciones: {', '.join(INTERVALS)})")
+        if retention_mode not in (RETENTION_DETACH, RETENTION_DROP):
+            raise ValueError(f"❌ Modo de retención inválido: {retention_mode}")
+        self.run = run
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.retention_mode = retention_mode
+        self.check_interval = check_interval
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def is_partitioned(cur) -> bool:
+        """True si datos_sensores es una tabla particionada (para DB_PARTITIONS=auto)."""
+        cur.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = %s
+            )
+            """,
+            (PARENT_TABLE,),
+        )
+        return bool(cur.fetchone()[0])
+
+    @classmethod
+    def from_env(cls, run: Callable) -> "PartitionManager":
+        return cls(
+            run,
+            interval=os.getenv("DB_PARTITION_INTERVAL", "month"),
+            ahead=int(os.getenv("DB_PARTITIONS_AHEAD", "2")),
+            retention_days=int(os.getenv("DB_RETENTION_DAYS", "0")),
+            retention_mode=os.getenv("DB_RETENTION_MODE", RETENTION_DETACH),
+            check_interval=float(os.getenv("DB_PARTITION_CHECK_INTERVAL", "3600")),
+        )
+
+    def partition_name(self, start: date) -> str:
+        return f"{PARENT_TABLE}_p{start.strftime(INTERVALS[self.interval][0])}"
+
+    def planned(self, today: Optional[date] = None) -> List[Tuple[str, date, date]]:
+        """Particiones (nombre, desde, hasta) del periodo actual y los `ahead` siguientes."""
+        start = _period_start(today or date.today(), self.interval)
+        planned = []
+        for _ in range(self.ahead + 1):
+            end = _next_period(start, self.interval)
+            planned.append((self.partition_name(start), start, end))
+            start = end
+        return planned
+
+    def ensure(self, today: Optional[date] = None) -> int:
+        """Crea las particiones que falten. Devuelve cuántas se crearon.
+
+        Si la partición por defecto ya tiene filas del rango (porque el
+        mantenimiento estuvo desactivado), se mueven a la partición nueva en
+        la misma transacción; si no, PostgreSQL rechazaría crearla.
+        """
+        created = 0
+        for name, start, end in self.planned(today):
+            def create(cur, name=name, start=start, end=end):
+                cur.execute("SELECT to_regclass(%s)", (name,))
+                if cur.fetchone()[0] is not None:
+                    return False, 0
+                # Los nombres salen de fechas formateadas, no de datos externos
+                moved = 0
+                cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+                if cur.fetchone()[0] is not None:
+                    cur.execute(
+                        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE fecha >= %s AND fecha < %s)",
+                        (start, end),
+                    )
+                    if cur.fetchone()[0]:
+                        cur.execute(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)")
+                        cur.execute(
+                            f"""
+                            WITH moved AS (
+                                DELETE FROM {DEFAULT_PARTITION} WHERE fecha >= %s AND fecha < %s RETURNING *
+                            )
+                            INSERT INTO {name} SELECT * FROM moved
+                            """,
+                            (start, end),
+                        )
+                        moved = cur.rowcount
+                        # ATTACH crea en la partición los índices y restricciones del padre
+                        cur.execute(
+                            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                            (start, end),
+                        )
+                        return True, moved
+                cur.execute(
+                    f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM (%s) TO (%s)",
+                    (start, end),
+                )
+                return True, 0
+
+            try:
+                done, moved = self.run(create)
+                if done:
+                    created += 1
+                    extra = f" · {moved} filas movidas desde {DEFAULT_PARTITION}" if moved else ""
+                    logger.info(f"🧱 Partición creada: {name} [{start}, {end}){extra}")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo crear la partición {name}: {e}")
+        return created
+
+    def expired(self, names: List[str], today: Optional[date] = None) -> List[str]:
+        """De `names`, las particiones cuyo rango termina antes del límite de retención."""
+        if self.retention_days <= 0:
+            return []
+        limit = (today or date.today()) - timedelta(days=self.retention_days)
+        fmt, pattern = INTERVALS[self.interval]
+        expired = []
+        for name in names:
+            match = pattern.match(name)
+            if not match:
+                continue
+            start = datetime.strptime(match.group(1), fmt).date()
+            if _next_period(start, self.interval) <= limit:
+                expired.append(name)
+        return sorted(expired)
+
+    def apply_retention(self, today: Optional[date] = None) -> List[str]:
+        """Separa (o elimina) las particiones expiradas. Devuelve sus nombres."""
+        if self.retention_days <= 0:
+            return []
+
+        def attached(cur):
+            cur.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = %s
+                """,
+                (PARENT_TABLE,),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+        removed = []
+        for name in self.expired(self.run(attached), today):
+            def detach(cur, name=name):
+                cur.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                if self.retention_mode == RETENTION_DROP:
+                    cur.execute(f"DROP TABLE {name}")
+
+            try:
+                self.run(detach)
+                removed.append(name)
+                action = "eliminada" if self.retention_mode == RETENTION_DROP else "separada"
+                logger.info(f"🗑️ Partición {action} por retención: {name}")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo aplicar la retención a {name}: {e}")
+        return removed
+
+    def maintain(self):
+        self.ensure()
+        self.apply_retention()
+
+    def start(self):
+        """Mantiene las particiones ahora y luego cada `check_interval` segundos."""
+        self.maintain()
+        self._thread = threading.Thread(target=self._loop, name="pg-partitions", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _loop(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.maintain()
+            except Exception:
+                logger.exception("❌ Error manteniendo las particiones de datos_sensores")
+
+
+def _main():
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-8s %(name)s: %(message)s")
+    conn = psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("BD_PORT", "5432"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        dbname=os.getenv("DB_SCHEMA"),
+    )
+
+    def run(fn):
+        with conn, conn.cursor() as cur:
+            return fn(cur)
+
+    try:
+        PartitionManager.from_env(run).maintain()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
+from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
+
+# orjson es opcional: decodifica directamente desde bytes sin pasar por str
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - depende del entorno
+    _loads = json.loads  # json.loads también acepta bytes (UTF-8)
+
+
+# Campo opcional con la hora de la lectura en el dispositivo (epoch en segundos o ISO 8601)
+DEVICE_TIMESTAMP_KEY = "ts"
+
+
+def decode(payload) -> dict:
+    """Decodifica el payload MQTT (bytes) a un dict sin copiarlo a str."""
+    obj = _loads(payload)
+    if not isinstance(obj, dict):
+        raise ValueError("❌ El payload debe ser un objeto JSON")
+    return obj
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise TypeError("no se admite bool")
+    if isinstance(value, (int, float)):
+        return value
+    return float(value)
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise TypeError("no se admite bool")
+    if isinstance(value, int):
+        return value
+    return int(value)
+
+
+def _optional(coerce):
+    return lambda value: None if value is None else coerce(value)
+
+
+def _timestamp(value) -> datetime:
+    """Hora del dispositivo como datetime local sin zona, igual que datetime.now()."""
+    if isinstance(value, bool):
+        raise TypeError("no se admite bool")
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    fecha = datetime.fromisoformat(str(value))
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone().replace(tzinfo=None)
+    return fecha
+
+
+class PayloadSchema:
+    """Esquema de un payload: valida y construye la entidad en una sola pasada.
+
+    `fields` es una tupla de (clave, conversor, obligatorio); los campos se
+    pasan a la entidad en ese mismo orden, seguidos de la fecha: la del
+    dispositivo si el payload trae `ts`, si no `fecha` (la hora de recepción,
+    tomada en on_message) o, a falta de ella, la hora actual.
+    """
+
+    __slots__ = ("entity", "fields", "error")
+
+    def __init__(self, entity: type, fields: Tuple[Tuple[str, Callable[[Any], Any], bool], ...], error: str):
+        self.entity = entity
+        self.fields = fields
+        self.error = error
+
+    def build(self, obj: dict, fecha: Optional[datetime] = None):
+        values = []
+        for key, coerce, required in self.fields:
+            value = obj.get(key)
+            if value is None and required:
+                raise ValueError(self.error)
+            try:
+                values.append(coerce(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"❌ Valor inválido para '{key}': {value!r}") from None
+        device_ts = obj.get(DEVICE_TIMESTAMP_KEY)
+        if device_ts is not None:
+            try:
+                fecha = _timestamp(device_ts)
+            except (TypeError, ValueError, OverflowError, OSError):
+                raise ValueError(f"❌ Valor inválido para '{DEVICE_TIMESTAMP_KEY}': {device_ts!r}") from None
+        return self.entity(*values, fecha or datetime.now())
+
+
+SENSOR_SCHEMA = PayloadSchema(
+    SensorData,
+    (
+        ("mac_address", str, True),
+        ("nombre", str, True),
+        ("valor", _number, True),
+    ),
+    "❌ JSON incompleto para sensor. Se esperaba mac_address, valor y nombre.",
+)
+
+BOMBA_SCHEMA = PayloadSchema(
+    BombaEvent,
+    (
+        ("mac_address", str, True),
+        ("evento", str, True),
+        ("id_sensor", _integer, True),
+        ("valor_humedad", _number, True),
+        ("tiempo_encendida_seg", _optional(_integer), False),  # Opcional
+    ),
+    "❌ JSON incompleto para bomba. Se esperaba mac_address, evento, valor_humedad e id_sensor.",
+)
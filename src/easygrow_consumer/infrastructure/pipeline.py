@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Callable, Optional
+from src.easygrow_consumer.infrastructure.metrics import (
+    REGISTRY, MESSAGES_DROPPED, STAGE_SECONDS, topic_label,
+)
+
+# Etapas que mide el pipeline (el resto se miden en los adaptadores)
+PIPELINE_STAGES = ("parse", "queue_wait", "handle")
+
+ENQUEUED = REGISTRY.counter("easygrow_pipeline_enqueued_total", "Mensajes encolados en el pipeline")
+PROCESSED = REGISTRY.counter("easygrow_pipeline_processed_total", "Mensajes atendidos por los workers")
+ERRORS = REGISTRY.counter("easygrow_pipeline_errors_total", "Excepciones del manejador en los workers")
+SPILLED = REGISTRY.counter("easygrow_pipeline_spilled_total", "Mensajes desbordados a disco")
+QUEUE_DEPTH = REGISTRY.gauge("easygrow_pipeline_queue_depth", "Mensajes en cola por shard", ("shard",))
+
+# Políticas de desborde cuando la cola de un shard está llena
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_SPILL = "spill"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+# Marca para detener los workers
+_STOP = object()
+
+logger = logging.getLogger("easygrow.pipeline")
+
+
+class _Shard:
+    """Cola acotada atendida por un único worker; conserva el orden de sus dispositivos."""
+
+    def __init__(self, index: int, maxsize: int, spill_path: Optional[str]):
+        self.index = index
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.spill_path = spill_path
+        self.spilling = False
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+
+class MessagePipeline:
+    """Desacopla la recepción MQTT del procesamiento.
+
+    `enqueue` recibe el mensaje ya decodificado (lo hace MQTTClient.on_message)
+    y lo encola en el shard de su mac_address; cada shard tiene un único
+    worker, por lo que los mensajes de un mismo dispositivo se procesan en orden.
+    El manejador recibe (tópico, mensaje, hora de recepción), también para los
+    mensajes que pasaron por el desborde a disco.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str, dict, datetime], None],
+        workers: int = 4,
+        queue_size: int = 1000,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        spill_dir: Optional[str] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"❌ Política de desborde no soportada: {overflow_policy}")
+        if overflow_policy == OVERFLOW_SPILL and not spill_dir:
+            raise ValueError("❌ La política 'spill' requiere un directorio de desborde")
+
+        self.handler = handler
+        self.overflow_policy = overflow_policy
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._shards = [
+            _Shard(i, queue_size, os.path.join(spill_dir, f"shard-{i}.jsonl") if spill_dir else None)
+            for i in range(max(1, workers))
+        ]
+
+        # Métricas
+        for shard in self._shards:
+            QUEUE_DEPTH.labels(shard=shard.index).set_function(shard.queue.qsize)
+
+    @classmethod
+    def from_env(cls, handler: Callable[[str, dict, datetime], None]) -> "MessagePipeline":
+        return cls(
+            handler,
+            workers=int(os.getenv("MQTT_WORKERS", "4")),
+            queue_size=int(os.getenv("MQTT_QUEUE_SIZE", "1000")),
+            overflow_policy=os.getenv("MQTT_OVERFLOW_POLICY", OVERFLOW_BLOCK),
+            spill_dir=os.getenv("MQTT_SPILL_DIR") or None,
+        )
+
+    def start(self):
+        for shard in self._shards:
+            shard.thread = threading.Thread(
+                target=self._worker, args=(shard,), name=f"pipeline-worker-{shard.index}", daemon=True
+            )
+            shard.thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Procesa lo que quede en las colas y detiene los workers."""
+        for shard in self._shards:
+            shard.queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            if shard.thread is not None:
+                shard.thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    def alive(self) -> bool:
+        """True si todos los workers siguen vivos (comprobación de liveness)."""
+        return all(shard.thread is not None and shard.thread.is_alive() for shard in self._shards)
+
+    def enqueue(self, topic: str, message: dict, received: float, fecha: datetime):
+        """Encola un mensaje ya decodificado en el shard de su mac_address.
+        `received` (time.monotonic()) mide la espera en cola; `fecha` es la hora de recepción."""
+        shard = self._shard_for(message.get("mac_address"))
+        item = (topic, message, received, fecha)
+
+        with shard.lock:
+            if shard.spilling:
+                # Mientras haya desborde en disco, todo va al archivo para no romper el orden
+                self._spill(shard, item)
+                return
+
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            shard.queue.put(item)
+        else:
+            try:
+                shard.queue.put_nowait(item)
+            except queue.Full:
+                if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    if not self._drop_oldest(shard, item):
+                        return
+                else:
+                    with shard.lock:
+                        shard.spilling = True
+                        self._spill(shard, item)
+                    return
+
+        ENQUEUED.inc()
+
+    def stats(self) -> dict:
+        counters = {
+            "enqueued": int(ENQUEUED.total()),
+            "processed": int(PROCESSED.total()),
+            "dropped": int(MESSAGES_DROPPED.total(reason="overflow")),
+            "spilled": int(SPILLED.total()),
+            "errors": int(ERRORS.total()),
+        }
+        counters["queue_depth"] = [shard.queue.qsize() for shard in self._shards]
+        counters["stages"] = {
+            name: snap
+            for stage in PIPELINE_STAGES
+            for name, snap in STAGE_SECONDS.snapshots(stage=stage).items()
+        }
+        return counters
+
+    def _shard_for(self, key) -> _Shard:
+        # crc32 es estable entre ejecuciones (hash() de str no lo es)
+        if not key:
+            return self._shards[0]
+        return self._shards[zlib.crc32(str(key).encode()) % len(self._shards)]
+
+    def _drop_oldest(self, shard: _Shard, item) -> bool:
+        """Sustituye el mensaje más antiguo del shard por `item`. False si `item` no se encoló."""
+        q = shard.queue
+        while True:
+            with q.mutex:
+                if len(q.queue) >= q.maxsize:
+                    MESSAGES_DROPPED.labels(reason="overflow").inc()
+                    if any(queued is _STOP for queued in q.queue):
+                        # Parada ya pedida: lo que se encole detrás no se procesaría,
+                        # así que se descarta el nuevo y la señal queda en su sitio
+                        return False
+                    # Sacar y meter bajo el mismo mutex: el tamaño no cambia y no hay carreras
+                    q.queue.popleft()
+                    q.queue.append(item)
+                    return True
+            try:
+                q.put_nowait(item)
+                return True
+            except queue.Full:
+                continue
+
+    def _spill(self, shard: _Shard, item):
+        topic, message, _received, fecha = item
+        with open(shard.spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"topic": topic, "message": message, "fecha": fecha.isoformat()}) + "\n")
+        SPILLED.inc()
+
+    def _drain_spill(self, shard: _Shard):
+        """Relee el archivo de desborde del shard cuando su cola se ha vaciado."""
+        with shard.lock:
+            if not shard.spilling:
+                return
+            try:
+                with open(shard.spill_path, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+                os.remove(shard.spill_path)
+            except FileNotFoundError:
+                lines = []
+            if not lines:
+                shard.spilling = False
+                return
+
+        for line in lines:
+            record = json.loads(line)
+            fecha = record.get("fecha")
+            self._process(record["topic"], record["message"], time.monotonic(),
+                          datetime.fromisoformat(fecha) if fecha else None)
+
+    def _worker(self, shard: _Shard):
+        while True:
+            if shard.spilling and shard.queue.empty():
+                self._drain_spill(shard)
+            try:
+                item = shard.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                self._drain_spill(shard)
+                return
+            self._process(*item)
+
+    def _process(self, topic: str, message: dict, received: float, fecha: Optional[datetime]):
+        kind = topic_label(topic)
+        started = time.monotonic()
+        STAGE_SECONDS.labels(stage="queue_wait", type=kind).observe(started - received)
+        try:
+            self.handler(topic, message, fecha)
+        except Exception as e:
+            # Un mensaje inválido no debe detener el worker
+            ERRORS.inc()
+            logger.exception(f"❌ Error al procesar mensaje en tópico {topic}: {e}")
+        finally:
+            STAGE_SECONDS.labels(stage="handle", type=kind).observe(time.monotonic() - started)
+            PROCESSED.inc()
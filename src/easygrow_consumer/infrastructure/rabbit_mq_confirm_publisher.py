@@ -0,0 +1,377 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+import pika
+from dotenv import load_dotenv
+from src.easygrow_consumer.domain.repository import MessageQueuePublisher
+from src.easygrow_consumer.infrastructure.serializers import serializer_for
+from src.easygrow_consumer.infrastructure.metrics import REGISTRY, MESSAGES_DROPPED, STAGE_SECONDS, RECONNECTS
+from src.easygrow_consumer.infrastructure.backoff import Backoff
+
+logger = logging.getLogger("easygrow.rabbitmq")
+
+CONFIRMS_IN_FLIGHT = REGISTRY.gauge("easygrow_rabbitmq_unconfirmed", "Mensajes sin confirmar por estado", ("state",))
+
+
+class _Outgoing:
+    """Mensaje pendiente de confirmación por parte del broker."""
+
+    __slots__ = ("kind", "queue", "body", "properties", "entities", "attempts", "sent_at")
+
+    def __init__(self, kind: str, queue: str, body: bytes, properties: pika.BasicProperties, entities: list):
+        # Tipo de mensaje (serializer_for), para las métricas por tipo
+        self.kind = kind
+        self.queue = queue
+        self.body = body
+        self.properties = properties
+        # Entidades de origen (varias si es un lote) para on_undeliverable
+        self.entities = entities
+        self.attempts = 0
+        self.sent_at = 0.0
+
+
+class ConfirmingRabbitMQPublisher(MessageQueuePublisher):
+    """Publicador con publisher confirms y muchos mensajes en vuelo.
+
+    Usa una SelectConnection en un hilo propio: `publish` solo encola y el
+    hilo de E/S publica sin esperar cada confirmación. Los acks se procesan
+    de forma asíncrona; los nacks y los mensajes sin confirmar tras
+    `confirm_timeout` se reintentan hasta `max_retries` veces. Como mucho hay
+    `confirm_window` mensajes sin confirmar: al llegar al límite `publish`
+    espera, lo que propaga la contrapresión a los workers, y si la espera
+    supera `publish_timeout` lanza ConnectionError (el spool guarda el dato).
+
+    Los mensajes que no se entregan (reintentos agotados o pendientes al
+    cerrar) se pasan a `on_undeliverable(entidades)` si está definido; si no,
+    se descartan y se cuentan en MESSAGES_DROPPED.
+
+    La entrega es "al menos una vez": un reintento vuelve al principio de la
+    cola de envío, pero los mensajes que ya estaban en vuelo detrás de él
+    pueden llegar antes, y si el ack del envío original llega después del
+    timeout el broker recibe el mensaje dos veces. Los consumidores deben
+    tolerar duplicados y desorden puntual (la BD ya ignora los duplicados).
+
+    Con `RABBITMQ_BATCH_SIZE` > 0 las lecturas de sensores se agrupan por cola
+    en un único mensaje (array JSON o NDJSON).
+    """
+
+    def __init__(self):
+        load_dotenv()
+
+        self.sensor_queue = os.getenv("RABBITMQ_SENSOR_QUEUE", "datos_sensores")
+        self.bomba_queue = os.getenv("RABBITMQ_BOMBA_QUEUE", "eventos_bomba")
+        self.summary_queue = os.getenv("RABBITMQ_PUMP_SUMMARY_QUEUE", "resumen_bombas")
+        # Cola de destino por tipo de mensaje (ver serializers.SERIALIZERS)
+        self.queues = {"SENSOR": self.sensor_queue, "BOMBA": self.bomba_queue, "RESUMEN_BOMBA": self.summary_queue}
+
+        self.confirm_window = int(os.getenv("RABBITMQ_CONFIRM_WINDOW", "500"))
+        self.confirm_timeout = float(os.getenv("RABBITMQ_CONFIRM_TIMEOUT", "5"))
+        self.max_retries = int(os.getenv("RABBITMQ_PUBLISH_RETRIES", "5"))
+        self.publish_timeout = float(os.getenv("RABBITMQ_PUBLISH_TIMEOUT", "10"))
+        self.on_undeliverable: Optional[Callable[[List[object]], None]] = None
+        self.batch_size = int(os.getenv("RABBITMQ_BATCH_SIZE", "0"))
+        self.batch_interval = float(os.getenv("RABBITMQ_BATCH_INTERVAL", "0.5"))
+        self.batch_format = os.getenv("RABBITMQ_BATCH_FORMAT", "json")
+        if self.batch_format not in ("json", "ndjson"):
+            raise ValueError(f"❌ Formato de lote no soportado: {self.batch_format}")
+
+        username = os.getenv("RABBITMQ_USER")
+        password = os.getenv("RABBITMQ_PASSWORD")
+        host = os.getenv("RABBITMQ_HOST")
+        if not all([username, password, host]):
+            raise ValueError("❌ Faltan variables de entorno para RabbitMQ")
+        self.host = host
+        self.parameters = pika.ConnectionParameters(
+            host=host,
+            credentials=pika.PlainCredentials(username=username, password=password),
+            heartbeat=600,
+            blocked_connection_timeout=300,
+        )
+
+        self._properties = pika.BasicProperties(delivery_mode=2, content_type="application/json")
+
+        # Estado compartido entre los workers y el hilo de E/S
+        self._pending = deque()
+        self._unacked = {}
+        self._next_tag = 1
+        self._window = threading.BoundedSemaphore(self.confirm_window)
+        self._batches = {}
+        self._batch_lock = threading.Lock()
+
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._ready = threading.Event()
+        self._stopping = False
+
+        self.published = 0
+        self.acked = 0
+        self.retried = 0
+        self.failed = 0
+
+        logger.info(f"🔌 Conectando a RabbitMQ en {host} (publisher confirms)...")
+        self._io_thread = threading.Thread(target=self._run, name="rabbitmq-io", daemon=True)
+        self._io_thread.start()
+        if not self._ready.wait(timeout=30):
+            self._stopping = True
+            raise ConnectionError(f"❌ No se pudo conectar a RabbitMQ en {host}")
+        logger.info(f"✅ Conectado correctamente a RabbitMQ (ventana de confirmación: {self.confirm_window})")
+
+        if self.batch_size > 0:
+            # Los lotes abiertos se envían al cumplirse la ventana de tiempo. Se hace
+            # en un hilo propio para no bloquear el ioloop esperando el semáforo.
+            self._batcher = threading.Thread(target=self._batch_loop, name="rabbitmq-batcher", daemon=True)
+            self._batcher.start()
+
+        CONFIRMS_IN_FLIGHT.labels(state="in_flight").set_function(lambda: len(self._unacked))
+        CONFIRMS_IN_FLIGHT.labels(state="pending").set_function(lambda: len(self._pending))
+
+    def publish(self, data) -> None:
+        message_type, encode = serializer_for(data)
+        queue = self.queues[message_type]
+        message = encode(data)
+
+        if self.batch_size > 0 and message_type == "SENSOR":
+            with self._batch_lock:
+                batch = self._batches.setdefault(queue, [])
+                batch.append((data, message))
+                if len(batch) < self.batch_size:
+                    return
+                del self._batches[queue]
+            try:
+                self._send_batch(queue, batch)
+            except ConnectionError:
+                # El dato actual lo guarda quien llama al recibir la excepción; el resto del lote, el hook
+                self._undeliverable([entity for entity, _ in batch[:-1]], "timeout")
+                raise
+            return
+
+        self._enqueue(_Outgoing(message_type, queue, message, self._properties, [data]))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Envía los lotes abiertos y espera a que el broker confirme todo lo publicado."""
+        self._flush_batches()
+        deadline = time.monotonic() + timeout
+        while self._pending or self._unacked:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self):
+        try:
+            if not self.flush():
+                logger.warning(f"⚠️ Cerrando con {len(self._pending) + len(self._unacked)} mensajes sin confirmar")
+        finally:
+            self._stopping = True
+            if self._connection is not None:
+                self._connection.ioloop.add_callback_threadsafe(self._close_connection)
+            self._io_thread.join(timeout=5)
+            # Lo que no llegó a confirmarse no se pierde en silencio
+            leftover = list(self._unacked.values()) + list(self._pending)
+            self._unacked.clear()
+            self._pending.clear()
+            for outgoing in leftover:
+                self.failed += 1
+                self._undeliverable(outgoing.entities, "close")
+            logger.info("🔌 Conexión a RabbitMQ cerrada")
+
+    def ping(self) -> bool:
+        """Comprobación de disponibilidad (/readyz): canal abierto y con confirmaciones activas."""
+        channel = self._channel
+        return self._ready.is_set() and channel is not None and channel.is_open
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "acked": self.acked,
+            "retried": self.retried,
+            "failed": self.failed,
+            "in_flight": len(self._unacked),
+            "pending": len(self._pending),
+        }
+
+    # --- Lado de los workers -------------------------------------------------
+
+    def _enqueue(self, outgoing: _Outgoing):
+        # Espera si ya hay `confirm_window` mensajes sin confirmar
+        if not self._window.acquire(timeout=self.publish_timeout):
+            raise ConnectionError(
+                f"❌ RabbitMQ no confirmó {self.confirm_window} mensajes en {self.publish_timeout}s"
+            )
+        self._pending.append(outgoing)
+        if self._ready.is_set():
+            self._connection.ioloop.add_callback_threadsafe(self._drain_pending)
+
+    def _send_batch(self, queue: str, batch):
+        messages = [message for _, message in batch]
+        if self.batch_format == "ndjson":
+            body = b"\n".join(messages)
+            content_type = "application/x-ndjson"
+        else:
+            body = b"[" + b",".join(messages) + b"]"
+            content_type = "application/json"
+        properties = pika.BasicProperties(
+            delivery_mode=2,
+            content_type=content_type,
+            type="batch",
+            headers={"x-batch-size": len(messages)},
+        )
+        self._enqueue(_Outgoing("SENSOR", queue, body, properties, [entity for entity, _ in batch]))
+
+    def _flush_batches(self):
+        with self._batch_lock:
+            batches = self._batches
+            self._batches = {}
+        for queue, batch in batches.items():
+            if not batch:
+                continue
+            try:
+                self._send_batch(queue, batch)
+            except ConnectionError as e:
+                logger.warning(f"⚠️ Lote para '{queue}' no enviado: {e}")
+                self._undeliverable([entity for entity, _ in batch], "timeout")
+
+    def _undeliverable(self, entities: list, reason: str):
+        """Entrega a on_undeliverable lo que no se pudo publicar; sin hook (o si falla) se descarta."""
+        if not entities:
+            return
+        if self.on_undeliverable is not None:
+            try:
+                self.on_undeliverable(entities)
+                return
+            except Exception:
+                logger.exception("❌ Error en on_undeliverable")
+        MESSAGES_DROPPED.labels(reason="publish_failed").inc(len(entities))
+        logger.error(f"❌ {len(entities)} mensajes descartados sin publicar ({reason})")
+
+    def _batch_loop(self):
+        while not self._stopping:
+            time.sleep(self.batch_interval)
+            self._flush_batches()
+
+    # --- Hilo de E/S ---------------------------------------------------------
+
+    def _run(self):
+        self._backoff = Backoff.from_env()
+        while not self._stopping:
+            self._connection = pika.SelectConnection(
+                self.parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection.ioloop.start()
+            if self._stopping:
+                break
+            delay = self._backoff.next_delay()
+            logger.warning(f"⚠️ Conexión a RabbitMQ perdida, reintentando en {delay:.1f}s...")
+            RECONNECTS.labels(target="rabbitmq").inc()
+            time.sleep(delay)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        logger.warning(f"⚠️ Fallo al conectar a RabbitMQ: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._ready.clear()
+        self._channel = None
+        # Lo no confirmado se vuelve a publicar, en orden, en la próxima conexión
+        for tag in sorted(self._unacked, reverse=True):
+            self._pending.appendleft(self._unacked.pop(tag))
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        self._declare_queues(channel, list(self.queues.values()), None)
+
+    def _declare_queues(self, channel, names, _frame):
+        # Declaraciones encadenadas: cada callback declara la siguiente cola
+        if not names:
+            self._on_queues_declared(_frame)
+            return
+        channel.queue_declare(
+            queue=names[0], durable=True,
+            callback=lambda frame: self._declare_queues(channel, names[1:], frame),
+        )
+
+    def _on_queues_declared(self, _frame):
+        # Los delivery tags se reinician con cada canal
+        self._next_tag = 1
+        self._backoff.reset()
+        self._channel.confirm_delivery(self._on_delivery_confirmation)
+        self._ready.set()
+        self._schedule_housekeeping()
+        self._drain_pending()
+
+    def _drain_pending(self):
+        channel = self._channel
+        while self._pending and channel is not None and channel.is_open:
+            outgoing = self._pending.popleft()
+            outgoing.attempts += 1
+            outgoing.sent_at = time.monotonic()
+            channel.basic_publish(
+                exchange="",
+                routing_key=outgoing.queue,
+                body=outgoing.body,
+                properties=outgoing.properties,
+            )
+            self._unacked[self._next_tag] = outgoing
+            self._next_tag += 1
+            self.published += 1
+
+    def _on_delivery_confirmation(self, frame):
+        method = frame.method
+        tag = method.delivery_tag
+        if method.multiple:
+            tags = [t for t in self._unacked if t <= tag]
+        else:
+            tags = [tag] if tag in self._unacked else []
+
+        if isinstance(method, pika.spec.Basic.Ack):
+            for t in tags:
+                outgoing = self._unacked.pop(t)
+                self.acked += 1
+                self._window.release()
+                # Tiempo desde el envío hasta la confirmación del broker
+                STAGE_SECONDS.labels(stage="publish_confirm", type=outgoing.kind).observe(
+                    time.monotonic() - outgoing.sent_at)
+            return
+        # Del más reciente al más antiguo: cada reintento pasa al principio de la cola
+        for t in reversed(tags):
+            self._retry(self._unacked.pop(t), "nack")
+        self._drain_pending()
+
+    def _retry(self, outgoing: _Outgoing, reason: str):
+        if outgoing.attempts > self.max_retries:
+            self.failed += 1
+            self._window.release()
+            logger.warning(f"⚠️ Mensaje sin publicar tras {outgoing.attempts} intentos ({reason}) en cola '{outgoing.queue}'")
+            self._undeliverable(outgoing.entities, reason)
+            return
+        self.retried += 1
+        # Al principio de la cola, para no adelantarle los mensajes que aún no se enviaron
+        self._pending.appendleft(outgoing)
+
+    def _schedule_housekeeping(self):
+        if self._connection is not None and self._connection.is_open:
+            self._connection.ioloop.call_later(1.0, self._housekeeping)
+
+    def _housekeeping(self):
+        # Reintentar lo que no se confirmó a tiempo
+        now = time.monotonic()
+        expired = [t for t, o in self._unacked.items() if now - o.sent_at > self.confirm_timeout]
+        for t in reversed(expired):
+            self._retry(self._unacked.pop(t), "timeout")
+
+        self._drain_pending()
+        self._schedule_housekeeping()
+
+    def _close_connection(self):
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
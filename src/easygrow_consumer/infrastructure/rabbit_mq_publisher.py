@@ -1,10 +1,14 @@
+import logging
 import os
-import json
 import pika
-import copy # <-- AÑADIDO
+import threading
 from dotenv import load_dotenv
 from src.easygrow_consumer.domain.repository import MessageQueuePublisher
-from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
+from src.easygrow_consumer.infrastructure.serializers import serializer_for
+from src.easygrow_consumer.infrastructure.metrics import STAGE_SECONDS, RECONNECTS
+from src.easygrow_consumer.infrastructure.backoff import Backoff, retry
+
+logger = logging.getLogger("easygrow.rabbitmq")
 
 class RabbitMQPublisher(MessageQueuePublisher):
     def __init__(self):
@@ -12,6 +16,15 @@ class RabbitMQPublisher(MessageQueuePublisher):
         
         self.sensor_queue = os.getenv("RABBITMQ_SENSOR_QUEUE", "datos_sensores")
         self.bomba_queue = os.getenv("RABBITMQ_BOMBA_QUEUE", "eventos_bomba")
+        self.summary_queue = os.getenv("RABBITMQ_PUMP_SUMMARY_QUEUE", "resumen_bombas")
+        # Cola de destino por tipo de mensaje (ver serializers.SERIALIZERS)
+        self.queues = {"SENSOR": self.sensor_queue, "BOMBA": self.bomba_queue, "RESUMEN_BOMBA": self.summary_queue}
+        # BlockingConnection no es thread-safe y varios workers publican a la vez
+        self._lock = threading.Lock()
+        # Solo un hilo reconecta, y fuera de `_lock`: el resto falla en el acto (al spool)
+        self._reconnect_lock = threading.Lock()
+        # Propiedades inmutables reutilizadas en cada publicación
+        self._properties = pika.BasicProperties(delivery_mode=2, content_type="application/json")
         
         try:
             username = os.getenv("RABBITMQ_USER")
@@ -40,59 +53,64 @@ class RabbitMQPublisher(MessageQueuePublisher):
             raise e
 
     def publish(self, data) -> None:
-        # Definir la MAC address fija que siempre se va a publicar
-        FIXED_MAC_ADDRESS = "d8:3a:dd:1a:5c:b5"
-
         try:
-            if isinstance(data, SensorData):
-                queue = self.sensor_queue
-                message_type = "SENSOR"
-            elif isinstance(data, BombaEvent):
-                queue = self.bomba_queue
-                message_type = "BOMBA"
-            else:
-                raise ValueError(f"❌ Tipo de dato no soportado: {type(data)}")
-
-            # Crear una copia profunda para no alterar el objeto original
-            data_to_publish = copy.deepcopy(data)
-            # Sobrescribir la dirección MAC en la copia
-            data_to_publish.mac_address = FIXED_MAC_ADDRESS
-            
-            # Serializar el mensaje con fecha en formato ISO completo (incluye microsegundos)
-            def serialize_datetime(obj):
-                # Importar datetime en la función para evitar conflicto de nombres
-                from datetime import datetime as dt
-                if isinstance(obj, dt):
-                    return obj.isoformat()  # Formato: "2025-12-02T10:31:45.126058"
-                return str(obj)
-            
-            message = json.dumps(data_to_publish.__dict__, default=serialize_datetime)
-            
-            # Verificar que la conexión y el canal estén abiertos
-            if not hasattr(self, 'connection') or self.connection.is_closed:
-                print("⚠️ Conexión cerrada, intentando reconectar a RabbitMQ...")
-                self._connect()
-
-            if not hasattr(self, 'channel') or self.channel.is_closed:
+            message_type, encode = serializer_for(data)
+            queue = self.queues[message_type]
+            message = encode(data)
+
+            with STAGE_SECONDS.labels(stage="publish", type=message_type).time():
+                # Verificar que la conexión esté abierta
+                if not self._connection_open():
+                    self._reconnect()
+                self._send(queue, message)
+
+            logger.debug(f"📤 [{message_type}] Mensaje publicado en cola '{queue}': {message.decode()}")
+
+        except Exception as e:
+            # Mostrar error y propagar para registro superior
+            print(f"❌ Error al publicar mensaje: {e}")
+            raise
+
+    def _send(self, queue: str, message: bytes):
+        with self._lock:
+            if self.channel.is_closed:
                 print("⚠️ Canal cerrado, intentando abrir un nuevo canal...")
                 self.channel = self.connection.channel()
                 # Asegurarse de que las colas sigan existiendo
-                self.channel.queue_declare(queue=self.sensor_queue, durable=True)
-                self.channel.queue_declare(queue=self.bomba_queue, durable=True)
+                for name in self.queues.values():
+                    self.channel.queue_declare(queue=name, durable=True)
 
             self.channel.basic_publish(
                 exchange="",
                 routing_key=queue,
                 body=message,
-                properties=pika.BasicProperties(delivery_mode=2)
+                properties=self._properties
             )
 
-            print(f"📤 [{message_type}] Mensaje publicado en cola '{queue}': {message}")
+    def _connection_open(self) -> bool:
+        connection = getattr(self, "connection", None)
+        return connection is not None and connection.is_open
 
-        except Exception as e:
-            # Mostrar error y propagar para registro superior
-            print(f"❌ Error al publicar mensaje: {e}")
-            raise
+    def _reconnect(self):
+        """Reconecta sin retener el lock de publicación; si otro hilo ya está
+        reconectando, lanza ConnectionError en lugar de esperar su backoff."""
+        if not self._reconnect_lock.acquire(blocking=False):
+            raise ConnectionError("❌ Reconexión a RabbitMQ en curso")
+        try:
+            if self._connection_open():
+                # Otro hilo terminó de reconectar justo antes
+                return
+            print("⚠️ Conexión cerrada, intentando reconectar a RabbitMQ...")
+            RECONNECTS.labels(target="rabbitmq").inc()
+            self._connect()
+        finally:
+            self._reconnect_lock.release()
+
+    def ping(self) -> bool:
+        """Comprobación de disponibilidad (/readyz): conexión y canal abiertos."""
+        connection = getattr(self, "connection", None)
+        channel = getattr(self, "channel", None)
+        return bool(connection is not None and connection.is_open and channel is not None and channel.is_open)
 
     def close(self):
         try:
@@ -104,18 +122,20 @@ class RabbitMQPublisher(MessageQueuePublisher):
 
     def _connect(self):
         """Realiza la conexión a RabbitMQ y declara las colas usadas."""
-        # Intentos simples de reconexión
-        attempts = 3
-        last_exc = None
-        for i in range(attempts):
-            try:
-                self.connection = pika.BlockingConnection(self.parameters)
-                self.channel = self.connection.channel()
-                self.channel.queue_declare(queue=self.sensor_queue, durable=True)
-                self.channel.queue_declare(queue=self.bomba_queue, durable=True)
-                return
-            except Exception as e:
-                print(f"⚠️ Intento {i+1}/{attempts} fallo al conectar a RabbitMQ: {e}")
-                last_exc = e
-        # Si no se pudo conectar, lanzar la última excepción
-        raise last_exc
\ No newline at end of file
+        attempts = int(os.getenv("RABBITMQ_CONNECT_ATTEMPTS", "5"))
+
+        def connect():
+            connection = pika.BlockingConnection(self.parameters)
+            channel = connection.channel()
+            for name in self.queues.values():
+                channel.queue_declare(queue=name, durable=True)
+            with self._lock:
+                self.connection, self.channel = connection, channel
+
+        def on_error(e, delay):
+            print(f"⚠️ Intento {self._backoff.attempts}/{attempts} fallo al conectar a RabbitMQ: {e}; "
+                  f"reintento en {delay:.1f}s")
+
+        # Espera exponencial con jitter entre intentos; se propaga el último error
+        self._backoff = Backoff.from_env()
+        retry(connect, self._backoff, on_error=on_error, max_attempts=attempts)
\ No newline at end of file
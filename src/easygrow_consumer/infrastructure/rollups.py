@@ -0,0 +1,110 @@
+from typing import Dict, List, Tuple
+
+# Con DB_ROLLUPS=auto los resúmenes se mantienen si sus tablas existen
+# (database_setup.sql y la migración 001 las crean junto con las vistas que las leen)
+TABLES_EXIST = """
+    SELECT to_regclass('datos_sensores_hora') IS NOT NULL
+       AND to_regclass('datos_sensores_dia') IS NOT NULL
+       AND to_regclass('datos_sensores_ultimo') IS NOT NULL
+"""
+
+# Upserts de los resúmenes. Usan parámetros $n para servir tanto a PREPARE
+# (psycopg2) como a asyncpg.
+UPSERT_HORA = """
+    INSERT INTO datos_sensores_hora (id_sensor, hora, muestras, suma, minimo, maximo)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (id_sensor, hora) DO UPDATE SET
+        muestras = datos_sensores_hora.muestras + EXCLUDED.muestras,
+        suma = datos_sensores_hora.suma + EXCLUDED.suma,
+        minimo = LEAST(datos_sensores_hora.minimo, EXCLUDED.minimo),
+        maximo = GREATEST(datos_sensores_hora.maximo, EXCLUDED.maximo)
+"""
+
+UPSERT_DIA = """
+    INSERT INTO datos_sensores_dia (id_sensor, dia, muestras, suma, minimo, maximo)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (id_sensor, dia) DO UPDATE SET
+        muestras = datos_sensores_dia.muestras + EXCLUDED.muestras,
+        suma = datos_sensores_dia.suma + EXCLUDED.suma,
+        minimo = LEAST(datos_sensores_dia.minimo, EXCLUDED.minimo),
+        maximo = GREATEST(datos_sensores_dia.maximo, EXCLUDED.maximo)
+"""
+
+# Solo reemplaza el último valor si la lectura es más reciente (los lotes del spool llegan tarde)
+UPSERT_ULTIMO = """
+    INSERT INTO datos_sensores_ultimo (id_sensor, mac_address, valor, fecha)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (id_sensor) DO UPDATE SET
+        mac_address = EXCLUDED.mac_address,
+        valor = EXCLUDED.valor,
+        fecha = EXCLUDED.fecha
+    WHERE datos_sensores_ultimo.fecha <= EXCLUDED.fecha
+"""
+
+
+def _merge(groups: Dict[tuple, list], key: tuple, valor: float):
+    agg = groups.get(key)
+    if agg is None:
+        groups[key] = [1, valor, valor, valor]
+        return
+    agg[0] += 1
+    agg[1] += valor
+    if valor < agg[2]:
+        agg[2] = valor
+    elif valor > agg[3]:
+        agg[3] = valor
+
+
+def summarize(rows) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+    """Agrega las filas (id_sensor, mac_address, valor, fecha) de un lote.
+
+    Devuelve las filas de los upserts por hora, por día y de último valor,
+    ordenadas por clave para que dos lotes concurrentes bloqueen las filas
+    en el mismo orden.
+    """
+    hourly: Dict[tuple, list] = {}
+    daily: Dict[tuple, list] = {}
+    latest: Dict[int, tuple] = {}
+    for row in rows:
+        id_sensor, _mac, valor, fecha = row
+        _merge(hourly, (id_sensor, fecha.replace(minute=0, second=0, microsecond=0)), valor)
+        _merge(daily, (id_sensor, fecha.date()), valor)
+        current = latest.get(id_sensor)
+        if current is None or fecha >= current[3]:
+            latest[id_sensor] = row
+
+    return (
+        [(*key, *agg) for key, agg in sorted(hourly.items())],
+        [(*key, *agg) for key, agg in sorted(daily.items())],
+        [latest[k] for k in sorted(latest)],
+    )
+
+
+# Contadores por sensor de las activaciones de bomba: evitan recorrer
+# activaciones_bombas para saber cuántas hubo y cuánto tiempo estuvo encendida
+UPSERT_RESUMEN_BOMBA = """
+    INSERT INTO activaciones_bombas_resumen (id_sensor, activaciones, segundos_encendida, ultima_activacion)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (id_sensor) DO UPDATE SET
+        activaciones = activaciones_bombas_resumen.activaciones + EXCLUDED.activaciones,
+        segundos_encendida = activaciones_bombas_resumen.segundos_encendida + EXCLUDED.segundos_encendida,
+        ultima_activacion = GREATEST(activaciones_bombas_resumen.ultima_activacion, EXCLUDED.ultima_activacion)
+"""
+
+
+def summarize_activations(rows) -> List[tuple]:
+    """Agrega las filas (id_sensor, fecha, duracion_segundos) insertadas en un lote.
+
+    Devuelve (id_sensor, activaciones, segundos, última fecha) ordenado por sensor.
+    """
+    totals: Dict[int, list] = {}
+    for id_sensor, fecha, duracion in rows:
+        agg = totals.get(id_sensor)
+        if agg is None:
+            totals[id_sensor] = [1, duracion or 0, fecha]
+            continue
+        agg[0] += 1
+        agg[1] += duracion or 0
+        if fecha > agg[2]:
+            agg[2] = fecha
+    return [(id_sensor, *totals[id_sensor]) for id_sensor in sorted(totals)]
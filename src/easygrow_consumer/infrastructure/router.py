@@ -0,0 +1,197 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from src.easygrow_consumer.infrastructure.payloads import PayloadSchema, SENSOR_SCHEMA, BOMBA_SCHEMA
+
+# Esquemas disponibles para las rutas, por nombre
+SCHEMAS: Dict[str, PayloadSchema] = {"sensor": SENSOR_SCHEMA, "bomba": BOMBA_SCHEMA}
+
+# Manejador que descarta los mensajes de la ruta sin procesarlos
+IGNORE = "ignore"
+
+# Rutas por defecto: equivalen a las suscripciones fijas anteriores
+DEFAULT_ROUTES = [
+    {"filter": "sensor/#", "handler": "sensor"},
+    {"filter": "bomba/estado", "handler": "bomba"},
+]
+
+# Claves opcionales de una ruta además de filter, handler, schema y qos
+ROUTE_OPTIONS = ("fields", "defaults", "topic_fields")
+
+# Tópicos concretos recordados con su ruta (se vacía al llenarse)
+MATCH_CACHE_SIZE = 4096
+
+
+class Route:
+    """Ruta de un filtro MQTT a un manejador (el servicio que guarda y publica) con su esquema.
+
+    - fields: {campo del esquema: clave del payload} para dispositivos que
+      nombran distinto sus campos.
+    - defaults: valores para los campos que el payload no trae (p. ej. "nombre").
+    - topic_fields: {campo del esquema: nivel del tópico}, para dispositivos
+      que ponen la MAC u otro dato en el tópico ("riego/<mac>/caudal" → 1).
+    """
+
+    __slots__ = ("filter", "handler", "schema", "qos", "fields", "defaults", "topic_fields")
+
+    def __init__(self, filter: str, handler: str, schema: Optional[PayloadSchema] = None, qos: Optional[int] = None,
+                 fields: Optional[Dict[str, str]] = None, defaults: Optional[dict] = None,
+                 topic_fields: Optional[Dict[str, int]] = None):
+        _validate_filter(filter)
+        self.filter = filter
+        self.handler = handler
+        self.schema = schema
+        self.qos = qos
+        self.fields = fields or {}
+        self.defaults = defaults or {}
+        self.topic_fields = topic_fields or {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Route":
+        config = dict(config)
+        try:
+            filter = config.pop("filter")
+            handler = config.pop("handler")
+        except KeyError as e:
+            raise ValueError(f"❌ Ruta MQTT sin {e.args[0]}: {config}") from None
+        schema_name = config.pop("schema", handler)
+        schema = None
+        if handler != IGNORE:
+            if schema_name not in SCHEMAS:
+                raise ValueError(f"❌ Esquema desconocido en la ruta {filter}: {schema_name} "
+                                 f"(opciones: {', '.join(SCHEMAS)})")
+            schema = SCHEMAS[schema_name]
+        qos = config.pop("qos", None)
+        unknown = [key for key in config if key not in ROUTE_OPTIONS]
+        if unknown:
+            raise ValueError(f"❌ Claves desconocidas en la ruta {filter}: {', '.join(unknown)} "
+                             f"(opciones: filter, handler, schema, qos, {', '.join(ROUTE_OPTIONS)})")
+        return cls(filter, handler, schema, None if qos is None else int(qos), **config)
+
+    def build(self, topic: str, payload: dict, fecha: Optional[datetime] = None):
+        """Construye la entidad del esquema aplicando los renombres de la ruta.
+        `fecha` es la hora de recepción, para los payloads sin `ts`."""
+        if self.fields or self.defaults or self.topic_fields:
+            payload = dict(payload)
+            for target, source in self.fields.items():
+                payload[target] = payload.get(source)
+            if self.topic_fields:
+                levels = topic.split("/")
+                for target, level in self.topic_fields.items():
+                    if level < len(levels):
+                        payload[target] = levels[level]
+            for key, value in self.defaults.items():
+                if payload.get(key) is None:
+                    payload[key] = value
+        return self.schema.build(payload, fecha)
+
+    def __repr__(self):
+        return f"Route({self.filter!r} → {self.handler})"
+
+
+def _validate_filter(filter: str):
+    levels = filter.split("/")
+    for i, level in enumerate(levels):
+        if "#" in level and (level != "#" or i != len(levels) - 1):
+            raise ValueError(f"❌ Filtro MQTT inválido: {filter} ('#' solo como último nivel)")
+        if "+" in level and level != "+":
+            raise ValueError(f"❌ Filtro MQTT inválido: {filter} ('+' debe ocupar un nivel entero)")
+
+
+class _Node:
+    __slots__ = ("children", "route", "multi")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # Ruta cuyo filtro termina exactamente en este nivel
+        self.route: Optional[Route] = None
+        # Ruta con '#' en el siguiente nivel (cubre este nivel y todos los de debajo)
+        self.multi: Optional[Route] = None
+
+
+class TopicRouter:
+    """Tabla de rutas compilada en un trie por niveles del tópico.
+
+    La búsqueda recorre un nodo por nivel: primero el nivel literal, luego
+    '+' y por último '#', de modo que gana el filtro más específico
+    ("sensor/debug" antes que "sensor/#") sin importar el orden de la
+    configuración. Los tópicos ya resueltos se recuerdan en un dict.
+    """
+
+    def __init__(self, routes: List[Route], default_qos: int = 1):
+        self.routes = list(routes)
+        self.default_qos = default_qos
+        self._root = _Node()
+        for route in self.routes:
+            self._add(route)
+        self._cache: Dict[str, Optional[Route]] = {}
+
+    @classmethod
+    def from_config(cls, config: list, default_qos: int = 1) -> "TopicRouter":
+        return cls([Route.from_config(item) for item in config], default_qos)
+
+    @classmethod
+    def from_env(cls) -> "TopicRouter":
+        """Rutas de MQTT_ROUTES (JSON o ruta a un JSON); sin definir, las de DEFAULT_ROUTES."""
+        qos = int(os.getenv("MQTT_QOS", "1"))
+        text = os.getenv("MQTT_ROUTES", "").strip()
+        if not text:
+            return cls.from_config(DEFAULT_ROUTES, qos)
+        if not text.startswith("["):
+            with open(text, encoding="utf-8") as f:
+                text = f.read()
+        return cls.from_config(json.loads(text), qos)
+
+    def _add(self, route: Route):
+        node = self._root
+        levels = route.filter.split("/")
+        for level in levels[:-1]:
+            node = node.children.setdefault(level, _Node())
+        last = levels[-1]
+        if last == "#":
+            if node.multi is not None:
+                raise ValueError(f"❌ Filtro MQTT duplicado: {route.filter}")
+            node.multi = route
+            return
+        node = node.children.setdefault(last, _Node())
+        if node.route is not None:
+            raise ValueError(f"❌ Filtro MQTT duplicado: {route.filter}")
+        node.route = route
+
+    def match(self, topic: str) -> Optional[Route]:
+        try:
+            return self._cache[topic]
+        except KeyError:
+            pass
+        route = self._match(self._root, topic.split("/"), 0)
+        if len(self._cache) >= MATCH_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[topic] = route
+        return route
+
+    def _match(self, node: _Node, levels: List[str], i: int) -> Optional[Route]:
+        if i == len(levels):
+            # "a/#" también cubre "a"
+            return node.route or node.multi
+        for key in (levels[i], "+"):
+            child = node.children.get(key)
+            if child is not None:
+                route = self._match(child, levels, i + 1)
+                if route is not None:
+                    return route
+        return node.multi
+
+    def label(self, topic: str) -> str:
+        """Etiqueta de métricas: el filtro de la ruta (cardinalidad acotada por la configuración)."""
+        route = self.match(topic)
+        return route.filter if route is not None else "other"
+
+    def subscriptions(self, share_group: str = "") -> List[Tuple[str, int]]:
+        """(filtro, qos) a suscribir; con `share_group` como suscripción compartida de MQTT v5."""
+        prefix = f"$share/{share_group}/" if share_group else ""
+        return [
+            (prefix + route.filter, self.default_qos if route.qos is None else route.qos)
+            for route in self.routes
+            if route.handler != IGNORE
+        ]
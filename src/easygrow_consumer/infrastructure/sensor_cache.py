@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Marca interna para sensores inexistentes (caché negativa)
+_MISSING = None
+
+
+class SensorIdCache:
+    """Caché LRU con TTL para resolver (descripcion, mac_address) -> id_sensor.
+
+    `load_all` devuelve el catálogo completo y se usa para la precarga y el
+    refresco periódico; `load_many` resuelve solo las claves que faltan.
+    Las claves desconocidas también se guardan (con un TTL más corto) para
+    que un dispositivo mal configurado no consulte la BD en cada mensaje.
+    Sin cargadores (runtime asíncrono) se usan directamente `lookup`,
+    `store` y `replace_all`.
+    """
+
+    def __init__(
+        self,
+        load_all: Optional[Callable[[], Dict[Hashable, int]]] = None,
+        load_many: Optional[Callable[[Iterable[Hashable]], Dict[Hashable, int]]] = None,
+        ttl: float = 300.0,
+        negative_ttl: float = 60.0,
+        max_size: int = 10000,
+        refresh_interval: float = 60.0,
+    ):
+        self._load_all = load_all
+        self._load_many = load_many
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def preload(self) -> int:
+        """Carga el catálogo completo con una sola consulta. Devuelve cuántos sensores se cargaron."""
+        return self.replace_all(self._load_all())
+
+    def replace_all(self, mapping: Dict[Hashable, int]) -> int:
+        """Sustituye las entradas positivas por el catálogo dado."""
+        now = time.monotonic()
+        with self._lock:
+            # Eliminar sensores que ya no existen y reemplazar el resto
+            for key in [k for k, (value, _) in self._entries.items() if value is not _MISSING and k not in mapping]:
+                del self._entries[key]
+            for key, id_sensor in mapping.items():
+                self._store(key, id_sensor, now)
+            self.refreshes += 1
+        return len(mapping)
+
+    def resolve_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, int]:
+        """Resuelve las claves dadas; las desconocidas no aparecen en el resultado."""
+        result, pending = self.lookup(keys)
+        if pending:
+            result.update(self.store(pending, self._load_many(pending)))
+        return result
+
+    def lookup(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, int], List[Hashable]]:
+        """Consulta solo la memoria: devuelve las claves resueltas y las que hay que cargar."""
+        now = time.monotonic()
+        result = {}
+        pending = []
+        with self._lock:
+            for key in set(keys):
+                entry = self._entries.get(key)
+                if entry is None or entry[1] <= now:
+                    self.misses += 1
+                    pending.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                if entry[0] is _MISSING:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                    result[key] = entry[0]
+        return result, pending
+
+    def store(self, keys: Iterable[Hashable], loaded: Dict[Hashable, int]) -> Dict[Hashable, int]:
+        """Guarda el resultado de una carga; las claves ausentes en `loaded` quedan como negativas."""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for key in keys:
+                id_sensor = loaded.get(key, _MISSING)
+                self._store(key, id_sensor, now)
+                if id_sensor is not _MISSING:
+                    result[key] = id_sensor
+        return result
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Descarta una clave concreta o, sin argumentos, toda la caché."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+            }
+
+    def start_refresh(self):
+        """Arranca el hilo que recarga el catálogo cada `refresh_interval` segundos."""
+        if self._refresher is not None or self._load_all is None or self.refresh_interval <= 0:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name="sensor-cache-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=1)
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.preload()
+            except Exception as e:
+                # Se conservan las entradas actuales hasta el próximo intento
+                print(f"⚠️ Error refrescando caché de sensores: {e}")
+
+    def _store(self, key, id_sensor, now):
+        ttl = self.negative_ttl if id_sensor is _MISSING else self.ttl
+        self._entries[key] = (id_sensor, now + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,87 @@
+import json
+from src.easygrow_consumer.domain.entities import SensorData, BombaEvent, BombaResumen
+
+# orjson es opcional: si está instalado se usa como codificador rápido
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+# Definir la MAC address fija que siempre se va a publicar
+FIXED_MAC_ADDRESS = "d8:3a:dd:1a:5c:b5"
+
+_json_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _dumps(fields: dict) -> bytes:
+    if orjson is not None:
+        # orjson serializa datetime en ISO 8601 con microsegundos
+        return orjson.dumps(fields)
+    fields["fecha"] = fields["fecha"].isoformat()  # Formato: "2025-12-02T10:31:45.126058"
+    return _json_encode(fields).encode()
+
+
+def _encode_sensor(data: SensorData) -> bytes:
+    # Se construye el dict campo a campo: sin deepcopy ni __dict__, con la MAC fija
+    return _dumps({
+        "mac_address": FIXED_MAC_ADDRESS,
+        "nombre": data.nombre,
+        "valor": data.valor,
+        "fecha": data.fecha,
+    })
+
+
+def _encode_bomba(event: BombaEvent) -> bytes:
+    return _dumps({
+        "mac_address": FIXED_MAC_ADDRESS,
+        "evento": event.evento,
+        "id_sensor": event.id_sensor,
+        "valor_humedad": event.valor_humedad,
+        "tiempo_encendida_seg": event.tiempo_encendida_seg,
+        "fecha": event.fecha,
+    })
+
+
+def _encode_resumen(summary: BombaResumen) -> bytes:
+    fields = {
+        "mac_address": FIXED_MAC_ADDRESS,
+        "id_sensor": summary.id_sensor,
+        "encendida": summary.encendida,
+        "activaciones": summary.activaciones,
+        "segundos_encendida": round(summary.segundos_encendida, 1),
+        "ciclo_trabajo": round(summary.ciclo_trabajo, 4),
+        "litros_estimados": round(summary.litros_estimados, 2),
+        "atascada": summary.atascada,
+        "ultimo_cambio": summary.ultimo_cambio.isoformat() if summary.ultimo_cambio else None,
+        "fecha": summary.fecha,
+    }
+    return _dumps(fields)
+
+
+# Serializador precompilado por tipo de entidad: (tipo de mensaje, codificador)
+SERIALIZERS = {
+    SensorData: ("SENSOR", _encode_sensor),
+    BombaEvent: ("BOMBA", _encode_bomba),
+    BombaResumen: ("RESUMEN_BOMBA", _encode_resumen),
+}
+
+
+def serializer_for(data):
+    """Devuelve (tipo de mensaje, codificador) para la entidad dada."""
+    entry = SERIALIZERS.get(type(data))
+    if entry is None:
+        for cls, candidate in SERIALIZERS.items():
+            if isinstance(data, cls):
+                return candidate
+        raise ValueError(f"❌ Tipo de dato no soportado: {type(data)}")
+    return entry
+
+
+def message_type_for(data) -> str:
+    """Devuelve el tipo de mensaje ("SENSOR", "BOMBA" o "RESUMEN_BOMBA") de una entidad publicable."""
+    return serializer_for(data)[0]
+
+
+def serialize(data) -> bytes:
+    """Serializa una entidad a JSON (bytes) con la MAC fija, sin modificar el objeto original."""
+    return serializer_for(data)[1](data)
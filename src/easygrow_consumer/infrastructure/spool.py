@@ -0,0 +1,382 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import fields
+from datetime import datetime
+from typing import Callable, Iterable, List, Tuple
+import psycopg2
+from src.easygrow_consumer.domain.entities import SensorData, BombaEvent
+from src.easygrow_consumer.domain.repository import SensorDataRepository, BombaRepository, MessageQueuePublisher
+from src.easygrow_consumer.infrastructure.payloads import SENSOR_SCHEMA, BOMBA_SCHEMA
+from src.easygrow_consumer.infrastructure.metrics import REGISTRY, MESSAGES_DROPPED
+
+# Destinos que pueden fallar y cuyos mensajes se guardan en el spool
+SINK_DB = "db"
+SINK_MQ = "mq"
+
+# Errores que no se arreglan reintentando: el registro va a la tabla de descartes
+# (spool_dead_letter) en lugar de bloquear el destino. El resto (conexión caída,
+# SinkNotReady, timeouts...) deja el registro en el spool para la próxima ventana.
+POISON_ERRORS = {
+    SINK_DB: (psycopg2.DataError, psycopg2.IntegrityError),
+    # Fallos al serializar el mensaje
+    SINK_MQ: (TypeError, ValueError, KeyError),
+}
+
+_KINDS = {SensorData: "SENSOR", BombaEvent: "BOMBA"}
+_SCHEMAS = {"SENSOR": SENSOR_SCHEMA, "BOMBA": BOMBA_SCHEMA}
+
+SPOOL_PENDING = REGISTRY.gauge("easygrow_spool_pending", "Registros pendientes de reenvío por destino", ("sink",))
+SPOOL_REPLAYED = REGISTRY.counter("easygrow_spool_replayed_total", "Registros reenviados desde el spool", ("sink",))
+
+logger = logging.getLogger("easygrow.spool")
+
+
+def _encode(entity) -> Tuple[str, bytes]:
+    # Se guarda la entidad completa (con su MAC real), no el mensaje publicado
+    record = {f.name: getattr(entity, f.name) for f in fields(entity)}
+    record["fecha"] = entity.fecha.isoformat()
+    return _KINDS[type(entity)], json.dumps(record, separators=(",", ":")).encode()
+
+
+def _decode(kind: str, body: bytes):
+    record = json.loads(body)
+    return _SCHEMAS[kind].build(record, datetime.fromisoformat(record["fecha"]))
+
+
+class SqliteSpool:
+    """Registro local durable (SQLite en modo WAL) de mensajes pendientes por destino.
+
+    Los registros se leen en orden de inserción, de modo que el orden por
+    dispositivo se conserva al reenviarlos. Si se supera `max_records` se
+    descartan los más antiguos para acotar el uso de disco.
+    """
+
+    def __init__(self, path: str, max_records: int = 500000):
+        self.path = path
+        self.max_records = max_records
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sink TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                mac_address TEXT NOT NULL,
+                body BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spool_sink ON spool(sink, id)")
+        # Registros que el destino rechaza por su contenido; se conservan para revisarlos a mano
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool_dead_letter (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sink TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                mac_address TEXT NOT NULL,
+                body BLOB NOT NULL,
+                error TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+        self._pending = {
+            sink: count for sink, count in self._conn.execute("SELECT sink, COUNT(*) FROM spool GROUP BY sink")
+        }
+        self.dropped = 0
+        for sink in (SINK_DB, SINK_MQ):
+            SPOOL_PENDING.labels(sink=sink).set_function(lambda sink=sink: self.pending(sink))
+
+    def pending(self, sink: str) -> int:
+        return self._pending.get(sink, 0)
+
+    def append_many(self, sink: str, entities: Iterable):
+        rows = []
+        for entity in entities:
+            kind, body = _encode(entity)
+            rows.append((sink, kind, entity.mac_address, body))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO spool (sink, kind, mac_address, body) VALUES (?, ?, ?, ?)", rows)
+            self._pending[sink] = self._pending.get(sink, 0) + len(rows)
+            self._enforce_limit()
+            self._conn.execute("COMMIT")
+
+    def append(self, sink: str, entity):
+        self.append_many(sink, (entity,))
+
+    def take(self, sink: str, limit: int) -> List[Tuple[int, object]]:
+        """Lee (sin borrar) los `limit` registros más antiguos del destino.
+
+        Los que no se pueden decodificar (cuerpo dañado o de otra versión del
+        esquema) se mueven a spool_dead_letter para que no frenen el reenvío.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, body FROM spool WHERE sink = ? ORDER BY id LIMIT ?", (sink, limit)
+            ).fetchall()
+        entities = []
+        for row_id, kind, body in rows:
+            try:
+                entities.append((row_id, _decode(kind, body)))
+            except Exception as e:
+                self.dead_letter(sink, [row_id], repr(e))
+                MESSAGES_DROPPED.labels(reason="spool_corrupt").inc()
+                logger.error(f"❌ Registro {row_id} del spool ilegible, movido a spool_dead_letter: {e}")
+        return entities
+
+    def ack(self, sink: str, ids: List[int]):
+        """Elimina los registros ya entregados."""
+        if not ids:
+            return
+        with self._lock:
+            cur = self._conn.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+            self._pending[sink] = max(0, self._pending.get(sink, 0) - cur.rowcount)
+
+    def dead_letter(self, sink: str, ids: List[int], error: str):
+        """Mueve registros del spool a spool_dead_letter."""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for row_id in ids:
+                self._conn.execute(
+                    "INSERT INTO spool_dead_letter (sink, kind, mac_address, body, error, created_at) "
+                    "SELECT sink, kind, mac_address, body, ?, ? FROM spool WHERE id = ?",
+                    (error, time.time(), row_id),
+                )
+            cur = self._conn.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+            self._pending[sink] = max(0, self._pending.get(sink, 0) - cur.rowcount)
+            self._conn.execute("COMMIT")
+
+    def dead_letter_entity(self, sink: str, entity, error: str):
+        """Guarda en spool_dead_letter una entidad que no llegó a pasar por el spool."""
+        kind, body = _encode(entity)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO spool_dead_letter (sink, kind, mac_address, body, error, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sink, kind, entity.mac_address, body, error, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _enforce_limit(self):
+        total = sum(self._pending.values())
+        excess = total - self.max_records
+        if excess <= 0:
+            return
+        dropped = self._conn.execute(
+            "SELECT sink, COUNT(*) FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?) GROUP BY sink",
+            (excess,),
+        ).fetchall()
+        self._conn.execute("DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)", (excess,))
+        for sink, count in dropped:
+            self._pending[sink] -= count
+        self.dropped += excess
+        MESSAGES_DROPPED.labels(reason="spool_full").inc(excess)
+        logger.warning(f"⚠️ Spool lleno: descartados {excess} registros antiguos")
+
+
+class _SpoolingRepository(SensorDataRepository, BombaRepository):
+    """Envoltorio del repositorio: si la BD falla el dato va al spool."""
+
+    def __init__(self, owner: "StoreAndForward"):
+        self._owner = owner
+
+    def save_sensor_data(self, data: SensorData):
+        self._owner.deliver(SINK_DB, data, self._owner.repository.save_sensor_data)
+
+    def save_bomba_activation(self, event: BombaEvent):
+        self._owner.deliver(SINK_DB, event, self._owner.repository.save_bomba_activation)
+
+    def save_bomba_event(self, event: BombaEvent):
+        self._owner.deliver(SINK_DB, event, self._owner.repository.save_bomba_event)
+
+    def __getattr__(self, name):
+        # flush(), close(), sensor_cache... se delegan al repositorio real
+        return getattr(self._owner.repository, name)
+
+
+class _SpoolingPublisher(MessageQueuePublisher):
+    """Envoltorio del publicador: si RabbitMQ falla el mensaje va al spool."""
+
+    def __init__(self, owner: "StoreAndForward"):
+        self._owner = owner
+
+    def publish(self, data) -> None:
+        self._owner.deliver(SINK_MQ, data, self._owner.publisher.publish)
+
+    def __getattr__(self, name):
+        return getattr(self._owner.publisher, name)
+
+
+class StoreAndForward:
+    """Almacena en el spool lo que no se pudo entregar y lo reenvía en lotes al recuperarse el destino.
+
+    Mientras un destino tenga registros pendientes, los mensajes nuevos
+    también pasan por el spool para que no adelanten a los antiguos.
+    """
+
+    def __init__(self, spool: SqliteSpool, repository, publisher,
+                 replay_batch: int = 500, replay_interval: float = 5.0):
+        self.spool = spool
+        self.repository = repository
+        self.publisher = publisher
+        self.replay_batch = replay_batch
+        self.replay_interval = replay_interval
+
+        self.spooling_repository = _SpoolingRepository(self)
+        self.spooling_publisher = _SpoolingPublisher(self)
+
+        # Los lotes que el repositorio no logra escribir al vaciar su buffer van al spool
+        if hasattr(repository, "on_flush_error"):
+            repository.on_flush_error = lambda batch: spool.append_many(SINK_DB, batch)
+        # Igual con lo que el publicador con confirmaciones no logra entregar
+        if hasattr(publisher, "on_undeliverable"):
+            publisher.on_undeliverable = lambda entities: spool.append_many(SINK_MQ, entities)
+
+        self._stop_event = threading.Event()
+        self._replayer = None
+
+    @classmethod
+    def from_env(cls, repository, publisher) -> "StoreAndForward":
+        spool = SqliteSpool(
+            os.getenv("SPOOL_PATH", "spool/easygrow_spool.sqlite3"),
+            max_records=int(os.getenv("SPOOL_MAX_RECORDS", "500000")),
+        )
+        return cls(
+            spool, repository, publisher,
+            replay_batch=int(os.getenv("SPOOL_REPLAY_BATCH", "500")),
+            replay_interval=float(os.getenv("SPOOL_REPLAY_INTERVAL", "5")),
+        )
+
+    def deliver(self, sink: str, entity, send):
+        if self.spool.pending(sink):
+            self.spool.append(sink, entity)
+            return
+        try:
+            send(entity)
+        except POISON_ERRORS[sink] as e:
+            # Reintentarlo solo bloquearía el destino
+            self._bury_entity(sink, entity, e)
+        except Exception as e:
+            logger.warning(f"⚠️ Destino '{sink}' no disponible, mensaje guardado en el spool: {e}")
+            self.spool.append(sink, entity)
+
+    def start(self):
+        pending = {sink: self.spool.pending(sink) for sink in (SINK_DB, SINK_MQ)}
+        logger.info(f"📼 Spool en {self.spool.path} · pendientes: {pending}")
+        self._replayer = threading.Thread(target=self._replay_loop, name="spool-replayer", daemon=True)
+        self._replayer.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._replayer is not None:
+            self._replayer.join(timeout=self.replay_interval + 5)
+
+    def close(self):
+        self.spool.close()
+
+    def replay(self) -> int:
+        """Reenvía todo lo pendiente que los destinos acepten. Devuelve cuántos registros se entregaron."""
+        delivered = 0
+        for sink in (SINK_DB, SINK_MQ):
+            while self.spool.pending(sink) and not self._stop_event.is_set():
+                batch = self.spool.take(sink, self.replay_batch)
+                if not batch:
+                    break
+                ok, stalled = self._replay_db(batch) if sink == SINK_DB else self._replay_mq(batch)
+                self.spool.ack(sink, ok)
+                SPOOL_REPLAYED.labels(sink=sink).inc(len(ok))
+                delivered += len(ok)
+                if stalled:
+                    # El destino sigue caído: se reintenta en la próxima ventana
+                    break
+        return delivered
+
+    def _replay_db(self, batch) -> Tuple[List[int], bool]:
+        """Devuelve (ids entregados, destino caído)."""
+        readings = [(row_id, e) for row_id, e in batch if isinstance(e, SensorData)]
+        events = [(row_id, e) for row_id, e in batch if isinstance(e, BombaEvent)]
+        delivered = []
+        # Escritura masiva directa, sin pasar por el buffer ni por on_flush_error; ambas
+        # son idempotentes, así que repetir parte de un lote al aislar un error no duplica
+        for rows, write in ((readings, self.repository.write_sensor_batch),
+                            (events, self.repository.write_bomba_batch)):
+            if not rows:
+                continue
+            ok, stalled = self._write_isolating(rows, write)
+            delivered.extend(ok)
+            if stalled:
+                return delivered, True
+        return delivered, False
+
+    def _write_isolating(self, rows, write: Callable[[list], int]) -> Tuple[List[int], bool]:
+        """Escribe `rows`; si el lote tiene datos inválidos lo parte en mitades hasta aislarlos."""
+        try:
+            write([e for _, e in rows])
+            return [row_id for row_id, _ in rows], False
+        except POISON_ERRORS[SINK_DB] as e:
+            if len(rows) == 1:
+                self._bury(SINK_DB, rows, e)
+                return [], False
+            middle = len(rows) // 2
+            left, stalled = self._write_isolating(rows[:middle], write)
+            if stalled:
+                return left, True
+            right, stalled = self._write_isolating(rows[middle:], write)
+            return left + right, stalled
+        except Exception as e:
+            logger.warning(f"⚠️ Reenvío a PostgreSQL fallido: {e}")
+            return [], True
+
+    def _replay_mq(self, batch) -> Tuple[List[int], bool]:
+        delivered = []
+        for row_id, entity in batch:
+            try:
+                self.publisher.publish(entity)
+            except POISON_ERRORS[SINK_MQ] as e:
+                self._bury(SINK_MQ, [(row_id, entity)], e)
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ Reenvío a RabbitMQ fallido: {e}")
+                return delivered, True
+            delivered.append(row_id)
+        return delivered, False
+
+    def _bury(self, sink: str, rows, error: Exception):
+        self.spool.dead_letter(sink, [row_id for row_id, _ in rows], repr(error))
+        MESSAGES_DROPPED.labels(reason="spool_poison").inc(len(rows))
+        logger.error(f"❌ Registro rechazado por '{sink}', movido a spool_dead_letter: {rows[0][1]} ({error})")
+
+    def _bury_entity(self, sink: str, entity, error: Exception):
+        self.spool.dead_letter_entity(sink, entity, repr(error))
+        MESSAGES_DROPPED.labels(reason="spool_poison").inc()
+        logger.error(f"❌ Registro rechazado por '{sink}', movido a spool_dead_letter: {entity} ({error})")
+
+    def _replay_loop(self):
+        while not self._stop_event.wait(self.replay_interval):
+            try:
+                delivered = self.replay()
+                if delivered:
+                    logger.info(f"📼 Reenviados {delivered} registros desde el spool")
+            except Exception:
+                logger.exception("❌ Error reenviando registros del spool")
@@ -0,0 +1,284 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, Optional
+from src.easygrow_consumer.infrastructure.metrics import (
+    REGISTRY, MESSAGES_RECEIVED, MESSAGES_PROCESSED, MESSAGES_DROPPED,
+)
+
+logger = logging.getLogger("easygrow.supervisor")
+
+WORKER_UP = REGISTRY.gauge("easygrow_worker_up", "1 si el proceso worker está vivo", ("worker",))
+WORKER_RESTARTS = REGISTRY.counter("easygrow_worker_restarts_total", "Reinicios de procesos worker", ("worker",))
+WORKER_STATS = REGISTRY.gauge("easygrow_worker_stat", "Último estado informado por cada worker", ("worker", "stat"))
+
+# Un worker que aguanta este tiempo vivo vuelve a reiniciarse sin espera
+STABLE_AFTER = 60.0
+
+# Cada cuánto comprueba un worker si se le ha pedido parar
+STOP_POLL_INTERVAL = 0.2
+
+
+def worker_path(path: str, index: int) -> str:
+    """Ruta propia de un worker para archivos locales (spool, desborde): a.sqlite3 -> a.w<index>.sqlite3."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.w{index}{ext}"
+
+
+class StopRequested(BaseException):
+    """SIGTERM recibido mientras el worker arrancaba.
+
+    Hereda de BaseException para atravesar los `except Exception` de los bucles
+    de conexión y reintento, como KeyboardInterrupt."""
+
+
+class StopFlag:
+    """Orden de parada de un worker. La activa SIGTERM; solo escribe un atributo,
+    así que es seguro hacerlo desde un manejador de señales.
+
+    Hasta llamar a `started()` el arranque ocurre en el hilo principal (conexión
+    a PostgreSQL/RabbitMQ con reintentos) y nadie consulta la bandera: la señal
+    lanza StopRequested ahí mismo, interrumpiendo la espera o conexión en curso.
+    """
+
+    __slots__ = ("requested", "starting")
+
+    def __init__(self):
+        self.requested = False
+        self.starting = True
+
+    def install(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        return self
+
+    def started(self):
+        """A partir de aquí la bandera la atiende HealthReporter."""
+        self.starting = False
+
+    def _on_signal(self, signum, frame):
+        self.requested = True
+        if self.starting:
+            self.starting = False
+            raise StopRequested()
+
+
+class HealthReporter:
+    """Hilo de cada worker: envía su estado al supervisor y atiende la orden de parada.
+
+    `collect()` devuelve un dict con valores numéricos; a él se añaden los
+    contadores de mensajes del registro de métricas del proceso.
+    """
+
+    def __init__(self, index: int, stop_flag: StopFlag, health_conn, on_stop: Callable[[], None],
+                 collect: Optional[Callable[[], dict]] = None, interval: float = 10.0):
+        self.index = index
+        self.stop_flag = stop_flag
+        self.health_conn = health_conn
+        self.on_stop = on_stop
+        self.collect = collect
+        self.interval = interval
+        self._thread = threading.Thread(target=self._loop, name="health-reporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def snapshot(self) -> dict:
+        stats = {
+            "received": MESSAGES_RECEIVED.total(),
+            "processed": MESSAGES_PROCESSED.total(result="ok"),
+            "errors": MESSAGES_PROCESSED.total(result="error"),
+            "dropped": MESSAGES_DROPPED.total(),
+        }
+        if self.collect is not None:
+            stats.update(self.collect())
+        return stats
+
+    def _loop(self):
+        next_report = time.monotonic() + self.interval
+        while not self.stop_flag.requested:
+            time.sleep(STOP_POLL_INTERVAL)
+            if time.monotonic() < next_report:
+                continue
+            next_report += self.interval
+            try:
+                self.health_conn.send((self.index, os.getpid(), time.time(), self.snapshot()))
+            except (BrokenPipeError, EOFError, OSError):
+                # El supervisor ya no está: se detiene el worker
+                break
+            except Exception:
+                logger.exception("❌ Error enviando el estado al supervisor")
+        self.on_stop()
+
+
+class _Worker:
+    __slots__ = ("index", "process", "conn", "started_at", "restarts", "next_start")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+
+
+class WorkerSupervisor:
+    """Lanza N procesos worker, los reinicia si mueren y coordina el apagado.
+
+    `target(index, health_conn)` se ejecuta en cada proceso (contexto "spawn":
+    intérpretes limpios, sin hilos ni conexiones heredadas). Cada worker tiene
+    su propia tubería de estado y se detiene con SIGTERM; no se comparten
+    locks entre procesos, de modo que un worker que muere a mitad de una
+    operación no puede bloquear a los demás. El reparto de mensajes lo hace
+    el broker mediante suscripciones compartidas, por lo que un worker que
+    entra o sale se reequilibra solo.
+    """
+
+    def __init__(self, target: Callable, processes: int, health_interval: float = 10.0,
+                 shutdown_timeout: float = 30.0, max_restart_delay: float = 60.0):
+        self.target = target
+        self.processes = processes
+        self.health_interval = health_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.max_restart_delay = max_restart_delay
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(i) for i in range(processes)]
+        self.health: Dict[int, dict] = {}
+        self._last_summary = 0.0
+        # Lo activa el manejador de señales
+        self._stopping = False
+
+    @classmethod
+    def from_env(cls, target: Callable, processes: int) -> "WorkerSupervisor":
+        return cls(
+            target, processes,
+            health_interval=float(os.getenv("WORKER_HEALTH_INTERVAL", "10")),
+            shutdown_timeout=float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30")),
+        )
+
+    def run(self):
+        """Bloquea hasta recibir SIGINT/SIGTERM y entonces detiene a todos los workers."""
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+
+        logger.info(f"👷 Supervisor iniciado con {self.processes} procesos worker")
+        for worker in self._workers:
+            self._spawn(worker)
+        try:
+            while not self._stopping:
+                self._drain_health(timeout=1.0)
+                self._check_workers()
+                self._log_summary()
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._stopping = True
+
+    def _on_signal(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self, worker: _Worker):
+        reader, writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=self.target,
+            args=(worker.index, writer),
+            name=f"easygrow-worker-{worker.index}",
+        )
+        process.start()
+        # El extremo de escritura solo debe quedar abierto en el hijo
+        writer.close()
+        worker.process = process
+        worker.conn = reader
+        worker.started_at = time.monotonic()
+        WORKER_UP.labels(worker=worker.index).set(1)
+        logger.info(f"👷 Worker {worker.index} iniciado (pid {process.pid})")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker in self._workers:
+            process = worker.process
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                # Acaba de morir: se programa el reinicio con espera exponencial
+                WORKER_UP.labels(worker=worker.index).set(0)
+                self.health.pop(worker.index, None)
+                if worker.conn is not None:
+                    worker.conn.close()
+                    worker.conn = None
+                if now - worker.started_at > STABLE_AFTER:
+                    worker.restarts = 0
+                delay = min(2 ** worker.restarts, self.max_restart_delay) if worker.restarts else 0
+                worker.restarts += 1
+                worker.next_start = now + delay
+                worker.process = None
+                logger.warning(
+                    f"⚠️ Worker {worker.index} terminó (código {process.exitcode}); reinicio en {delay}s"
+                )
+            if now >= worker.next_start and not self._stopping:
+                WORKER_RESTARTS.labels(worker=worker.index).inc()
+                self._spawn(worker)
+
+    def _drain_health(self, timeout: float):
+        conns = {w.conn: w for w in self._workers if w.conn is not None}
+        if not conns:
+            time.sleep(timeout)
+            return
+        for conn in multiprocessing.connection.wait(list(conns), timeout=timeout):
+            try:
+                while conn.poll():
+                    index, pid, reported_at, stats = conn.recv()
+                    self.health[index] = dict(stats, pid=pid, reported_at=reported_at)
+                    for stat, value in stats.items():
+                        if isinstance(value, (int, float)):
+                            WORKER_STATS.labels(worker=index, stat=stat).set(value)
+            except (EOFError, OSError):
+                # El worker cerró su extremo (está saliendo); _check_workers atenderá el proceso
+                conns[conn].conn = None
+                conn.close()
+
+    def _log_summary(self):
+        now = time.monotonic()
+        if now - self._last_summary < self.health_interval:
+            return
+        self._last_summary = now
+        alive = sum(1 for w in self._workers if w.process is not None and w.process.is_alive())
+        totals = {}
+        for stats in self.health.values():
+            for stat in ("received", "processed", "errors", "dropped"):
+                totals[stat] = totals.get(stat, 0) + stats.get(stat, 0)
+        connected = sum(1 for stats in self.health.values() if stats.get("connected"))
+        logger.info(
+            f"📊 Workers vivos {alive}/{self.processes} · conectados a MQTT {connected} · "
+            + " · ".join(f"{k} {int(v)}" for k, v in totals.items())
+        )
+
+    def _shutdown(self):
+        logger.info("🛑 Deteniendo workers...")
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        while time.monotonic() < deadline and any(
+            w.process is not None and w.process.is_alive() for w in self._workers
+        ):
+            # Seguir leyendo las tuberías para que ningún worker se bloquee al enviar
+            self._drain_health(timeout=0.2)
+        for worker in self._workers:
+            process = worker.process
+            if process is not None and process.is_alive():
+                logger.warning(f"⚠️ Worker {worker.index} no terminó a tiempo; forzando la salida")
+                process.kill()
+                process.join(timeout=5)
+            if worker.conn is not None:
+                worker.conn.close()
+            WORKER_UP.labels(worker=worker.index).set(0)
+        logger.info("👋 Todos los workers detenidos")
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from src.easygrow_consumer.infrastructure import backoff
+from src.easygrow_consumer.infrastructure.backoff import Backoff, retry
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    # Siempre el techo del intervalo: los retardos son deterministas
+    monkeypatch.setattr(backoff.random, "uniform", lambda low, high: high)
+
+
+def test_delay_grows_exponentially_up_to_maximum(no_jitter):
+    b = Backoff(initial=0.5, maximum=3.0)
+    assert [b.next_delay() for _ in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    b.reset()
+    assert b.next_delay() == 0.5
+
+
+def test_jitter_stays_within_ceiling():
+    b = Backoff(initial=1.0, maximum=4.0)
+    for attempt in range(8):
+        ceiling = min(4.0, 2.0 ** attempt)
+        assert 0 <= b.next_delay() <= ceiling
+
+
+def test_retry_returns_after_transient_failures():
+    results = iter([ConnectionError("caído"), ConnectionError("caído"), "ok"])
+    errors = []
+
+    def fn():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    b = Backoff(initial=0.0)
+    assert retry(fn, b, on_error=lambda e, delay: errors.append(str(e))) == "ok"
+    assert errors == ["caído", "caído"]
+    assert b.attempts == 0
+
+
+def test_retry_propagates_last_error_after_max_attempts():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ConnectionError(f"intento {len(calls)}")
+
+    with pytest.raises(ConnectionError, match="intento 3"):
+        retry(fn, Backoff(initial=0.0), max_attempts=3)
+    assert len(calls) == 3
+
+
+def test_retry_stops_when_stop_event_is_set():
+    stop_event = threading.Event()
+
+    def fn():
+        stop_event.set()
+        raise ConnectionError("caído")
+
+    assert retry(fn, Backoff(initial=10.0), stop_event=stop_event) is None
@@ -0,0 +1,55 @@
+import pytest
+
+from src.easygrow_consumer.infrastructure.capture import MAGIC, CaptureWriter, read_capture
+
+
+def test_records_round_trip_across_blocks(tmp_path):
+    path = str(tmp_path / "trafico.egcap")
+    writer = CaptureWriter(path, block_records=2, flush_interval=60)
+    records = [(1700000000.0 + i, f"sensor/{i}", b'{"valor": %d}' % i) for i in range(5)]
+    for ts, topic, payload in records:
+        writer.record(topic, payload, ts)
+    writer.close()
+    assert list(read_capture(path)) == records
+
+
+def test_open_block_is_written_after_flush_interval(tmp_path):
+    path = str(tmp_path / "trafico.egcap")
+    writer = CaptureWriter(path, block_records=100, flush_interval=0)
+    writer.record("sensor/a", b"{}", 1.0)
+    # Sin cerrar: el bloque ya está en disco
+    assert list(read_capture(path)) == [(1.0, "sensor/a", b"{}")]
+    writer.close()
+
+
+def test_incomplete_trailing_block_is_ignored_and_truncated(tmp_path):
+    path = str(tmp_path / "trafico.egcap")
+    writer = CaptureWriter(path, block_records=1)
+    writer.record("sensor/a", b"1", 1.0)
+    writer.close()
+    with open(path, "ab") as f:
+        # Cabecera de un bloque de 100 bytes cortado por un apagón
+        f.write(b"\x00\x00\x00\x64\x00\x00\x00\x01abc")
+
+    assert list(read_capture(path)) == [(1.0, "sensor/a", b"1")]
+
+    writer = CaptureWriter(path, block_records=1)
+    writer.record("sensor/b", b"2", 2.0)
+    writer.close()
+    assert list(read_capture(path)) == [(1.0, "sensor/a", b"1"), (2.0, "sensor/b", b"2")]
+
+
+def test_rejects_files_that_are_not_captures(tmp_path):
+    path = tmp_path / "otro.bin"
+    path.write_bytes(b"no es una captura")
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+    with pytest.raises(ValueError):
+        CaptureWriter(str(path))
+
+
+def test_empty_capture_has_only_the_header(tmp_path):
+    path = tmp_path / "vacia.egcap"
+    CaptureWriter(str(path)).close()
+    assert path.read_bytes() == MAGIC
+    assert list(read_capture(str(path))) == []
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.easygrow_consumer.infrastructure import dedup
+from src.easygrow_consumer.infrastructure.dedup import DedupWindow, message_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(dedup, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def reading(**extra):
+    return {"mac_address": "AA:BB", "nombre": "temperatura", "valor": 21.5, **extra}
+
+
+def test_identified_messages_are_deduplicated_by_id(clock):
+    window = DedupWindow(window_seconds=60)
+    assert not window.is_duplicate("sensor/t", reading(msg_id=1))
+    assert window.is_duplicate("sensor/t", reading(msg_id=1, valor=99))
+    assert not window.is_duplicate("sensor/t", reading(msg_id=2))
+    assert window.duplicates == 1
+
+
+def test_unidentified_messages_only_dropped_when_redelivered(clock):
+    window = DedupWindow(window_seconds=60)
+    assert not window.is_duplicate("sensor/t", reading())
+    # Un sensor puede repetir el mismo valor legítimamente
+    assert not window.is_duplicate("sensor/t", reading())
+    assert window.is_duplicate("sensor/t", reading(), redelivered=True)
+
+
+def test_keys_expire_with_the_window(clock):
+    window = DedupWindow(window_seconds=60, buckets=6)
+    window.is_duplicate("sensor/t", reading(seq=7))
+    clock.now += 30
+    assert window.is_duplicate("sensor/t", reading(seq=7))
+    clock.now += 61
+    assert not window.is_duplicate("sensor/t", reading(seq=7))
+
+
+def test_max_keys_discards_oldest_bucket(clock):
+    window = DedupWindow(window_seconds=60, buckets=6, max_keys=2)
+    window.is_duplicate("sensor/t", reading(seq=1))
+    clock.now += 10
+    window.is_duplicate("sensor/t", reading(seq=2))
+    clock.now += 10
+    window.is_duplicate("sensor/t", reading(seq=3))
+    assert len(window) <= 2
+    assert not window.is_duplicate("sensor/t", reading(seq=1))
+
+
+def test_message_key_handles_unhashable_values():
+    key, identified = message_key("sensor/t", reading(extra=[1, 2]))
+    assert not identified
+    hash(key)
+    key, identified = message_key("sensor/t", reading(ts=1700000000))
+    assert identified
+    assert key == ("sensor/t", "AA:BB", "temperatura", "ts", 1700000000)
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.easygrow_consumer.domain.entities import BombaEvent, SensorData
+from src.easygrow_consumer.infrastructure.payloads import BOMBA_SCHEMA, SENSOR_SCHEMA, decode
+
+RECIBIDO = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def test_decode_accepts_bytes_and_requires_an_object():
+    assert decode(b'{"valor": 1}') == {"valor": 1}
+    with pytest.raises(ValueError):
+        decode(b"[1, 2]")
+
+
+def test_sensor_payload_builds_entity_with_arrival_time():
+    data = SENSOR_SCHEMA.build({"mac_address": "AA:BB", "nombre": "temperatura", "valor": "21.5"}, RECIBIDO)
+    assert data == SensorData("AA:BB", "temperatura", 21.5, RECIBIDO)
+
+
+def test_device_timestamp_wins_over_arrival_time():
+    epoch = SENSOR_SCHEMA.build({"mac_address": "m", "nombre": "n", "valor": 1, "ts": 1700000000}, RECIBIDO)
+    assert epoch.fecha == datetime.fromtimestamp(1700000000)
+    iso = SENSOR_SCHEMA.build({"mac_address": "m", "nombre": "n", "valor": 1, "ts": "2024-05-01T10:00:00+00:00"})
+    assert iso.fecha == datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def test_missing_arrival_time_defaults_to_now():
+    before = datetime.now()
+    data = SENSOR_SCHEMA.build({"mac_address": "m", "nombre": "n", "valor": 1})
+    assert before <= data.fecha <= datetime.now()
+
+
+@pytest.mark.parametrize("payload", [
+    {"nombre": "n", "valor": 1},
+    {"mac_address": "m", "nombre": "n", "valor": None},
+    {"mac_address": "m", "nombre": "n", "valor": "alto"},
+    {"mac_address": "m", "nombre": "n", "valor": True},
+    {"mac_address": "m", "nombre": "n", "valor": 1, "ts": "ayer"},
+])
+def test_invalid_sensor_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        SENSOR_SCHEMA.build(payload, RECIBIDO)
+
+
+def test_bomba_payload_with_optional_field():
+    payload = {"mac_address": "m", "evento": "encendida", "id_sensor": "7", "valor_humedad": 30}
+    assert BOMBA_SCHEMA.build(payload, RECIBIDO) == BombaEvent("m", "encendida", 7, 30, None, RECIBIDO)
+    payload["tiempo_encendida_seg"] = 45
+    assert BOMBA_SCHEMA.build(payload, RECIBIDO).tiempo_encendida_seg == 45
+    with pytest.raises(ValueError):
+        BOMBA_SCHEMA.build({**payload, "id_sensor": "siete"}, RECIBIDO)
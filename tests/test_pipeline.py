@@ -0,0 +1,91 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from src.easygrow_consumer.infrastructure.metrics import MESSAGES_DROPPED
+from src.easygrow_consumer.infrastructure.pipeline import (
+    OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL, MessagePipeline,
+)
+
+FECHA = datetime(2024, 5, 1, 12, 0, 0)
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, topic, message, fecha):
+        with self.lock:
+            self.calls.append((topic, message["n"], fecha))
+
+    def numbers(self):
+        return [n for _, n, _ in self.calls]
+
+
+def enqueue(pipeline, n, mac="AA:BB"):
+    pipeline.enqueue("sensor/t", {"mac_address": mac, "n": n}, 0.0, FECHA)
+
+
+def test_messages_of_a_device_are_processed_in_order():
+    handler = Recorder()
+    pipeline = MessagePipeline(handler, workers=3, queue_size=10)
+    pipeline.start()
+    for n in range(50):
+        enqueue(pipeline, n, mac=f"mac-{n % 4}")
+    pipeline.stop()
+    assert sorted(handler.numbers()) == list(range(50))
+    for mac in range(4):
+        assert [n for n in handler.numbers() if n % 4 == mac] == list(range(mac, 50, 4))
+    assert all(fecha == FECHA for _, _, fecha in handler.calls)
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    handler = Recorder()
+    pipeline = MessagePipeline(handler, workers=1, queue_size=2, overflow_policy=OVERFLOW_DROP_OLDEST)
+    dropped = MESSAGES_DROPPED.total(reason="overflow")
+    for n in range(4):
+        enqueue(pipeline, n)
+    assert MESSAGES_DROPPED.total(reason="overflow") - dropped == 2
+    pipeline.start()
+    pipeline.stop()
+    assert handler.numbers() == [2, 3]
+
+
+def test_spill_preserves_order_and_arrival_time(tmp_path):
+    handler = Recorder()
+    pipeline = MessagePipeline(handler, workers=1, queue_size=1,
+                               overflow_policy=OVERFLOW_SPILL, spill_dir=str(tmp_path))
+    for n in range(4):
+        enqueue(pipeline, n)
+    assert (tmp_path / "shard-0.jsonl").exists()
+    pipeline.start()
+    pipeline.stop()
+    assert handler.numbers() == [0, 1, 2, 3]
+    assert all(fecha == FECHA for _, _, fecha in handler.calls)
+    assert not (tmp_path / "shard-0.jsonl").exists()
+
+
+def test_handler_errors_do_not_stop_the_worker():
+    seen = []
+
+    def handler(topic, message, fecha):
+        if message["n"] == 0:
+            raise ValueError("mensaje inválido")
+        seen.append(message["n"])
+
+    pipeline = MessagePipeline(handler, workers=1, queue_size=10)
+    pipeline.start()
+    for n in range(3):
+        enqueue(pipeline, n)
+    pipeline.stop()
+    assert seen == [1, 2]
+    assert pipeline.alive() is False
+
+
+def test_invalid_configuration_is_rejected():
+    with pytest.raises(ValueError):
+        MessagePipeline(Recorder(), overflow_policy="lifo")
+    with pytest.raises(ValueError):
+        MessagePipeline(Recorder(), overflow_policy=OVERFLOW_SPILL)
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from src.easygrow_consumer.application.reduction import ReductionRule, StreamReducer
+from src.easygrow_consumer.domain.entities import SensorData
+
+# Inicio de una ventana de 60 s
+BASE = 1_700_000_040
+
+
+def reading(valor, offset=0.0, nombre="temperatura"):
+    return SensorData("AA:BB", nombre, valor, datetime.fromtimestamp(BASE + offset))
+
+
+def test_rule_without_deadband_or_bucket_passes_through():
+    reducer = StreamReducer({})
+    data = reading(20.0)
+    assert reducer.offer(data) == [data]
+    assert reducer.stats()["sensors"] == 0
+
+
+def test_deadband_suppresses_small_changes():
+    reducer = StreamReducer({"default": ReductionRule(deadband=0.5)})
+    assert [d.valor for d in reducer.offer(reading(20.0, 0))] == [20.0]
+    assert reducer.offer(reading(20.3, 1)) == []
+    # Se compara con el último valor reenviado, no con el último recibido
+    assert reducer.offer(reading(20.45, 2)) == []
+    assert [d.valor for d in reducer.offer(reading(20.6, 3))] == [20.6]
+
+
+def test_heartbeat_resends_unchanged_value():
+    reducer = StreamReducer({"default": ReductionRule(deadband=1.0, heartbeat_seconds=30)})
+    reducer.offer(reading(20.0, 0))
+    assert reducer.offer(reading(20.0, 29)) == []
+    assert [d.valor for d in reducer.offer(reading(20.0, 30))] == [20.0]
+
+
+def test_rules_are_selected_by_sensor_name():
+    reducer = StreamReducer({"humedad": ReductionRule(deadband=5.0)})
+    reducer.offer(reading(50.0, 0, nombre="humedad"))
+    assert reducer.offer(reading(52.0, 1, nombre="humedad")) == []
+    assert len(reducer.offer(reading(52.0, 1))) == 1
+
+
+@pytest.mark.parametrize("stat, expected", [("avg", 20.0), ("min", 18.0), ("max", 22.0), ("last", 20.0)])
+def test_bucket_is_closed_by_the_next_window(stat, expected):
+    reducer = StreamReducer({"default": ReductionRule(bucket_seconds=60, bucket_stat=stat)})
+    for offset, valor in ((5, 18.0), (20, 22.0), (40, 20.0)):
+        assert reducer.offer(reading(valor, offset)) == []
+    out = reducer.offer(reading(30.0, 65))
+    assert len(out) == 1
+    assert out[0].valor == expected
+    # La lectura resumida lleva la fecha de inicio de su ventana
+    assert out[0].fecha.timestamp() == BASE
+
+
+def test_expire_force_closes_open_buckets():
+    reducer = StreamReducer({"default": ReductionRule(bucket_seconds=60)})
+    reducer.offer(reading(10.0, 1))
+    reducer.offer(reading(20.0, 2))
+    assert reducer.expire() == []
+    out = reducer.expire(force=True)
+    assert [d.valor for d in out] == [15.0]
+    assert reducer.stats() == {"sensors": 1, "received": 2, "forwarded": 1}
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        ReductionRule(bucket_stat="median")
+    with pytest.raises(ValueError):
+        ReductionRule(deadband=-1)
+
+
+def test_from_json_accepts_inline_config():
+    reducer = StreamReducer.from_json('{"default": {"deadband": 0.2}, "humedad": {"bucket_seconds": 300}}')
+    assert reducer.default == ReductionRule(deadband=0.2)
+    assert reducer.rule_for("humedad").bucket_seconds == 300
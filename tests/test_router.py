@@ -0,0 +1,84 @@
+import pytest
+
+from src.easygrow_consumer.infrastructure import router
+from src.easygrow_consumer.infrastructure.router import Route, TopicRouter
+
+
+def make_router(*filters):
+    return TopicRouter.from_config([{"filter": f, "handler": "sensor"} for f in filters])
+
+
+def test_literal_beats_wildcards_regardless_of_order():
+    routes = make_router("sensor/#", "sensor/+/temp", "sensor/invernadero/temp")
+    assert routes.match("sensor/invernadero/temp").filter == "sensor/invernadero/temp"
+    assert routes.match("sensor/exterior/temp").filter == "sensor/+/temp"
+    assert routes.match("sensor/exterior/humedad").filter == "sensor/#"
+
+
+def test_multi_level_wildcard_covers_parent_level():
+    routes = make_router("sensor/#")
+    assert routes.match("sensor").filter == "sensor/#"
+    assert routes.match("bomba/estado") is None
+    assert routes.label("bomba/estado") == "other"
+
+
+def test_plus_backtracks_to_hash_when_deeper_levels_do_not_match():
+    routes = make_router("a/+/c", "a/#")
+    assert routes.match("a/b/c").filter == "a/+/c"
+    assert routes.match("a/b/d").filter == "a/#"
+
+
+def test_match_is_cached_and_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(router, "MATCH_CACHE_SIZE", 2)
+    routes = make_router("sensor/#")
+    first = routes.match("sensor/a")
+    assert routes._cache == {"sensor/a": first}
+    routes.match("sensor/b")
+    routes.match("sensor/c")
+    assert len(routes._cache) <= 2
+    # Los tópicos sin ruta también se recuerdan
+    assert routes.match("otro") is None
+    assert "otro" in routes._cache
+
+
+def test_duplicate_and_invalid_filters_are_rejected():
+    with pytest.raises(ValueError):
+        make_router("sensor/#", "sensor/#")
+    with pytest.raises(ValueError):
+        make_router("sensor/#/x")
+    with pytest.raises(ValueError):
+        make_router("sensor/a+")
+
+
+def test_route_config_validation():
+    with pytest.raises(ValueError):
+        Route.from_config({"handler": "sensor"})
+    with pytest.raises(ValueError):
+        Route.from_config({"filter": "x/#", "handler": "sensor", "schema": "desconocido"})
+    with pytest.raises(ValueError):
+        Route.from_config({"filter": "x/#", "handler": "sensor", "feilds": {}})
+    assert Route.from_config({"filter": "x/#", "handler": router.IGNORE}).schema is None
+
+
+def test_subscriptions_skip_ignored_routes_and_use_share_group():
+    routes = TopicRouter.from_config([
+        {"filter": "sensor/#", "handler": "sensor"},
+        {"filter": "sensor/debug", "handler": router.IGNORE},
+        {"filter": "bomba/estado", "handler": "bomba", "qos": 0},
+    ], default_qos=1)
+    assert routes.subscriptions("easygrow") == [
+        ("$share/easygrow/sensor/#", 1),
+        ("$share/easygrow/bomba/estado", 0),
+    ]
+
+
+def test_build_applies_field_renames_topic_levels_and_defaults():
+    route = Route.from_config({
+        "filter": "riego/+/humedad",
+        "handler": "sensor",
+        "fields": {"valor": "h"},
+        "topic_fields": {"mac_address": 1},
+        "defaults": {"nombre": "humedad"},
+    })
+    data = route.build("riego/AA:BB/humedad", {"h": 41.5})
+    assert (data.mac_address, data.nombre, data.valor) == ("AA:BB", "humedad", 41.5)
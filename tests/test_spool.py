@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import psycopg2
+import pytest
+
+from src.easygrow_consumer.domain.entities import SensorData
+from src.easygrow_consumer.infrastructure.spool import SINK_DB, SqliteSpool, StoreAndForward
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = SqliteSpool(str(tmp_path / "spool.sqlite3"))
+    yield spool
+    spool.close()
+
+
+def reading(valor):
+    return SensorData("AA:BB", "temperatura", valor, datetime(2024, 5, 1, 12, 0, 0))
+
+
+def dead_letters(spool):
+    return spool._conn.execute("SELECT COUNT(*) FROM spool_dead_letter").fetchone()[0]
+
+
+class FakeRepository:
+    """Escritura masiva que rechaza los valores negativos como lo haría PostgreSQL."""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.written = []
+
+    def write_sensor_batch(self, batch):
+        if self.down:
+            raise psycopg2.OperationalError("sin conexión")
+        if any(d.valor < 0 for d in batch):
+            raise psycopg2.DataError("valor fuera de rango")
+        self.written.extend(batch)
+        return len(batch)
+
+    def write_bomba_batch(self, batch):
+        return len(batch)
+
+
+def test_take_returns_records_in_insertion_order(spool):
+    spool.append_many(SINK_DB, [reading(v) for v in (1.0, 2.0, 3.0)])
+    taken = spool.take(SINK_DB, 2)
+    assert [e.valor for _, e in taken] == [1.0, 2.0]
+    assert taken[0][1] == reading(1.0)
+    spool.ack(SINK_DB, [row_id for row_id, _ in taken])
+    assert spool.pending(SINK_DB) == 1
+    assert [e.valor for _, e in spool.take(SINK_DB, 10)] == [3.0]
+
+
+def test_max_records_drops_the_oldest(tmp_path):
+    spool = SqliteSpool(str(tmp_path / "spool.sqlite3"), max_records=2)
+    spool.append_many(SINK_DB, [reading(v) for v in (1.0, 2.0, 3.0)])
+    assert spool.dropped == 1
+    assert [e.valor for _, e in spool.take(SINK_DB, 10)] == [2.0, 3.0]
+    spool.close()
+
+
+def test_undecodable_rows_are_dead_lettered(spool):
+    spool.append(SINK_DB, reading(1.0))
+    spool._conn.execute(
+        "INSERT INTO spool (sink, kind, mac_address, body) VALUES (?, 'SENSOR', 'AA:BB', ?)", (SINK_DB, b"{roto")
+    )
+    spool._pending[SINK_DB] += 1
+    spool.append(SINK_DB, reading(2.0))
+    assert [e.valor for _, e in spool.take(SINK_DB, 10)] == [1.0, 2.0]
+    assert dead_letters(spool) == 1
+    assert spool.pending(SINK_DB) == 2
+
+
+def test_replay_isolates_poison_rows(spool):
+    repository = FakeRepository()
+    spool.append_many(SINK_DB, [reading(v) for v in (1.0, 2.0, -1.0, 4.0, 5.0)])
+    forward = StoreAndForward(spool, repository, publisher=None)
+    assert forward.replay() == 4
+    assert [d.valor for d in repository.written] == [1.0, 2.0, 4.0, 5.0]
+    assert dead_letters(spool) == 1
+    assert spool.pending(SINK_DB) == 0
+
+
+def test_replay_keeps_records_while_the_sink_is_down(spool):
+    repository = FakeRepository(down=True)
+    spool.append_many(SINK_DB, [reading(v) for v in (1.0, 2.0)])
+    forward = StoreAndForward(spool, repository, publisher=None)
+    assert forward.replay() == 0
+    assert spool.pending(SINK_DB) == 2
+    assert dead_letters(spool) == 0
+
+    repository.down = False
+    assert forward.replay() == 2
+    assert spool.pending(SINK_DB) == 0
+
+
+def test_new_messages_queue_behind_pending_ones(spool):
+    spool.append(SINK_DB, reading(1.0))
+    forward = StoreAndForward(spool, FakeRepository(), publisher=None)
+    sent = []
+    forward.deliver(SINK_DB, reading(2.0), sent.append)
+    assert sent == []
+    assert [e.valor for _, e in spool.take(SINK_DB, 10)] == [1.0, 2.0]